@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cocoatrace.settings")
 
 application = get_asgi_application()
+
+# El índice de búsqueda se arma en segundo plano antes de la primera consulta.
+from core import search  # noqa: E402
+
+search.warm()
@@ -56,6 +56,7 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "core.middleware.ActivityLogBufferMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -142,6 +143,24 @@ STATICFILES_DIRS = [
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Importación de encuestas: el GeoJSON se lee de forma incremental, por lo que
+# el límite solo protege el disco donde Django guarda la carga temporal.
+SURVEY_IMPORT_MAX_UPLOAD_MB = 1024
+
+# Teselas vectoriales de parcelas generadas bajo demanda (ver producers.tiles).
+# Se pueden borrar en cualquier momento; se regeneran en la siguiente petición.
+PLOT_TILE_CACHE_DIR = os.path.join(BASE_DIR, "cache", "tiles", "plots")
+
+# Plausibilidad de entregas de lotes (ver infrastructure.proximity): distancia
+# máxima parcela → almacén y desvío máximo respecto del almacén activo más
+# cercano, en kilómetros de círculo máximo.
+BATCH_MAX_DELIVERY_KM = 150
+BATCH_MAX_DETOUR_KM = 60
+
+# Vigencia (segundos) del mapa de parcelas de cada productor en la caché de
+# Django (ver producers.map_payload). Los cambios lo invalidan antes.
+PRODUCER_MAP_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -23,6 +23,7 @@ from django.urls import path, include
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("dashboard.urls")),
+    path("", include("core.urls")),
     path("", include("producers.urls")),
     path("", include("inventory.urls")),
     path("", include("infrastructure.urls")),
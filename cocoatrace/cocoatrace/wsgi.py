@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cocoatrace.settings")
 
 application = get_wsgi_application()
+
+# El índice de búsqueda se arma en segundo plano antes de la primera consulta.
+from core import search  # noqa: E402
+
+search.warm()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import EUDRStatusHistory, DueDiligenceStatement
+from .models import EUDRStatusHistory, DueDiligenceStatement, PlotForestLoss
 
 admin.site.register(EUDRStatusHistory)
 admin.site.register(DueDiligenceStatement)
+admin.site.register(PlotForestLoss)
@@ -0,0 +1,291 @@
+"""Verificación de deforestación de parcelas contra un ráster local de pérdida de bosque.
+
+El ráster sigue la convención de Global Forest Change (Hansen et al.,
+``lossyear``): cada píxel guarda el año de pérdida de cobertura como
+``año - 2000`` (0 = sin pérdida) sobre una grilla lng/lat (EPSG:4326). EUDR
+exige que no haya deforestación después del 31 de diciembre de 2020, así que
+cuentan los píxeles con pérdida en 2021 o después.
+
+Formatos admitidos, ambos abiertos con ``np.memmap`` (solo se leen las
+ventanas que cubren cada parcela):
+
+* ``.npy`` de dos dimensiones con un ``.json`` al lado con la
+  georreferencia: ``{"west": ..., "north": ..., "pixel_width": ...,
+  "pixel_height": ..., "year_offset": 2000}``.
+* GeoTIFF sin compresión y en franjas contiguas (``ModelPixelScale`` y
+  ``ModelTiepoint``). Los comprimidos se convierten antes, por ejemplo con
+  ``gdal_translate -co COMPRESS=NONE -co TILED=NO``.
+
+Un píxel pertenece a una parcela si su centro cae dentro del polígono (regla
+par/impar con todos los anillos, así los huecos quedan fuera); la máscara se
+arma por filas con los cruces de cada fila con las aristas. Las superficies
+usan el área real de cada fila de píxeles sobre el elipsoide.
+
+El módulo no importa modelos de Django para que los procesos del pool de
+``check_forest_loss`` puedan importarlo sin configurar nada.
+"""
+
+import json
+import os
+import struct
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from producers.geometry import equal_area_xy, pack_rings
+
+# Fecha de corte de EUDR: la pérdida posterior a esta fecha incumple.
+EUDR_CUTOFF = date(2020, 12, 31)
+DEFAULT_YEAR_OFFSET = 2000
+
+
+@dataclass
+class LossRaster:
+    """Ráster de año de pérdida con su georreferencia (esquina noroeste y tamaño de píxel)."""
+
+    path: str
+    data: np.ndarray
+    west: float
+    north: float
+    pixel_width: float
+    pixel_height: float
+    year_offset: int = DEFAULT_YEAR_OFFSET
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        rows, cols = self.data.shape
+        return (self.west, self.north - rows * self.pixel_height, self.west + cols * self.pixel_width, self.north)
+
+    def row_areas_ha(self, first_row: int, stop_row: int) -> np.ndarray:
+        """Superficie de un píxel en cada fila ``[first_row, stop_row)``; cambia con la latitud."""
+        tops = self.north - np.arange(first_row, stop_row) * self.pixel_height
+        corners = np.column_stack((np.full(len(tops), self.west + self.pixel_width), tops - self.pixel_height))
+        x, y = equal_area_xy(corners, np.column_stack((np.full(len(tops), self.west), tops)))
+        return np.abs(x * y) / 10_000
+
+
+# --- Lectura ----------------------------------------------------------------
+
+
+def _open_npy(path: str) -> LossRaster:
+    metadata_path = os.path.splitext(path)[0] + ".json"
+    try:
+        with open(metadata_path, encoding="utf-8") as handle:
+            metadata = json.load(handle)
+    except FileNotFoundError:
+        raise ValueError(f"Falta la georreferencia {metadata_path} del ráster.") from None
+    data = np.load(path, mmap_mode="r")
+    if data.ndim != 2:
+        raise ValueError("El ráster .npy debe tener dos dimensiones (filas, columnas).")
+    try:
+        return LossRaster(
+            path=path,
+            data=data,
+            west=float(metadata["west"]),
+            north=float(metadata["north"]),
+            pixel_width=float(metadata["pixel_width"]),
+            pixel_height=abs(float(metadata["pixel_height"])),
+            year_offset=int(metadata.get("year_offset", DEFAULT_YEAR_OFFSET)),
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError(f"Georreferencia inválida en {metadata_path}: {exc}") from None
+
+
+# Etiquetas TIFF/GeoTIFF que se leen.
+_TIFF_TYPES = {1: "B", 2: "s", 3: "H", 4: "I", 11: "f", 12: "d", 16: "Q"}
+_TIFF_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 11: 4, 12: 8, 16: 8}
+_WIDTH, _LENGTH, _BITS, _COMPRESSION = 256, 257, 258, 259
+_STRIP_OFFSETS, _SAMPLES, _STRIP_COUNTS, _TILE_WIDTH, _SAMPLE_FORMAT = 273, 277, 279, 322, 339
+_PIXEL_SCALE, _TIEPOINT = 33550, 33922
+
+
+def _read_tiff_tags(handle, order: str) -> Dict[int, Tuple[Any, ...]]:
+    handle.seek(4)
+    (ifd_offset,) = struct.unpack(order + "I", handle.read(4))
+    handle.seek(ifd_offset)
+    (count,) = struct.unpack(order + "H", handle.read(2))
+    entries = [struct.unpack(order + "HHI4s", handle.read(12)) for _ in range(count)]
+    tags = {}
+    for tag, kind, values, inline in entries:
+        if kind not in _TIFF_TYPES:
+            continue
+        size = _TIFF_SIZES[kind] * values
+        if size <= 4:
+            raw = inline[:size]
+        else:
+            handle.seek(struct.unpack(order + "I", inline)[0])
+            raw = handle.read(size)
+        tags[tag] = struct.unpack(f"{order}{values}{_TIFF_TYPES[kind]}", raw)
+    return tags
+
+
+def _open_geotiff(path: str) -> LossRaster:
+    with open(path, "rb") as handle:
+        magic = handle.read(4)
+        if magic[:2] not in (b"II", b"MM"):
+            raise ValueError("El archivo no es un TIFF.")
+        order = "<" if magic[:2] == b"II" else ">"
+        if struct.unpack(order + "H", magic[2:])[0] != 42:
+            raise ValueError("Los BigTIFF no están soportados; convierte el ráster a TIFF clásico o a .npy.")
+        tags = _read_tiff_tags(handle, order)
+
+    if tags.get(_COMPRESSION, (1,))[0] != 1 or _TILE_WIDTH in tags:
+        raise ValueError("El GeoTIFF debe estar sin compresión y en franjas (gdal_translate -co COMPRESS=NONE -co TILED=NO).")
+    if tags.get(_SAMPLES, (1,))[0] != 1:
+        raise ValueError("El GeoTIFF debe tener una sola banda.")
+    if _PIXEL_SCALE not in tags or _TIEPOINT not in tags:
+        raise ValueError("El GeoTIFF no tiene georreferencia (ModelPixelScale/ModelTiepoint).")
+    bits = tags.get(_BITS, (8,))[0]
+    signed = tags.get(_SAMPLE_FORMAT, (1,))[0] == 2
+    if bits not in (8, 16):
+        raise ValueError("El GeoTIFF debe ser de 8 o 16 bits.")
+    offsets, counts = tags[_STRIP_OFFSETS], tags[_STRIP_COUNTS]
+    if any(offsets[index] + counts[index] != offsets[index + 1] for index in range(len(offsets) - 1)):
+        raise ValueError("Las franjas del GeoTIFF no son contiguas; reescríbelo con gdal_translate.")
+
+    width, length = tags[_WIDTH][0], tags[_LENGTH][0]
+    dtype = np.dtype(f"{order}{'i' if signed else 'u'}{bits // 8}")
+    data = np.memmap(path, dtype=dtype, mode="r", offset=offsets[0], shape=(length, width))
+    scale_x, scale_y = tags[_PIXEL_SCALE][:2]
+    pixel_column, pixel_row, _k, lng, lat, _z = tags[_TIEPOINT][:6]
+    return LossRaster(
+        path=path,
+        data=data,
+        west=lng - pixel_column * scale_x,
+        north=lat + pixel_row * scale_y,
+        pixel_width=scale_x,
+        pixel_height=scale_y,
+    )
+
+
+def open_raster(path: str) -> LossRaster:
+    """Abre un ráster de pérdida ``.npy`` o GeoTIFF sin leerlo a memoria."""
+    if path.lower().endswith(".npy"):
+        return _open_npy(path)
+    return _open_geotiff(path)
+
+
+# --- Rasterización ----------------------------------------------------------
+
+
+@dataclass
+class ForestLossResult:
+    """Píxeles de una parcela en el ráster y la pérdida posterior al corte."""
+
+    plot_id: int
+    covered: bool
+    plot_pixels: int = 0
+    loss_pixels: int = 0
+    loss_area_ha: float = 0.0
+    loss_by_year: Dict[str, float] = field(default_factory=dict)
+
+
+def _plot_mask(raster: LossRaster, packed, first_row: int, first_col: int, rows: int, cols: int) -> np.ndarray:
+    """Máscara (filas × columnas de la ventana) de los píxeles con centro dentro del polígono."""
+    bounds = packed.offsets
+    ring_ids = np.repeat(np.arange(packed.ring_count), np.diff(bounds))
+    same_ring = ring_ids[:-1] == ring_ids[1:]
+    x0, y0 = packed.coords[:-1][same_ring].T
+    x1, y1 = packed.coords[1:][same_ring].T
+
+    centers = raster.north - (first_row + np.arange(rows) + 0.5) * raster.pixel_height
+    lat = centers[:, None]
+    crossing = (y0[None, :] > lat) != (y1[None, :] > lat)
+    row_index, edge_index = np.nonzero(crossing)
+    mask = np.zeros((rows, cols), dtype=bool)
+    if not len(row_index):
+        return mask
+    dy = y1[edge_index] - y0[edge_index]
+    x_at = x0[edge_index] + (centers[row_index] - y0[edge_index]) * (x1[edge_index] - x0[edge_index]) / dy
+
+    # Cruces de cada fila ordenados por x: se rellena entre el 1.º y el 2.º,
+    # el 3.º y el 4.º, etc. (cada anillo cerrado cruza una fila un número par
+    # de veces).
+    order = np.lexsort((x_at, row_index))
+    row_index, x_at = row_index[order], x_at[order]
+    columns = np.ceil((x_at - raster.west) / raster.pixel_width - 0.5).astype(np.int64) - first_col
+    columns = np.clip(columns, 0, cols)
+    starts, stops = columns[0::2], columns[1::2]
+    span_rows = row_index[0::2]
+    steps = np.zeros((rows, cols + 1), dtype=np.int32)
+    np.add.at(steps, (span_rows, starts), 1)
+    np.add.at(steps, (span_rows, stops), -1)
+    return np.cumsum(steps[:, :cols], axis=1) > 0
+
+
+def check_plot(raster: LossRaster, plot_id: int, geometry: Any, cutoff: date = EUDR_CUTOFF) -> Optional[ForestLossResult]:
+    """Pérdida de bosque posterior a ``cutoff`` dentro de una parcela (GeoJSON o compacta).
+
+    Devuelve ``None`` si la geometría no tiene anillos. Las parcelas más
+    chicas que un píxel usan el píxel que contiene el centro de su
+    rectángulo envolvente.
+    """
+    packed = pack_rings([geometry], holes=True)
+    if not len(packed.coords):
+        return None
+    min_lng, min_lat = packed.coords.min(axis=0)
+    max_lng, max_lat = packed.coords.max(axis=0)
+    west, south, east, north = raster.bounds
+    covered = min_lng >= west and max_lng <= east and min_lat >= south and max_lat <= north
+    total_rows, total_cols = raster.data.shape
+    first_row = max(int((raster.north - max_lat) // raster.pixel_height), 0)
+    stop_row = min(int((raster.north - min_lat) // raster.pixel_height) + 1, total_rows)
+    first_col = max(int((min_lng - raster.west) // raster.pixel_width), 0)
+    stop_col = min(int((max_lng - raster.west) // raster.pixel_width) + 1, total_cols)
+    if first_row >= stop_row or first_col >= stop_col:
+        return ForestLossResult(plot_id=plot_id, covered=False)
+
+    rows, cols = stop_row - first_row, stop_col - first_col
+    mask = _plot_mask(raster, packed, first_row, first_col, rows, cols)
+    if not mask.any():
+        center_row = int((raster.north - (min_lat + max_lat) / 2) // raster.pixel_height) - first_row
+        center_col = int(((min_lng + max_lng) / 2 - raster.west) // raster.pixel_width) - first_col
+        if 0 <= center_row < rows and 0 <= center_col < cols:
+            mask[center_row, center_col] = True
+
+    window = np.asarray(raster.data[first_row:stop_row, first_col:stop_col])
+    mask_rows = np.nonzero(mask)[0]
+    values = window[mask].astype(np.int64)
+    areas = raster.row_areas_ha(first_row, stop_row)[mask_rows]
+    lost = (values > 0) & (values + raster.year_offset > cutoff.year)
+    result = ForestLossResult(
+        plot_id=plot_id,
+        covered=bool(covered),
+        plot_pixels=int(mask.sum()),
+        loss_pixels=int(lost.sum()),
+        loss_area_ha=float(areas[lost].sum()),
+    )
+    if result.loss_pixels:
+        years = values[lost] + raster.year_offset
+        by_year = np.bincount(years - years.min(), weights=areas[lost])
+        result.loss_by_year = {
+            str(int(years.min()) + offset): round(float(area), 4) for offset, area in enumerate(by_year) if area
+        }
+    return result
+
+
+# --- Procesos del pool ------------------------------------------------------
+
+_worker_raster: Optional[LossRaster] = None
+
+
+def init_worker(path: str) -> None:
+    """Inicializador del pool: cada proceso abre su propio memmap del ráster."""
+    global _worker_raster
+    _worker_raster = open_raster(path)
+
+
+def check_batch(items: Sequence[Tuple[int, Any]], cutoff: date = EUDR_CUTOFF) -> List[ForestLossResult]:
+    """Revisa un lote de ``(plot_id, geometría)`` con el ráster del proceso."""
+    results = []
+    for plot_id, geometry in items:
+        result = check_plot(_worker_raster, plot_id, geometry, cutoff)
+        if result is not None:
+            results.append(result)
+    return results
@@ -0,0 +1,137 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from compliance.forest_loss import check_batch, init_worker, open_raster
+from compliance.models import PlotForestLoss
+from producers.models import Plot
+from producers.signals import plots_bulk_changed
+from producers.spatial_index import BBOX_FIELDS
+
+# SQL Server admite como mucho 2100 parámetros por consulta.
+FETCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Cruza los polígonos de las parcelas con un ráster local de año de pérdida de bosque "
+        "y guarda, por parcela, la pérdida posterior al 31/12/2020."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("raster", help="Ráster de pérdida: .npy (con su .json de georreferencia) o GeoTIFF sin comprimir.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos del pool (1 = sin pool).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Parcelas por lote enviado a cada proceso.")
+        parser.add_argument(
+            "--update-compliance",
+            action="store_true",
+            help="Marca como no conformes las parcelas con pérdida posterior al corte (nunca marca conformes).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            raster = open_raster(options["raster"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo abrir el ráster: {exc}") from exc
+        west, south, east, north = raster.bounds
+        rows = list(
+            Plot.objects.filter(
+                bbox_min_lng__lte=east, bbox_max_lng__gte=west, bbox_min_lat__lte=north, bbox_max_lat__gte=south
+            )
+            .values_list("pk", *BBOX_FIELDS)
+            .iterator(chunk_size=5000)
+        )
+        if not rows:
+            self.stdout.write("Ninguna parcela cae dentro del ráster; ejecuta recompute_plot_geometry si faltan rectángulos.")
+            return
+
+        # Lotes en el orden de las filas del ráster, para que cada proceso lea
+        # ventanas cercanas del archivo.
+        band = raster.pixel_height * 256
+        rows.sort(key=lambda row: (-(row[4] // band), row[1]))
+        plot_ids = [row[0] for row in rows]
+        batch_size = min(max(options["batch_size"], 1), FETCH_SIZE)
+        batches = [plot_ids[start : start + batch_size] for start in range(0, len(plot_ids), batch_size)]
+
+        self.checked = self.with_loss = 0
+        self.noncompliant = []
+        workers = max(options["workers"], 1)
+        if workers == 1:
+            init_worker(options["raster"])
+            for batch in batches:
+                results = check_batch(self._load_geometries(batch))
+                self._store(batch, results, raster.name)
+        else:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(options["raster"],)) as pool:
+                pending = {}
+                for batch in batches:
+                    pending[pool.submit(check_batch, self._load_geometries(batch))] = batch
+                    if len(pending) >= 2 * workers:
+                        done, _running = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._store(pending.pop(future), future.result(), raster.name)
+                for future, batch in pending.items():
+                    self._store(batch, future.result(), raster.name)
+
+        downgraded = 0
+        if options["update_compliance"] and self.noncompliant:
+            for start in range(0, len(self.noncompliant), FETCH_SIZE):
+                chunk = self.noncompliant[start : start + FETCH_SIZE]
+                downgraded += Plot.objects.filter(pk__in=chunk, eudr_compliant=True).update(eudr_compliant=False)
+            # El estado viaja en las teselas del mapa.
+            plots_bulk_changed.send(sender=Plot, plot_ids=self.noncompliant)
+
+        elapsed = time.monotonic() - started
+        summary = f"{self.checked} parcelas revisadas en {elapsed:.1f}s; {self.with_loss} con pérdida de bosque posterior al corte."
+        if options["update_compliance"]:
+            summary += f" {downgraded} marcadas como no conformes."
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    @staticmethod
+    def _load_geometries(plot_ids):
+        """``(plot_id, geometría)`` de un lote, en forma compacta si la parcela ya la tiene."""
+        geometries = {}
+        for start in range(0, len(plot_ids), FETCH_SIZE):
+            chunk = plot_ids[start : start + FETCH_SIZE]
+            geometries.update(Plot.objects.filter(pk__in=chunk).values_list("pk", "polygon_packed"))
+        unpacked = [plot_id for plot_id, packed in geometries.items() if packed is None]
+        for start in range(0, len(unpacked), FETCH_SIZE):
+            chunk = unpacked[start : start + FETCH_SIZE]
+            geometries.update(Plot.objects.filter(pk__in=chunk).values_list("pk", "polygon"))
+        # El pool serializa los argumentos; memoryview no se puede.
+        return [
+            (plot_id, bytes(geometry) if isinstance(geometry, memoryview) else geometry)
+            for plot_id, geometry in geometries.items()
+        ]
+
+    def _store(self, plot_ids, results, raster_name):
+        """Reemplaza el resultado de todo el lote ``plot_ids``.
+
+        Las parcelas sin resultado (p. ej. porque su geometría quedó vacía)
+        también pierden el que tenían.
+        """
+        records = [
+            PlotForestLoss(
+                plot_id=result.plot_id,
+                raster_name=raster_name,
+                covered=result.covered,
+                plot_pixels=result.plot_pixels,
+                loss_pixels=result.loss_pixels,
+                loss_area_ha=Decimal(f"{result.loss_area_ha:.4f}"),
+                loss_by_year=result.loss_by_year,
+            )
+            for result in results
+        ]
+        with transaction.atomic():
+            PlotForestLoss.objects.filter(plot_id__in=plot_ids).delete()
+            PlotForestLoss.objects.bulk_create(records, batch_size=500)
+        lost = [record.plot_id for record in records if record.loss_pixels]
+        self.noncompliant.extend(lost)
+        self.checked += len(records)
+        self.with_loss += len(lost)
+        self.stdout.write(f"{self.checked} parcelas revisadas, {self.with_loss} con pérdida...")
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compliance', '0002_initial'),
+        ('producers', '0014_plot_polygon_packed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlotForestLoss',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('raster_name', models.CharField(max_length=255)),
+                ('covered', models.BooleanField(default=False)),
+                ('plot_pixels', models.PositiveIntegerField(default=0)),
+                ('loss_pixels', models.PositiveIntegerField(default=0)),
+                ('loss_area_ha', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('loss_by_year', models.JSONField(blank=True, default=dict)),
+                ('checked_at', models.DateTimeField(auto_now=True)),
+                ('plot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forest_loss', to='producers.plot')),
+            ],
+        ),
+    ]
@@ -35,3 +35,24 @@ class DueDiligenceStatement(models.Model):
 
     def __str__(self):
         return f"Declaración {self.statement_id} ({self.get_status_display()})"
+
+class PlotForestLoss(models.Model):
+    """Resultado de cruzar una parcela con el ráster de pérdida de bosque (ver ``forest_loss``)."""
+    plot = models.OneToOneField('producers.Plot', on_delete=models.CASCADE, related_name='forest_loss')
+    raster_name = models.CharField(max_length=255)
+    # Cubierta por completo: el rectángulo de la parcela cae dentro del ráster.
+    covered = models.BooleanField(default=False)
+    plot_pixels = models.PositiveIntegerField(default=0)
+    # Píxeles y superficie con pérdida posterior al corte EUDR (31/12/2020).
+    loss_pixels = models.PositiveIntegerField(default=0)
+    loss_area_ha = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    loss_by_year = models.JSONField(default=dict, blank=True)
+    checked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.plot_id} · {self.loss_area_ha} ha perdidas ({self.raster_name})"
+
+    @property
+    def deforestation_free(self):
+        """Sin pérdida posterior al corte en un ráster que cubre toda la parcela."""
+        return self.covered and self.loss_pixels == 0
@@ -0,0 +1,98 @@
+"""Contadores de generación guardados en la base de datos.
+
+Los índices en memoria (parcelas, grupos del mapa, almacenes...) y las
+cachés derivadas de ellos necesitan saber si otro proceso cambió los datos.
+La caché de Django no sirve para eso: sin ``CACHES`` configurado es una
+memoria local de cada proceso, así que un incremento en el worker de
+importación nunca llegaba a los procesos web. Una fila de ``Generation``
+por clave sí la ven todos.
+
+Una clave sin fila vale 0. ``bump`` incrementa en la misma transacción
+en que lee el valor nuevo, así que dos procesos nunca reciben el mismo.
+
+``record`` además anota qué registros cambiaron (``GenerationChange``) en
+esa misma transacción. El incremento deja bloqueada la fila de la clave
+hasta confirmar, así que las generaciones se confirman en orden: quien ve la
+generación ``n`` ya puede leer todos los cambios hasta ``n`` con
+``changed_between`` y actualizar su índice sin recargarlo entero. Los
+cambios de más de ``CHANGE_TTL`` se borran; un proceso que no se sincronizó
+en ``CHANGE_TTL / 2`` debe recargar todo (``changes_expired``).
+"""
+
+from datetime import timedelta
+from typing import Dict, Iterable, Set
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Generation, GenerationChange
+
+# SQL Server admite como mucho 2100 parámetros por consulta.
+CHUNK_SIZE = 2000
+# Cuánto se conservan los cambios anotados por ``record``.
+CHANGE_TTL = timedelta(days=1)
+
+
+def current(key: str) -> int:
+    return Generation.objects.filter(key=key).values_list("value", flat=True).first() or 0
+
+
+def current_many(keys: Iterable[str]) -> Dict[str, int]:
+    keys = sorted(set(keys))
+    values = dict.fromkeys(keys, 0)
+    for start in range(0, len(keys), CHUNK_SIZE):
+        values.update(Generation.objects.filter(key__in=keys[start : start + CHUNK_SIZE]).values_list("key", "value"))
+    return values
+
+
+def bump(key: str) -> int:
+    """Incrementa la generación de ``key`` y devuelve el valor nuevo."""
+    return bump_many([key])[key]
+
+
+def bump_many(keys: Iterable[str]) -> Dict[str, int]:
+    """Incrementa la generación de cada clave y devuelve los valores nuevos."""
+    keys = sorted(set(keys))
+    values: Dict[str, int] = {}
+    with transaction.atomic():
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start : start + CHUNK_SIZE]
+            Generation.objects.filter(key__in=chunk).update(value=F("value") + 1)
+            existing = set(Generation.objects.filter(key__in=chunk).values_list("key", flat=True))
+            for key in chunk:
+                if key in existing:
+                    continue
+                try:
+                    with transaction.atomic():
+                        Generation.objects.create(key=key, value=1)
+                except IntegrityError:
+                    # Otro proceso creó la fila entre la lectura y el insert.
+                    Generation.objects.filter(key=key).update(value=F("value") + 1)
+            values.update(Generation.objects.filter(key__in=chunk).values_list("key", "value"))
+    return values
+
+
+def record(key: str, object_ids: Iterable[int]) -> int:
+    """Incrementa la generación de ``key``, anota ``object_ids`` con ella y la devuelve."""
+    object_ids = sorted(set(object_ids))
+    now = timezone.now()
+    with transaction.atomic():
+        generation = bump(key)
+        GenerationChange.objects.bulk_create(
+            [GenerationChange(key=key, generation=generation, object_id=object_id, changed_at=now) for object_id in object_ids],
+            batch_size=CHUNK_SIZE,
+        )
+    GenerationChange.objects.filter(changed_at__lt=now - CHANGE_TTL).delete()
+    return generation
+
+
+def changed_between(key: str, after: int, until: int) -> Set[int]:
+    """Registros anotados para ``key`` con generación en ``(after, until]``."""
+    rows = GenerationChange.objects.filter(key=key, generation__gt=after, generation__lte=until)
+    return set(rows.values_list("object_id", flat=True).iterator(chunk_size=20_000))
+
+
+def changes_expired(synced_at) -> bool:
+    """Si desde ``synced_at`` pudieron borrarse cambios que todavía no se leyeron."""
+    return timezone.now() - synced_at > CHANGE_TTL / 2
@@ -0,0 +1,469 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from core.models import ActivityLog
+from eudr.models import EudrDiligence, EudrDiligenceProducer, EudrTimelineEntry
+from infrastructure.models import Warehouse
+from inventory.models import Batch
+from producers.models import Plot, Producer
+from producers.search import index_producers
+from producers.signals import plots_bulk_changed
+from surveys.models import Enumerator, Survey
+from surveys.services import normalize_feature
+
+# Región cacaotera de referencia (oriente venezolano) y tamaño de cada celda de
+# la grilla: cada parcela ocupa su propia celda, lo que garantiza que ningún
+# polígono se superponga con otro.
+ORIGIN_LAT = 8.0
+ORIGIN_LNG = -67.0
+CELL_DEGREES = 0.005
+HISTORY_START = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+HISTORY_DAYS = 900
+
+FIRST_NAMES = ["José", "María", "Luis", "Carmen", "Pedro", "Ana", "Carlos", "Rosa", "Juan", "Luisa", "Miguel", "Yolanda"]
+LAST_NAMES = ["González", "Rodríguez", "Pérez", "Hernández", "Martínez", "Rivas", "Suárez", "Rojas", "Mendoza", "Guevara"]
+MUNICIPALITIES = [
+    ("Sucre", "Cajigal"),
+    ("Sucre", "Benítez"),
+    ("Sucre", "Arismendi"),
+    ("Miranda", "Acevedo"),
+    ("Miranda", "Brión"),
+    ("Aragua", "Ocumare de la Costa"),
+    ("Mérida", "Caracciolo Parra Olmedo"),
+    ("Zulia", "Sucre"),
+]
+BUYERS = ["Cooperativa local", "Intermediario", "Exportadora", "Chocolatería artesanal"]
+CROPS = ["cacao", "cacao platano", "cacao cafe", "cacao musaceas frutales"]
+VARIETIES = ["criollo", "trinitario", "forastero", "criollo trinitario"]
+ORIGINS = ["vivero_certificado", "semilla_propia", "donacion", "otro"]
+PRACTICES = ["poda", "poda control_malezas", "fertilizacion poda", "injertos poda sombra"]
+EDUCATION = ["primaria", "secundaria", "tecnico", "universitario"]
+RISK_LEVELS = ["bajo", "medio", "alto"]
+DILIGENCE_EVENTS = ["reception_note", "delivery_note", "sales_invoice", "due_diligence", "custom"]
+
+
+@contextmanager
+def _historical_timestamps(*model_fields):
+    # auto_now_add reemplaza cualquier fecha en bulk_create; se desactiva
+    # mientras se insertan registros con fechas históricas.
+    previous = [(field, field.auto_now_add) for field in model_fields]
+    for field, _ in previous:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in previous:
+            field.auto_now_add = value
+
+
+def _ensure_primary_keys(model, objects, field_name):
+    # Algunos motores no devuelven los ids generados por bulk_create.
+    missing = [obj for obj in objects if obj.pk is None]
+    if missing:
+        stored = model.objects.in_bulk([getattr(obj, field_name) for obj in missing], field_name=field_name)
+        for obj in missing:
+            obj.pk = stored[getattr(obj, field_name)].pk
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera de forma determinista un volumen sintético de productores, parcelas, encuestas, "
+        "lotes, diligencias EUDR y actividad para pruebas de carga."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("producers", type=int, help="Número de productores a generar.")
+        parser.add_argument("--seed", type=int, default=1, help="Semilla: la misma semilla produce los mismos datos.")
+        parser.add_argument("--prefix", default="SYN", help="Prefijo de los códigos generados.")
+        parser.add_argument("--max-plots", type=int, default=3, help="Máximo de parcelas por productor.")
+        parser.add_argument("--max-batches", type=int, default=2, help="Máximo de lotes por productor.")
+        parser.add_argument("--warehouses", type=int, default=25)
+        parser.add_argument("--enumerators", type=int, default=40)
+        parser.add_argument("--diligences", type=int, help="Por defecto, una por cada 200 productores.")
+        parser.add_argument("--multipolygon-ratio", type=float, default=0.1)
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Productores por transacción.")
+
+    def handle(self, *args, **options):
+        total = options["producers"]
+        if total <= 0:
+            raise CommandError("El número de productores debe ser mayor que cero.")
+        self.prefix = options["prefix"].upper()
+        if Producer.objects.filter(code__startswith=f"{self.prefix}-").exists():
+            raise CommandError(f"Ya existen datos con el prefijo {self.prefix}; usa otro con --prefix.")
+
+        self.rnd = random.Random(options["seed"])
+        self.options = options
+        self.columns = math.ceil(math.sqrt(total * options["max_plots"]))
+        self.next_cell = 0
+        # Otra corrida (con otro prefijo) no debe repetir celdas de la grilla
+        # ni números de documento: se continúa después de los datos existentes.
+        self.first_row = self._first_free_row()
+        self.serial_offset = Producer.objects.aggregate(last=Max("pk"))["last"] or 0
+        self.cell_offset = Plot.objects.aggregate(last=Max("pk"))["last"] or 0
+        # Los uuid mezclan el prefijo: la misma semilla con otro prefijo no los repite.
+        self.uuid_mask = int.from_bytes(hashlib.sha256(self.prefix.encode()).digest()[:16], "big")
+        self.counts = {"productores": 0, "parcelas": 0, "encuestas": 0, "lotes": 0, "diligencias": 0, "eventos": 0, "actividad": 0}
+        started = time.monotonic()
+
+        with transaction.atomic():
+            self.warehouses = self._create_warehouses(options["warehouses"])
+            self.enumerators = self._create_enumerators(options["enumerators"])
+
+        producer_ids = []
+        chunk_size = max(options["chunk_size"], 1)
+        with _historical_timestamps(
+            ActivityLog._meta.get_field("created_at"),
+            Batch._meta.get_field("created_at"),
+        ):
+            for start in range(0, total, chunk_size):
+                with transaction.atomic():
+                    producer_ids.extend(self._create_chunk(start, min(start + chunk_size, total)))
+                self.stdout.write(f"{min(start + chunk_size, total)}/{total} productores...")
+
+            diligences = options["diligences"]
+            if diligences is None:
+                diligences = max(total // 200, 1)
+            with transaction.atomic():
+                self._create_diligences(diligences, producer_ids)
+
+        summary = ", ".join(f"{value} {label}" for label, value in self.counts.items())
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Datos sintéticos generados en {elapsed:.1f}s: {summary}."))
+
+    def _first_free_row(self):
+        """Primera fila de la grilla por encima de todas las parcelas que ya la ocupan."""
+        top = Plot.objects.filter(bbox_max_lat__gte=ORIGIN_LAT).aggregate(top=Max("bbox_max_lat"))["top"]
+        if top is None:
+            return 0
+        return math.floor((top - ORIGIN_LAT) / CELL_DEGREES) + 1
+
+    # --- Catálogos ----------------------------------------------------------
+
+    def _create_warehouses(self, count):
+        warehouses = []
+        for number in range(1, count + 1):
+            department, municipality = self.rnd.choice(MUNICIPALITIES)
+            capacity = self.rnd.randrange(50_000, 500_000, 5_000)
+            warehouses.append(
+                Warehouse(
+                    code=f"{self.prefix}-ALM-{number:03d}",
+                    name=f"Centro de acopio {municipality} {number}",
+                    address=f"Sector {self.rnd.randint(1, 40)}, {municipality}, {department}",
+                    municipality=municipality,
+                    capacity_kg=Decimal(capacity),
+                    current_stock_kg=Decimal(self.rnd.randint(0, capacity)),
+                    latitude=self._decimal(ORIGIN_LAT + self.rnd.uniform(0, 2), 7),
+                    longitude=self._decimal(ORIGIN_LNG + self.rnd.uniform(0, 3), 7),
+                )
+            )
+        Warehouse.objects.bulk_create(warehouses)
+        _ensure_primary_keys(Warehouse, warehouses, "code")
+        return warehouses
+
+    def _create_enumerators(self, count):
+        enumerators = [
+            Enumerator(
+                document_number=f"{self.prefix}-E{number:04d}",
+                full_name=self._person_name(),
+                phone=self._phone(),
+            )
+            for number in range(1, count + 1)
+        ]
+        Enumerator.objects.bulk_create(enumerators)
+        _ensure_primary_keys(Enumerator, enumerators, "document_number")
+        return enumerators
+
+    # --- Productores, parcelas y encuestas ----------------------------------
+
+    def _create_chunk(self, start, end):
+        producers, plots, surveys, logs = [], [], [], []
+        plots_by_producer = []
+
+        for number in range(start + 1, end + 1):
+            producer_name = self._person_name()
+            document_number = str(8_000_000 + (self.serial_offset + number) * 7 + self.rnd.randint(0, 6))
+            department, municipality = self.rnd.choice(MUNICIPALITIES)
+            items = []
+            for plot_number in range(1, self.rnd.randint(1, max(self.options["max_plots"], 1)) + 1):
+                feature = self._feature(number, plot_number, producer_name, document_number, department, municipality)
+                items.append(normalize_feature(plot_number, feature))
+
+            producer = Producer(**items[0].producer_defaults)
+            producer.code = f"{self.prefix}-{number:07d}"
+            producer.compliance_status = self.rnd.choices(["Approved", "Pending Review", "Rejected"], [6, 3, 1])[0]
+            producers.append(producer)
+            plots_by_producer.append(items)
+            logs.append(self._log("Productor", f"Nuevo productor importado: {producer.full_name}", producer.code, items[0]))
+
+        Producer.objects.bulk_create(producers)
+        _ensure_primary_keys(Producer, producers, "code")
+        index_producers(producer.pk for producer in producers)
+
+        for producer, items in zip(producers, plots_by_producer):
+            for item in items:
+                plot = Plot(producer=producer, plot_code=item.plot_code_base, content_hash=item.content_hash, **item.plot_fields)
+                plot.eudr_compliant = producer.compliance_status == "Approved"
+                plots.append(plot)
+                logs.append(self._log("Parcela", f"Parcela importada: {plot.name}", producer.code, item))
+        Plot.refresh_derived_geometry_bulk(plots)
+        Plot.objects.bulk_create(plots)
+        _ensure_primary_keys(Plot, plots, "global_id")
+        plots_bulk_changed.send(sender=Plot, plot_ids=[plot.pk for plot in plots])
+
+        enumerators = {enumerator.document_number: enumerator for enumerator in self.enumerators}
+        plot_iter = iter(plots)
+        for producer, items in zip(producers, plots_by_producer):
+            for item in items:
+                plot = next(plot_iter)
+                surveys.append(
+                    Survey(
+                        producer=producer,
+                        plot=plot,
+                        enumerator=enumerators.get(item.enumerator_id),
+                        global_id=item.global_id,
+                        content_hash=item.content_hash,
+                        **item.survey_fields,
+                    )
+                )
+                logs.append(self._log("Encuesta", f"Encuesta importada: {plot.name}", producer.code, item))
+        Survey.objects.bulk_create(surveys)
+
+        batches = self._create_batches(producers, plots, logs)
+        ActivityLog.objects.bulk_create(logs)
+
+        self.counts["productores"] += len(producers)
+        self.counts["parcelas"] += len(plots)
+        self.counts["encuestas"] += len(surveys)
+        self.counts["lotes"] += len(batches)
+        self.counts["actividad"] += len(logs)
+        return [producer.pk for producer in producers]
+
+    def _feature(self, number, plot_number, producer_name, document_number, department, municipality):
+        row, column = divmod(self.next_cell, self.columns)
+        self.next_cell += 1
+        west = ORIGIN_LNG + column * CELL_DEGREES
+        south = ORIGIN_LAT + (self.first_row + row) * CELL_DEGREES
+        if self.rnd.random() < self.options["multipolygon_ratio"]:
+            half = CELL_DEGREES / 2
+            geometry = {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [self._ring(west, south, half)],
+                    [self._ring(west + half, south + half, half)],
+                ],
+            }
+        else:
+            geometry = {"type": "Polygon", "coordinates": [self._ring(west, south, CELL_DEGREES)]}
+
+        area = round(self._area_hectares(geometry), 2)
+        census = self._moment()
+        edited = census + timedelta(days=self.rnd.randint(0, 60))
+        workers_men = self.rnd.randint(0, 6)
+        workers_women = self.rnd.randint(0, 4)
+        properties = {
+            "globalid": "{%s}" % str(uuid.UUID(int=self.rnd.getrandbits(128) ^ self.uuid_mask, version=4)).upper(),
+            "objectid": self.cell_offset + self.next_cell,
+            "ID_UP": f"{self.prefix}-UP-{number:07d}-{plot_number}",
+            "Nombre_Productor": producer_name,
+            "CI_RIF_Productor": document_number,
+            "Telef_Productor": self._phone(),
+            "departamento": department,
+            "municipio": municipality,
+            "sector_unidad_producion": f"Sector {self.rnd.randint(1, 30)}",
+            "comunidad_unidad_producion": f"Comunidad {self.rnd.randint(1, 120)}",
+            "ID_Encuestador": f"{self.prefix}-E{self.rnd.randint(1, max(self.options['enumerators'], 1)):04d}",
+            "Data_Censo": census.isoformat().replace("+00:00", "Z"),
+            "CreationDate": census.isoformat().replace("+00:00", "Z"),
+            "EditDate": edited.isoformat().replace("+00:00", "Z"),
+            # La superficie declarada suele diferir algo de la medida.
+            "Sup_UP_ha": round(area * self.rnd.uniform(0.8, 1.25), 2),
+            "Sup_Cacao_UP": round(area * self.rnd.uniform(0.5, 1.0), 2),
+            "A_quien_arrima": self.rnd.choice(BUYERS),
+            "_qu_rubros_cultivan_en_la_unida": self.rnd.choice(CROPS),
+            "_esta_inscrito_en_el_insai_sige": self.rnd.choice(["si", "no"]),
+            "_posee_plantas_de_caucho_en_la": self.rnd.choice(["si", "no", "no"]),
+            "_ha_recibido_formaci_n_para_mej": self.rnd.choice(["si", "no"]),
+            "_qu_variedades_de_cacao_tiene_c": self.rnd.choice(VARIETIES),
+            "_cu_l_es_el_origen_de_su_planta": self.rnd.choice(ORIGINS),
+            "practicas_culturales": self.rnd.choice(PRACTICES),
+            "_cu_les_fertilizantes_utilizan": self.rnd.choice(["organico", "quimico", "ninguno"]),
+            "_cu_les_pesticidas_usan_para_el": self.rnd.choice(["ninguno", "biologico", "quimico"]),
+            "_que_problemas_con_plagas_insec": self.rnd.choice(["ninguno", "monilia", "escoba_de_bruja", "mazorca_negra"]),
+            "_aproximadamente_qu_cantidad_de": self.rnd.randint(50, 3000),
+            "cantidad_plantas_cacao": self.rnd.randint(200, 1100) * max(int(area), 1),
+            "distancia_plantas": self.rnd.choice(["3x3", "3.5x3.5", "4x4"]),
+            "familias_que_dependen_UP": self.rnd.randint(1, 4),
+            "Adultos_mayores_de_60": self.rnd.randint(0, 2),
+            "Adultos_entre_18_a_60": self.rnd.randint(1, 5),
+            "Adolescentes_entre_13_17": self.rnd.randint(0, 3),
+            "Nino_menores_de_13": self.rnd.randint(0, 4),
+            "Total_de_hembras_Familia": self.rnd.randint(1, 5),
+            "Total_varones_en_Familia": self.rnd.randint(1, 5),
+            "_cu_l_es_el_mayor_nivel_de_educ": self.rnd.choice(EDUCATION),
+            "Trabajadores_en_UP": workers_men + workers_women,
+            "Trabajadores_hombres_UP": workers_men,
+            "Trabajadores_mujeres_UP": workers_women,
+            "Trabajadores_adolecen_UP": 0,
+            "Trabajadores_ninos_UP": 0,
+            "_alg_n_integrante_de_la_unidad": self.rnd.choice(["ninguna", "ninguna", "hipertension", "diabetes"]),
+            "observaciones_encuestador": "",
+            "riesgo_EDUR": self.rnd.choices(RISK_LEVELS, [7, 2, 1])[0],
+        }
+        return {"type": "Feature", "properties": properties, "geometry": geometry}
+
+    def _ring(self, west, south, size):
+        # Polígono estrellado alrededor del centro de la celda: los ángulos son
+        # crecientes (anillo simple y antihorario) y los radios no salen de ella.
+        center_lng, center_lat = west + size / 2, south + size / 2
+        vertices = self.rnd.randint(5, 9)
+        ring = []
+        for vertex in range(vertices):
+            angle = 2 * math.pi * (vertex + self.rnd.uniform(-0.3, 0.3)) / vertices
+            radius = size / 2 * self.rnd.uniform(0.45, 0.9)
+            ring.append([round(center_lng + radius * math.cos(angle), 7), round(center_lat + radius * math.sin(angle), 7)])
+        ring.append(list(ring[0]))
+        return ring
+
+    @staticmethod
+    def _area_hectares(geometry):
+        polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+        total = 0.0
+        for polygon in polygons:
+            ring = polygon[0]
+            shoelace = sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:])) / 2
+            meters_per_degree_lng = 111_320 * math.cos(math.radians(ring[0][1]))
+            total += abs(shoelace) * meters_per_degree_lng * 110_574 / 10_000
+        return total
+
+    # --- Lotes y diligencias ------------------------------------------------
+
+    def _create_batches(self, producers, plots, logs):
+        plots_by_producer = {}
+        for plot in plots:
+            plots_by_producer.setdefault(plot.producer_id, []).append(plot)
+
+        batches = []
+        for producer in producers:
+            for sequence in range(1, self.rnd.randint(0, max(self.options["max_batches"], 0)) + 1):
+                plot = self.rnd.choice(plots_by_producer[producer.pk])
+                created_at = self._moment()
+                batch = Batch(
+                    batch_id=f"{self.prefix}-L-{producer.code.rsplit('-', 1)[-1]}-{sequence:02d}",
+                    quantity=self._decimal(self.rnd.uniform(40, 2500), 2),
+                    warehouse_location=self.rnd.choice(self.warehouses) if self.warehouses else None,
+                    eudr_compliance_status=self.rnd.choices(["compliant", "pending", "non_compliant"], [6, 3, 1])[0],
+                    producer=producer,
+                    plot=plot,
+                    created_at=created_at,
+                )
+                batches.append(batch)
+                logs.append(
+                    ActivityLog(
+                        category="Inventario",
+                        title=f"Lote registrado: {batch.batch_id}",
+                        meta=producer.full_name,
+                        event_type=ActivityLog.EVENT_CREATE,
+                        created_at=created_at,
+                    )
+                )
+        Batch.objects.bulk_create(batches)
+        return batches
+
+    def _create_diligences(self, count, producer_ids):
+        if not producer_ids or count <= 0:
+            return
+        diligences = []
+        for number in range(1, count + 1):
+            opened = (HISTORY_START + timedelta(days=self.rnd.randint(0, HISTORY_DAYS - 120))).date()
+            status = self.rnd.choices(["draft", "active", "completed", "archived"], [1, 4, 4, 1])[0]
+            diligences.append(
+                EudrDiligence(
+                    public_id=uuid.UUID(int=self.rnd.getrandbits(128) ^ self.uuid_mask, version=4),
+                    name=f"Embarque {number:04d}",
+                    reference_code=f"{self.prefix}-DD-{number:05d}",
+                    description="Diligencia generada para pruebas de carga.",
+                    status=status,
+                    target_market=self.rnd.choice(["Unión Europea", "Alemania", "Países Bajos", "Bélgica"]),
+                    opened_at=opened,
+                    closed_at=opened + timedelta(days=self.rnd.randint(30, 120)) if status in {"completed", "archived"} else None,
+                )
+            )
+        EudrDiligence.objects.bulk_create(diligences)
+        _ensure_primary_keys(EudrDiligence, diligences, "reference_code")
+
+        participants, entries, logs = [], [], []
+        for diligence in diligences:
+            members = self.rnd.sample(producer_ids, min(len(producer_ids), self.rnd.randint(3, 12)))
+            for index, producer_id in enumerate(members):
+                participants.append(
+                    EudrDiligenceProducer(
+                        diligence=diligence,
+                        producer_id=producer_id,
+                        role="buyer" if index == 0 else self.rnd.choice(["supplier", "origin"]),
+                    )
+                )
+            batches = list(Batch.objects.filter(producer_id__in=members).order_by("pk").values_list("pk", flat=True)[:20])
+            event_date = diligence.opened_at
+            for event_type in DILIGENCE_EVENTS[: self.rnd.randint(2, len(DILIGENCE_EVENTS))]:
+                event_date += timedelta(days=self.rnd.randint(1, 20))
+                entries.append(
+                    EudrTimelineEntry(
+                        diligence=diligence,
+                        event_type=event_type,
+                        title=f"{dict(EudrTimelineEntry.EVENT_TYPES)[event_type]} {diligence.reference_code}",
+                        status=self.rnd.choices(["pending", "approved", "rejected"], [2, 7, 1])[0],
+                        event_date=event_date,
+                        batch_id=self.rnd.choice(batches) if batches and event_type != "due_diligence" else None,
+                        meta={"generated": True},
+                    )
+                )
+            logs.append(
+                ActivityLog(
+                    category="EUDR",
+                    title=f"Diligencia registrada: {diligence.name}",
+                    meta=diligence.reference_code,
+                    event_type=ActivityLog.EVENT_CREATE,
+                    created_at=datetime.combine(diligence.opened_at, datetime.min.time(), tzinfo=dt_timezone.utc),
+                )
+            )
+        EudrDiligenceProducer.objects.bulk_create(participants)
+        EudrTimelineEntry.objects.bulk_create(entries)
+        ActivityLog.objects.bulk_create(logs)
+        self.counts["diligencias"] += len(diligences)
+        self.counts["eventos"] += len(entries)
+        self.counts["actividad"] += len(logs)
+
+    # --- Auxiliares ---------------------------------------------------------
+
+    def _log(self, category, title, meta, item):
+        return ActivityLog(
+            category=category,
+            title=title,
+            meta=meta,
+            event_type=ActivityLog.EVENT_CREATE,
+            created_at=item.survey_fields["census_date"],
+        )
+
+    def _moment(self):
+        return HISTORY_START + timedelta(seconds=self.rnd.randint(0, HISTORY_DAYS * 86_400))
+
+    def _person_name(self):
+        return f"{self.rnd.choice(FIRST_NAMES)} {self.rnd.choice(LAST_NAMES)} {self.rnd.choice(LAST_NAMES)}"
+
+    def _phone(self):
+        return f"04{self.rnd.choice(['14', '16', '24', '26'])}{self.rnd.randint(1_000_000, 9_999_999)}"
+
+    @staticmethod
+    def _decimal(value, places):
+        return Decimal(str(round(value, places)))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a armar los documentos de búsqueda (SearchDocument) desde los modelos: "
+        "carga inicial o reparación después de escrituras que no pasaron por las señales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kinds", nargs="*", help="Tipos a reconstruir (por defecto, todos los registrados).")
+
+    def handle(self, *args, **options):
+        kinds = options["kinds"] or search.registered_kinds()
+        unknown = set(kinds) - set(search.registered_kinds())
+        if unknown:
+            raise CommandError(f"Tipos desconocidos: {', '.join(sorted(unknown))}.")
+        for kind in kinds:
+            with transaction.atomic():
+                changed, removed = search.rebuild(kind)
+            self.stdout.write(f"{kind}: {changed} documentos actualizados, {removed} dados de baja.")
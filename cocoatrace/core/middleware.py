@@ -0,0 +1,12 @@
+from .utils import buffered_activity_log
+
+
+class ActivityLogBufferMiddleware:
+    """Escribe los registros de actividad de cada petición en una sola operación."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered_activity_log():
+            return self.get_response(request)
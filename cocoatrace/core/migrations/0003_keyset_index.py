@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_activitylog_event_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['created_at', 'id'], name='core_activitylog_created_idx'),
+        ),
+    ]
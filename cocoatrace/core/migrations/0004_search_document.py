@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('text', models.TextField(blank=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='core_searchdoc_updated_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='core_searchdocument_object_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('generation', models.BigIntegerField()),
+                ('object_id', models.BigIntegerField()),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'generation'], name='core_genchange_key_gen_idx'), models.Index(fields=['changed_at'], name='core_genchange_changed_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class ActivityLog(models.Model):
@@ -21,6 +22,76 @@ class ActivityLog(models.Model):
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [
+			# Orden de la paginación por clave del listado.
+			models.Index(fields=['created_at', 'id'], name='core_activitylog_created_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.created_at:%Y-%m-%d %H:%M} · {self.title}"
+
+
+class Generation(models.Model):
+	"""Contador compartido por todos los procesos (ver ``core.generations``).
+
+	Los índices en memoria de cada proceso guardan la generación con la que
+	se construyeron y se recargan cuando la de esta tabla es otra.
+	"""
+
+	key = models.CharField(max_length=100, unique=True)
+	value = models.BigIntegerField(default=0)
+
+	def __str__(self):
+		return f"{self.key} = {self.value}"
+
+
+class GenerationChange(models.Model):
+	"""Registro cambiado en una generación de ``Generation``.
+
+	Un proceso con un índice en la generación ``n`` lee las filas de su clave
+	con generación mayor que ``n`` y actualiza solo esos registros, sin
+	recargar todo. Las filas viejas se borran (ver ``core.generations``).
+	"""
+
+	key = models.CharField(max_length=100)
+	generation = models.BigIntegerField()
+	object_id = models.BigIntegerField()
+	changed_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['key', 'generation'], name='core_genchange_key_gen_idx'),
+			models.Index(fields=['changed_at'], name='core_genchange_changed_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.key} {self.generation} · {self.object_id}"
+
+
+class SearchDocument(models.Model):
+	"""Texto de búsqueda desnormalizado de un registro (productor, parcela...).
+
+	Lo escriben las señales y la importación a través de ``core.search``, que
+	arma con estas filas el índice de trigramas de cada proceso y sigue los
+	cambios de los demás por ``updated_at``. Las bajas se marcan con
+	``deleted`` en lugar de borrarse para que esos procesos se enteren.
+	"""
+
+	kind = models.CharField(max_length=20)
+	object_id = models.BigIntegerField()
+	label = models.CharField(max_length=255, blank=True)
+	# Sin acentos, en minúsculas y solo con letras, dígitos y espacios.
+	text = models.TextField(blank=True)
+	deleted = models.BooleanField(default=False)
+	updated_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['kind', 'object_id'], name='core_searchdocument_object_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['updated_at'], name='core_searchdoc_updated_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.kind} {self.object_id} · {self.label}"
@@ -0,0 +1,163 @@
+"""Paginación por clave (keyset) para los listados.
+
+En lugar de ``OFFSET`` cada página pide las filas que siguen (o preceden) a
+la última mostrada según un orden indexado, p. ej. ``("-created_at", "-pk")``,
+así que una página profunda cuesta lo mismo que la primera. El cursor viaja
+en ``?after=`` o ``?before=`` con los valores de orden de esa fila.
+
+El total es opcional y aproximado: sin filtros se usa la estadística de filas
+de la base de datos; con filtros se cuenta como mucho ``ESTIMATE_CAP`` filas.
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 25
+ESTIMATE_CAP = 10_000
+
+
+@dataclass
+class KeysetPage:
+    object_list: List[Any]
+    has_next: bool
+    has_previous: bool
+    next_query: str = ""
+    previous_query: str = ""
+    total: Optional[int] = None
+    # ``total`` es una estimación (estadísticas) o un mínimo (conteo acotado).
+    total_is_estimate: bool = False
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+
+def _order_fields(model, ordering: Sequence[str]) -> List[Tuple[str, Any, bool]]:
+    """``(nombre, campo, descendente)`` de cada clave de orden."""
+    fields = []
+    for key in ordering:
+        name = key.lstrip("-")
+        field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        fields.append((name, field, key.startswith("-")))
+    return fields
+
+
+def _encode_cursor(values: Sequence[Any]) -> str:
+    plain = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(plain).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, fields) -> Optional[List[Any]]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [field.to_python(value) for (_name, field, _desc), value in zip(fields, values)]
+    except Exception:  # pylint: disable=broad-except
+        # Un cursor alterado o viejo lleva a la primera página.
+        return None
+
+
+def _after(fields, values, forward: bool) -> Q:
+    """Filas estrictamente posteriores (o anteriores) a ``values`` en el orden dado."""
+    condition = Q()
+    for position, (name, _field, descending) in enumerate(fields):
+        lookup = "lt" if descending == forward else "gt"
+        step = Q(**{f"{name}__{lookup}": values[position]})
+        for (previous, _f, _d), value in zip(fields[:position], values[:position]):
+            step &= Q(**{previous: value})
+        condition |= step
+    return condition
+
+
+def _table_estimate(queryset) -> Optional[int]:
+    """Filas de la tabla según las estadísticas del motor, si las expone."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    elif connection.vendor == "microsoft":
+        sql = "SELECT SUM(row_count) FROM sys.dm_db_partition_stats WHERE object_id = OBJECT_ID(%s) AND index_id IN (0, 1)"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    # PostgreSQL devuelve -1 para tablas que nunca se analizaron.
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimated_count(queryset) -> Tuple[int, bool]:
+    """``(total, es_estimación)`` sin recorrer toda la tabla."""
+    if not queryset.query.where:
+        estimate = _table_estimate(queryset)
+        if estimate is not None:
+            return estimate, True
+    counted = queryset.order_by()[: ESTIMATE_CAP + 1].count()
+    return min(counted, ESTIMATE_CAP), counted > ESTIMATE_CAP
+
+
+def _query_with(request, **params) -> str:
+    query = request.GET.copy()
+    for name in ("after", "before"):
+        query.pop(name, None)
+    for name, value in params.items():
+        query[name] = value
+    return query.urlencode()
+
+
+def keyset_page(
+    request,
+    queryset,
+    ordering: Sequence[str],
+    per_page: int = DEFAULT_PER_PAGE,
+    with_total: bool = False,
+) -> KeysetPage:
+    """Página de ``queryset`` según los cursores ``after``/``before`` de la petición.
+
+    ``ordering`` debe terminar en una clave única (normalmente ``pk``) y
+    tener un índice que la cubra.
+    """
+    fields = _order_fields(queryset.model, ordering)
+    after = _decode_cursor(request.GET.get("after", ""), fields) if request.GET.get("after") else None
+    before = _decode_cursor(request.GET.get("before", ""), fields) if request.GET.get("before") and not after else None
+
+    if before is not None:
+        # Hacia atrás: orden invertido y la página se da vuelta al final.
+        reversed_ordering = [key[1:] if key.startswith("-") else f"-{key}" for key in ordering]
+        rows = list(queryset.filter(_after(fields, before, forward=False)).order_by(*reversed_ordering)[: per_page + 1])
+        if not rows:
+            # Nada antes del cursor: se muestra la primera página.
+            before = None
+        has_previous = len(rows) > per_page
+        object_list = rows[:per_page][::-1]
+        has_next = True
+    if before is None:
+        if after is not None:
+            queryset_page = queryset.filter(_after(fields, after, forward=True))
+        else:
+            queryset_page = queryset
+        rows = list(queryset_page.order_by(*ordering)[: per_page + 1])
+        has_next = len(rows) > per_page
+        object_list = rows[:per_page]
+        has_previous = after is not None
+
+    page = KeysetPage(object_list=object_list, has_next=has_next and bool(object_list), has_previous=has_previous)
+    if object_list:
+        first = [getattr(object_list[0], field.attname) for _name, field, _desc in fields]
+        last = [getattr(object_list[-1], field.attname) for _name, field, _desc in fields]
+        page.next_query = _query_with(request, after=_encode_cursor(last))
+        page.previous_query = _query_with(request, before=_encode_cursor(first))
+    if with_total:
+        page.total, page.total_is_estimate = estimated_count(queryset)
+    return page
@@ -0,0 +1,433 @@
+"""Búsqueda de texto por trigramas sobre registros desnormalizados.
+
+Cada app registra con ``register`` una función que arma el texto de sus
+registros (p. ej. nombre, código y cédula de un productor). Ese texto se
+guarda sin acentos en ``SearchDocument``: las señales y la importación lo
+mantienen con ``refresh``/``remove``.
+
+Cada proceso construye desde esa tabla un índice invertido de trigramas en
+NumPy: para cada trigrama, la lista ordenada de documentos que lo tienen.
+Buscar es juntar las listas de los trigramas de la consulta y contar
+cuántos comparte cada documento; el puntaje es la fracción de trigramas de la
+consulta que aparecen (y, para desempatar, la similitud con el documento
+completo), así que tolera errores de tipeo y palabras en otro orden.
+
+Los cambios hechos en el proceso se aplican al confirmar la transacción; los
+de otros procesos se leen de ``SearchDocument`` por ``updated_at`` cada
+``SYNC_INTERVAL`` segundos. Ambos quedan en una capa aparte que se revisa
+fila por fila hasta que crece lo suficiente; entonces se construye un índice
+nuevo en otro hilo mientras el actual (con esa capa) sigue respondiendo, y se
+reemplaza cuando está listo. ``warm`` empieza esa construcción al arrancar
+el servidor para que la primera búsqueda no la espere.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .db import bulk_update_rows
+from .models import SearchDocument
+
+DEFAULT_LIMIT = 50
+# Fracción mínima de los trigramas de la consulta que debe tener un resultado.
+MIN_COVERAGE = 0.5
+# Cada cuántos segundos un proceso lee los cambios de los demás.
+SYNC_INTERVAL = 2.0
+# Cuánto hacia atrás se releen, por transacciones que confirmaron después de
+# escribir su ``updated_at``.
+SYNC_OVERLAP = timedelta(seconds=60)
+# Cambios pendientes tolerados antes de reconstruir (mínimo y fracción del índice).
+PENDING_MIN = 5000
+PENDING_RATIO = 0.02
+# Las bajas se conservan este tiempo para que los demás procesos las vean.
+TOMBSTONE_TTL = timedelta(days=1)
+# Documentos procesados por tanda al construir el índice.
+BUILD_BATCH = 100_000
+# SQL Server admite como mucho 2100 parámetros por consulta.
+CHUNK_SIZE = 2000
+
+# (id, etiqueta, texto sin normalizar)
+Row = Tuple[int, str, str]
+
+_ALPHABET = " abcdefghijklmnopqrstuvwxyz0123456789"
+# El código 0 separa palabras y documentos: ningún trigrama lo cruza.
+_BASE = len(_ALPHABET) + 1
+_TRIGRAM_COUNT = _BASE**3
+_CHAR_CODES = np.zeros(256, dtype=np.int64)
+for _code, _char in enumerate(_ALPHABET, start=1):
+    _CHAR_CODES[ord(_char)] = _code
+_KIND_SHIFT = 48
+_ID_MASK = (1 << _KIND_SHIFT) - 1
+
+
+def normalize(value) -> str:
+    """Texto sin acentos, en minúsculas y con las palabras separadas por un espacio."""
+    decomposed = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", decomposed.lower()).split())
+
+
+def _padded(text: str) -> str:
+    # Como pg_trgm: dos espacios antes y uno después de cada palabra.
+    return "  " + text.replace(" ", " \x00  ") + " " if text else ""
+
+
+def _trigram_pairs(texts: Sequence[str], first: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """``(trigrama, documento)`` distintos de ``texts`` (normalizados), ordenados por trigrama.
+
+    Los documentos se numeran desde ``first``.
+    """
+    padded = [_padded(text) for text in texts]
+    chars = _CHAR_CODES[np.frombuffer("\x00".join(padded).encode("ascii"), dtype=np.uint8)]
+    if len(chars) < 3:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    lengths = np.fromiter((len(text) + 1 for text in padded), dtype=np.int64, count=len(padded))
+    documents = np.repeat(np.arange(first, first + len(padded), dtype=np.int64), lengths)[: len(chars) - 2]
+    codes = (chars[:-2] * _BASE + chars[1:-1]) * _BASE + chars[2:]
+    valid = (chars[:-2] > 0) & (chars[1:-1] > 0) & (chars[2:] > 0)
+    keys = np.sort((codes[valid] << 32) | documents[valid])
+    # Sin np.unique: ordenar y comparar con el vecino es bastante más rápido.
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return (keys >> 32).astype(np.int32), (keys & 0xFFFFFFFF).astype(np.int32)
+
+
+def query_trigrams(text: str) -> np.ndarray:
+    """Trigramas distintos de un texto ya normalizado."""
+    return _trigram_pairs([text])[0]
+
+
+def _score(shared, query_size: int, document_size):
+    # Fracción de la consulta encontrada; la similitud (Jaccard) con el
+    # documento solo desempata, nunca supera un paso de la fracción.
+    return shared / query_size + 0.001 * shared / (query_size + document_size - shared)
+
+
+class TrigramIndex:
+    """Listas invertidas de trigramas de documentos identificados por una clave entera.
+
+    La clave de cada documento combina el tipo y el id del registro (ver
+    ``_key``). ``pending`` guarda los documentos cambiados desde la
+    construcción (``None`` si se borraron); las posiciones que reemplazan
+    quedan marcadas en ``shadowed``.
+    """
+
+    def __init__(self, keys: np.ndarray, texts: Sequence[str]):
+        order = np.argsort(keys, kind="stable")
+        self.keys = np.asarray(keys, dtype=np.int64)[order]
+        count = len(self.keys)
+        self.sizes = np.zeros(count, dtype=np.int32)
+        self.shadowed = np.zeros(count, dtype=bool)
+        self.pending: Dict[int, Optional[Set[int]]] = {}
+        self.synced_until = None
+        self.synced_clock = 0.0
+
+        batches = []
+        counts = np.zeros(_TRIGRAM_COUNT, dtype=np.int64)
+        for start in range(0, count, BUILD_BATCH):
+            stop = min(start + BUILD_BATCH, count)
+            codes, documents = _trigram_pairs([texts[position] for position in order[start:stop].tolist()], start)
+            counts += np.bincount(codes, minlength=_TRIGRAM_COUNT)
+            self.sizes[start:stop] = np.bincount(documents - start, minlength=stop - start)
+            batches.append((codes, documents))
+
+        # Cada tanda llega ordenada por trigrama y sus documentos son
+        # posteriores a los de la tanda anterior: se copian a continuación de
+        # lo ya escrito para cada trigrama y las listas quedan ordenadas.
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.postings = np.empty(int(self.offsets[-1]), dtype=np.int32)
+        cursor = self.offsets[:-1].copy()
+        while batches:
+            codes, documents = batches.pop(0)
+            rank = np.arange(len(codes)) - np.searchsorted(codes, codes)
+            self.postings[cursor[codes] + rank] = documents
+            cursor += np.bincount(codes, minlength=_TRIGRAM_COUNT)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def needs_rebuild(self) -> bool:
+        return len(self.pending) > max(PENDING_MIN, PENDING_RATIO * len(self.keys))
+
+    def update(self, documents: Dict[int, Optional[str]]) -> None:
+        """Reemplaza el texto de cada clave (``None`` la quita del índice)."""
+        if not documents:
+            return
+        for key, text in documents.items():
+            self.pending[key] = None if text is None else set(query_trigrams(text).tolist())
+        keys = np.fromiter(documents, dtype=np.int64, count=len(documents))
+        positions = np.searchsorted(self.keys, keys)
+        inside = positions < len(self.keys)
+        found = positions[inside][self.keys[positions[inside]] == keys[inside]]
+        self.shadowed[found] = True
+
+    def search(self, query: np.ndarray, kinds: Optional[Set[int]], limit: int) -> List[Tuple[int, float]]:
+        """``(clave, puntaje)`` de los mejores ``limit`` documentos para los trigramas ``query``."""
+        query_size = len(query)
+        needed = max(1, math.ceil(query_size * MIN_COVERAGE))
+        lists = [self.postings[self.offsets[code] : self.offsets[code + 1]] for code in query.tolist()]
+        total = sum(len(postings) for postings in lists)
+        results: List[Tuple[int, float]] = []
+        if total:
+            joined = np.concatenate(lists)
+            if total * 8 < len(self.keys):
+                joined.sort()
+                starts = np.flatnonzero(np.concatenate(([True], joined[1:] != joined[:-1])))
+                positions, shared = joined[starts], np.diff(np.append(starts, len(joined)))
+            else:
+                shared = np.bincount(joined, minlength=len(self.keys))
+                positions = np.flatnonzero(shared >= needed)
+                shared = shared[positions]
+            keep = (shared >= needed) & ~self.shadowed[positions]
+            if kinds is not None:
+                keep &= np.isin(self.keys[positions] >> _KIND_SHIFT, list(kinds))
+            positions, shared = positions[keep], shared[keep]
+            scores = _score(shared, query_size, self.sizes[positions])
+            if len(scores) > limit:
+                best = np.argpartition(-scores, limit - 1)[:limit]
+                positions, scores = positions[best], scores[best]
+            results = list(zip(self.keys[positions].tolist(), scores.tolist()))
+
+        wanted = set(query.tolist())
+        for key, trigrams in self.pending.items():
+            if trigrams is None or (kinds is not None and key >> _KIND_SHIFT not in kinds):
+                continue
+            shared = len(wanted & trigrams)
+            if shared >= needed:
+                results.append((key, _score(shared, query_size, len(trigrams))))
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results[:limit]
+
+
+# --- Registro de tipos de documento -----------------------------------------
+
+_builders: Dict[str, Callable[..., Iterable[Row]]] = {}
+_kind_codes: Dict[str, int] = {}
+_kind_names: Dict[int, str] = {}
+
+
+def register(kind: str, builder: Callable[..., Iterable[Row]]) -> None:
+    """Registra el tipo ``kind``; ``builder(**filtros)`` devuelve ``(id, etiqueta, texto)``."""
+    _builders[kind] = builder
+    if kind not in _kind_codes:
+        code = len(_kind_codes) + 1
+        _kind_codes[kind] = code
+        _kind_names[code] = kind
+
+
+def _key(kind: str, object_id: int) -> int:
+    return (_kind_codes[kind] << _KIND_SHIFT) | object_id
+
+
+# --- Índice del proceso -----------------------------------------------------
+
+_lock = threading.Lock()
+_index: Optional[TrigramIndex] = None
+# Hilo que construye un índice nuevo y el índice que dejó listo; se
+# reemplazan con ``_lock`` tomado.
+_builder: Optional[threading.Thread] = None
+_built: Optional[TrigramIndex] = None
+
+
+def _load_index() -> TrigramIndex:
+    started = timezone.now()
+    keys: List[int] = []
+    texts: List[str] = []
+    rows = SearchDocument.objects.filter(deleted=False, kind__in=list(_kind_codes)).order_by()
+    for kind, object_id, text in rows.values_list("kind", "object_id", "text").iterator(chunk_size=20_000):
+        keys.append(_key(kind, object_id))
+        texts.append(text)
+    index = TrigramIndex(np.array(keys, dtype=np.int64), texts)
+    index.synced_until = started
+    index.synced_clock = time.monotonic()
+    return index
+
+
+def _sync(index: TrigramIndex) -> None:
+    started = timezone.now()
+    rows = SearchDocument.objects.filter(updated_at__gte=index.synced_until - SYNC_OVERLAP, kind__in=list(_kind_codes))
+    index.update(
+        {
+            _key(kind, object_id): None if deleted else text
+            for kind, object_id, text, deleted in rows.values_list("kind", "object_id", "text", "deleted")
+        }
+    )
+    index.synced_until = started
+    index.synced_clock = time.monotonic()
+
+
+def _build() -> None:
+    global _built
+    try:
+        _built = _load_index()
+    finally:
+        connection.close()
+
+
+def _start_build() -> None:
+    """Empieza a construir un índice nuevo en otro hilo; se llama con ``_lock`` tomado."""
+    global _builder
+    if _builder is None:
+        _builder = threading.Thread(target=_build, name="search-index", daemon=True)
+        _builder.start()
+
+
+def warm() -> None:
+    """Construye el índice del proceso en segundo plano (al arrancar el servidor)."""
+    with _lock:
+        if _index is None:
+            _start_build()
+
+
+def _current_index() -> TrigramIndex:
+    """Índice del proceso al día; se llama con ``_lock`` tomado."""
+    global _index, _builder, _built
+    if _index is None and _builder is not None:
+        # ``warm`` ya lo está construyendo: no tiene sentido empezar otro.
+        _builder.join()
+    if _builder is not None and not _builder.is_alive():
+        if _built is not None:
+            _index, _built = _built, None
+            # Lo que cambió mientras se construía.
+            _sync(_index)
+        _builder = None
+    if _index is None:
+        _index = _load_index()
+    elif time.monotonic() - _index.synced_clock >= SYNC_INTERVAL:
+        _sync(_index)
+    if _index.needs_rebuild():
+        _start_build()
+    return _index
+
+
+def _apply(documents: Dict[int, Optional[str]]) -> None:
+    with _lock:
+        if _index is not None:
+            _index.update(documents)
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    kind: str
+    object_id: int
+    score: float
+
+
+def search(query: str, kinds: Optional[Iterable[str]] = None, limit: int = DEFAULT_LIMIT) -> List[SearchHit]:
+    """Registros que mejor coinciden con ``query``, del más parecido al menos."""
+    trigrams = query_trigrams(normalize(query))
+    if not len(trigrams) or limit <= 0:
+        return []
+    wanted = None if kinds is None else {_kind_codes[kind] for kind in kinds if kind in _kind_codes}
+    with _lock:
+        found = _current_index().search(trigrams, wanted, limit)
+    return [SearchHit(_kind_names[key >> _KIND_SHIFT], key & _ID_MASK, round(score, 4)) for key, score in found]
+
+
+def labels(hits: Iterable[SearchHit]) -> Dict[Tuple[str, int], str]:
+    """Etiqueta guardada de cada resultado, por ``(tipo, id)``."""
+    by_kind: Dict[str, List[int]] = {}
+    for hit in hits:
+        by_kind.setdefault(hit.kind, []).append(hit.object_id)
+    found: Dict[Tuple[str, int], str] = {}
+    for kind, object_ids in by_kind.items():
+        for start in range(0, len(object_ids), CHUNK_SIZE):
+            rows = SearchDocument.objects.filter(kind=kind, object_id__in=object_ids[start : start + CHUNK_SIZE])
+            for object_id, label in rows.values_list("object_id", "label"):
+                found[(kind, object_id)] = label
+    return found
+
+
+# --- Escritura de documentos ------------------------------------------------
+
+
+def store(kind: str, rows: Iterable[Row]) -> int:
+    """Guarda el texto de ``rows`` y devuelve cuántos documentos cambiaron.
+
+    Solo se escriben las filas nuevas o distintas de lo guardado; el índice
+    del proceso se actualiza al confirmar la transacción.
+    """
+    now = timezone.now()
+    wanted = {object_id: ((label or "")[:255], normalize(text)) for object_id, label, text in rows}
+    object_ids = sorted(wanted)
+    changed: Dict[int, Optional[str]] = {}
+    for start in range(0, len(object_ids), CHUNK_SIZE):
+        chunk = object_ids[start : start + CHUNK_SIZE]
+        existing = {document.object_id: document for document in SearchDocument.objects.filter(kind=kind, object_id__in=chunk)}
+        to_create: List[SearchDocument] = []
+        to_update: List[SearchDocument] = []
+        for object_id in chunk:
+            label, text = wanted[object_id]
+            document = existing.get(object_id)
+            if document is None:
+                to_create.append(SearchDocument(kind=kind, object_id=object_id, label=label, text=text, updated_at=now))
+            elif document.deleted or document.label != label or document.text != text:
+                document.label, document.text, document.deleted, document.updated_at = label, text, False, now
+                to_update.append(document)
+            else:
+                continue
+            changed[_key(kind, object_id)] = text
+        SearchDocument.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+        bulk_update_rows(SearchDocument, to_update, ["label", "text", "deleted", "updated_at"])
+    if changed:
+        transaction.on_commit(lambda: _apply(changed))
+    return len(changed)
+
+
+def remove(kind: str, object_ids: Iterable[int]) -> None:
+    """Marca como borrados los documentos de ``object_ids``."""
+    object_ids = sorted(set(object_ids))
+    for start in range(0, len(object_ids), CHUNK_SIZE):
+        SearchDocument.objects.filter(kind=kind, object_id__in=object_ids[start : start + CHUNK_SIZE]).update(
+            deleted=True, text="", updated_at=timezone.now()
+        )
+    removed: Dict[int, Optional[str]] = {_key(kind, object_id): None for object_id in object_ids}
+    if removed:
+        transaction.on_commit(lambda: _apply(removed))
+
+
+def refresh(kind: str, object_ids: Iterable[int]) -> int:
+    """Vuelve a armar los documentos de ``object_ids`` desde su modelo."""
+    object_ids = sorted({object_id for object_id in object_ids if object_id is not None})
+    changed = 0
+    for start in range(0, len(object_ids), CHUNK_SIZE):
+        chunk = object_ids[start : start + CHUNK_SIZE]
+        rows = list(_builders[kind](pk__in=chunk))
+        changed += store(kind, rows)
+        missing = set(chunk) - {row[0] for row in rows}
+        if missing:
+            remove(kind, missing)
+    return changed
+
+
+def rebuild(kind: str) -> Tuple[int, int]:
+    """Recorre todos los registros de ``kind``: ``(documentos cambiados, bajas)``.
+
+    También elimina las bajas de más de ``TOMBSTONE_TTL``.
+    """
+    changed = 0
+    seen: Set[int] = set()
+    batch: List[Row] = []
+    for row in _builders[kind]():
+        batch.append(row)
+        seen.add(row[0])
+        if len(batch) >= CHUNK_SIZE:
+            changed += store(kind, batch)
+            batch = []
+    changed += store(kind, batch)
+    stored = SearchDocument.objects.filter(kind=kind, deleted=False).values_list("object_id", flat=True)
+    gone = set(stored.iterator(chunk_size=20_000)) - seen
+    remove(kind, gone)
+    SearchDocument.objects.filter(kind=kind, deleted=True, updated_at__lt=timezone.now() - TOMBSTONE_TTL).delete()
+    return changed, len(gone)
+
+
+def registered_kinds() -> List[str]:
+    return list(_builders)
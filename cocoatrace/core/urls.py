@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('actividad/', views.activity_list, name='activity_list'),
+]
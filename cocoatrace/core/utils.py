@@ -1,11 +1,72 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from django.db import transaction
+
 from .models import ActivityLog
 
+# Registros acumulados antes de escribirlos con un único bulk_create.
+ACTIVITY_LOG_FLUSH_SIZE = 500
+
+
+class _ActivityBuffer:
+    def __init__(self) -> None:
+        self.entries: List[ActivityLog] = []
+        self.open = True
+
+    def add(self, entry: ActivityLog) -> None:
+        # Un registro confirmado después de cerrar el búfer (transacción externa
+        # más larga que el bloque) se escribe directamente.
+        if not self.open:
+            entry.save()
+            return
+        self.entries.append(entry)
+        if len(self.entries) >= ACTIVITY_LOG_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        entries, self.entries = self.entries, []
+        if entries:
+            ActivityLog.objects.bulk_create(entries)
+
+
+_activity_buffer: ContextVar[Optional[_ActivityBuffer]] = ContextVar("activity_buffer", default=None)
+
+
+@contextmanager
+def buffered_activity_log() -> Iterator[None]:
+    """Agrupa los registros de actividad del bloque en escrituras masivas.
+
+    Cada registro entra al búfer cuando se confirma la transacción en la que se
+    creó, de modo que un rollback no deja registros huérfanos. Los bloques
+    anidados reutilizan el búfer exterior.
+    """
+    if _activity_buffer.get() is not None:
+        yield
+        return
+
+    buffer = _ActivityBuffer()
+    token = _activity_buffer.set(buffer)
+    try:
+        yield
+    finally:
+        _activity_buffer.reset(token)
+        buffer.flush()
+        buffer.open = False
+
 
 def log_activity(category: str, title: str, meta: str = "", event_type: str = ActivityLog.EVENT_CREATE) -> None:
     """Crea de forma segura un registro de actividad para el tablero."""
-    ActivityLog.objects.create(
+    entry = ActivityLog(
         category=category,
         title=title,
         meta=meta,
         event_type=event_type,
     )
+    buffer = _activity_buffer.get()
+    if buffer is None:
+        entry.save()
+        return
+    # Fuera de una transacción on_commit se ejecuta de inmediato.
+    transaction.on_commit(lambda: buffer.add(entry))
@@ -1,3 +1,13 @@
 from django.shortcuts import render
 
-# Create your views here.
+from .models import ActivityLog
+from .pagination import keyset_page
+
+
+def activity_list(request):
+    activities = ActivityLog.objects.all()
+    category = request.GET.get('category', '').strip()
+    if category:
+        activities = activities.filter(category=category)
+    page = keyset_page(request, activities, ('-created_at', '-pk'), per_page=50, with_total=True)
+    return render(request, 'core/activity_list.html', {'page': page, 'category': category})
@@ -6,6 +6,8 @@ from django.utils import timezone
 from django.views import View
 from django.views.generic import DetailView, ListView, CreateView
 
+from producers.models import PlotOverlap
+
 from .forms import (
     EudrAttachProducerForm,
     EudrDiligenceForm,
@@ -70,6 +72,9 @@ class DiligenceDetailView(LoginRequiredMixin, DetailView):
         )
         context["available_producers"] = attach_form.fields["producers"].queryset.order_by("full_name")
         context["producer_field_name"] = attach_form["producers"].html_name
+        overlaps = PlotOverlap.for_diligence(self.object)
+        context["overlaps"] = overlaps[:20]
+        context["overlap_count"] = overlaps.count()
         return context
 
 
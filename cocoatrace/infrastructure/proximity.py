@@ -0,0 +1,200 @@
+"""Cercanía entre parcelas y almacenes de acopio.
+
+Un KD-tree sobre los almacenes activos responde cuáles son los más cercanos a
+un punto en O(log n). Los almacenes se guardan como vectores de la esfera
+unitaria: la distancia en línea recta entre dos de ellos crece igual que la
+del círculo máximo, así que el árbol puede podar con planos y el resultado
+se convierte a kilómetros al final.
+
+``check_delivery`` usa esas distancias para marcar entregas de lotes poco
+creíbles: almacenes demasiado lejos de la parcela o mucho más lejos que el
+centro de acopio más cercano (``settings.BATCH_MAX_DELIVERY_KM`` y
+``settings.BATCH_MAX_DETOUR_KM``).
+
+El árbol se construye una vez por proceso. Al guardar o borrar un almacén se
+incrementa una generación guardada en la base de datos
+(``core.generations``), que ven todos los procesos, y cada uno reconstruye
+su árbol en la siguiente consulta.
+"""
+
+import heapq
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from core import generations
+
+from .models import Warehouse
+
+EARTH_RADIUS_KM = 6371.0088
+NEAREST_COUNT = 3
+GENERATION_KEY = "infrastructure:warehouse-index"
+
+
+def _unit_vectors(lngs: Sequence[float], lats: Sequence[float]) -> np.ndarray:
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    lat = np.radians(np.asarray(lats, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+
+
+def _chord_to_km(squared_chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(squared_chord) / 2, 1.0))
+
+
+def great_circle_km(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    first, second = _unit_vectors([lng1, lng2], [lat1, lat2])
+    return _chord_to_km(float(((first - second) ** 2).sum()))
+
+
+class KDTree:
+    """KD-tree balanceado e implícito: el nodo de ``[start, stop)`` es su mediana.
+
+    Cada rango se parte por la mediana del eje con mayor dispersión; los
+    hijos son las dos mitades, así que no hace falta guardar punteros.
+    """
+
+    def __init__(self, ids: Sequence[int], points: np.ndarray):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        order = np.arange(len(points))
+        axes = np.zeros(len(points), dtype=np.int64)
+        stack = [(0, len(points))]
+        while stack:
+            start, stop = stack.pop()
+            if stop - start <= 1:
+                continue
+            segment = order[start:stop]
+            axis = int(np.argmax(np.ptp(points[segment], axis=0)))
+            middle = (start + stop) // 2
+            order[start:stop] = segment[np.argpartition(points[segment, axis], middle - start)]
+            axes[middle] = axis
+            stack.extend(((start, middle), (middle + 1, stop)))
+        self.ids = [ids[position] for position in order.tolist()]
+        self.points = points[order].tolist()
+        self.axes = axes.tolist()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, point: Sequence[float], count: int = 1) -> List[Tuple[float, int]]:
+        """``(cuerda², id)`` de los ``count`` puntos más cercanos, del más cercano al más lejano."""
+        heap: List[Tuple[float, int]] = []
+
+        def visit(start: int, stop: int) -> None:
+            if start >= stop:
+                return
+            middle = (start + stop) // 2
+            node = self.points[middle]
+            distance = (point[0] - node[0]) ** 2 + (point[1] - node[1]) ** 2 + (point[2] - node[2]) ** 2
+            if len(heap) < count:
+                heapq.heappush(heap, (-distance, middle))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, middle))
+            axis = self.axes[middle]
+            offset = point[axis] - node[axis]
+            near, far = ((start, middle), (middle + 1, stop)) if offset < 0 else ((middle + 1, stop), (start, middle))
+            visit(*near)
+            if len(heap) < count or offset * offset < -heap[0][0]:
+                visit(*far)
+
+        visit(0, len(self.ids))
+        return sorted((-distance, self.ids[position]) for distance, position in heap)
+
+
+class WarehouseIndex:
+    """KD-tree de los almacenes activos con coordenadas."""
+
+    def __init__(self, rows: Sequence[Tuple[int, str, float, float]]):
+        self.codes = {warehouse_id: code for warehouse_id, code, _lng, _lat in rows}
+        self.tree = KDTree(
+            [row[0] for row in rows],
+            _unit_vectors([row[2] for row in rows], [row[3] for row in rows]),
+        )
+
+    def nearest(self, lng: float, lat: float, count: int = NEAREST_COUNT) -> List[Tuple[int, float]]:
+        """``(warehouse_id, km)`` de los almacenes activos más cercanos al punto."""
+        if not len(self.tree):
+            return []
+        point = _unit_vectors([lng], [lat])[0].tolist()
+        return [(warehouse_id, _chord_to_km(squared)) for squared, warehouse_id in self.tree.nearest(point, count)]
+
+
+def _load_index() -> WarehouseIndex:
+    rows = Warehouse.objects.filter(is_active=True, latitude__isnull=False, longitude__isnull=False).values_list(
+        "pk", "code", "longitude", "latitude"
+    )
+    return WarehouseIndex([(pk, code, float(lng), float(lat)) for pk, code, lng, lat in rows])
+
+
+_lock = threading.Lock()
+_index: Optional[WarehouseIndex] = None
+_index_generation: Optional[int] = None
+
+
+def warehouses_changed() -> None:
+    """Obliga a todos los procesos a reconstruir el árbol en su próxima consulta."""
+    generations.bump(GENERATION_KEY)
+
+
+def warehouse_index() -> WarehouseIndex:
+    global _index, _index_generation
+    generation = generations.current(GENERATION_KEY)
+    with _lock:
+        if _index is None or _index_generation != generation:
+            _index = _load_index()
+            _index_generation = generation
+        return _index
+
+
+def nearest_warehouses(lng: float, lat: float, count: int = NEAREST_COUNT) -> List[Tuple[int, float]]:
+    return warehouse_index().nearest(lng, lat, count)
+
+
+@dataclass
+class DeliveryCheck:
+    """Distancia de una entrega y, si no es creíble, el motivo."""
+
+    warehouse_id: int
+    distance_km: float
+    nearest: List[Tuple[int, float]] = field(default_factory=list)
+    reason: Optional[str] = None
+
+    @property
+    def plausible(self) -> bool:
+        return self.reason is None
+
+
+def check_delivery(
+    plot_lng: float,
+    plot_lat: float,
+    warehouse_id: int,
+    warehouse_lng: float,
+    warehouse_lat: float,
+    index: Optional[WarehouseIndex] = None,
+) -> DeliveryCheck:
+    """Compara la distancia parcela → almacén con el máximo y con el almacén más cercano."""
+    index = index or warehouse_index()
+    distance = great_circle_km(plot_lng, plot_lat, warehouse_lng, warehouse_lat)
+    check = DeliveryCheck(warehouse_id, distance, index.nearest(plot_lng, plot_lat))
+    if distance > settings.BATCH_MAX_DELIVERY_KM:
+        check.reason = f"el almacén está a {distance:.0f} km de la parcela (máximo {settings.BATCH_MAX_DELIVERY_KM:.0f} km)"
+    elif check.nearest and distance - check.nearest[0][1] > settings.BATCH_MAX_DETOUR_KM:
+        nearest_id, nearest_km = check.nearest[0]
+        check.reason = (
+            f"el almacén está a {distance:.0f} km de la parcela y "
+            f"{index.codes.get(nearest_id, nearest_id)} queda a {nearest_km:.0f} km"
+        )
+    return check
+
+
+def check_batch_delivery(batch) -> Optional[DeliveryCheck]:
+    """``check_delivery`` de un lote, o ``None`` si falta el polígono o la ubicación del almacén."""
+    plot, warehouse = batch.plot, batch.warehouse_location
+    if warehouse is None or warehouse.latitude is None or warehouse.longitude is None or plot.bbox_min_lng is None:
+        return None
+    return check_delivery(
+        plot.centroid_lng, plot.centroid_lat, warehouse.pk, float(warehouse.longitude), float(warehouse.latitude)
+    )
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Warehouse
+from .proximity import warehouses_changed
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def _refresh_warehouse_index(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(warehouses_changed)
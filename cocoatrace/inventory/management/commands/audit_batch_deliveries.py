@@ -0,0 +1,92 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from infrastructure.proximity import check_delivery, warehouse_index
+from inventory.models import Batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Revisa la distancia parcela → almacén de todos los lotes y lista las entregas poco creíbles "
+        "(ver BATCH_MAX_DELIVERY_KM y BATCH_MAX_DETOUR_KM)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Ruta del CSV a generar (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        index = warehouse_index()
+        rows = (
+            Batch.objects.filter(
+                warehouse_location__latitude__isnull=False,
+                warehouse_location__longitude__isnull=False,
+                plot__bbox_min_lng__isnull=False,
+            )
+            .order_by("pk")
+            .values_list(
+                "batch_id",
+                "quantity",
+                "producer__code",
+                "plot__plot_code",
+                "plot__centroid_lng",
+                "plot__centroid_lat",
+                "warehouse_location_id",
+                "warehouse_location__code",
+                "warehouse_location__longitude",
+                "warehouse_location__latitude",
+            )
+        )
+
+        output = open(options["output"], "w", newline="", encoding="utf-8") if options["output"] else self.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(
+                [
+                    "lote",
+                    "cantidad_kg",
+                    "productor",
+                    "parcela",
+                    "almacen",
+                    "distancia_km",
+                    "almacen_mas_cercano",
+                    "distancia_mas_cercano_km",
+                    "motivo",
+                ]
+            )
+            checked = flagged = 0
+            for (
+                batch_id,
+                quantity,
+                producer_code,
+                plot_code,
+                plot_lng,
+                plot_lat,
+                warehouse_id,
+                warehouse_code,
+                warehouse_lng,
+                warehouse_lat,
+            ) in rows.iterator(chunk_size=2000):
+                check = check_delivery(plot_lng, plot_lat, warehouse_id, float(warehouse_lng), float(warehouse_lat), index)
+                checked += 1
+                if check.plausible:
+                    continue
+                flagged += 1
+                nearest_id, nearest_km = check.nearest[0] if check.nearest else (None, None)
+                writer.writerow(
+                    [
+                        batch_id,
+                        quantity,
+                        producer_code,
+                        plot_code,
+                        warehouse_code,
+                        f"{check.distance_km:.1f}",
+                        index.codes.get(nearest_id, ""),
+                        f"{nearest_km:.1f}" if nearest_km is not None else "",
+                        check.reason,
+                    ]
+                )
+        finally:
+            if options["output"]:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f"{checked} lotes revisados; {flagged} con entregas poco creíbles."))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_remove_batch_eudr_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['created_at', 'id'], name='inventory_batch_created_idx'),
+        ),
+    ]
@@ -15,6 +15,12 @@ class Batch(models.Model):
     plot = models.ForeignKey(Plot, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Orden de la paginación por clave del listado.
+            models.Index(fields=["created_at", "id"], name="inventory_batch_created_idx"),
+        ]
+
     def __str__(self):
         producer_code = getattr(self.producer, "code", "?")
         return f"{self.batch_id} · {producer_code} ({self.quantity} kg)"
@@ -7,8 +7,10 @@ from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
 from core.models import ActivityLog
+from core.pagination import keyset_page
 from core.utils import log_activity
 from infrastructure.models import Warehouse
+from infrastructure.proximity import check_batch_delivery
 from producers.models import Producer, Plot
 
 from .models import Batch
@@ -28,9 +30,19 @@ def _recalculate_warehouse_stock(warehouse_id):
     Warehouse.objects.filter(pk=warehouse_id).update(current_stock_kg=total)
 
 
+def _warn_implausible_delivery(request, batch):
+    """Avisa (sin bloquear el registro) si la entrega del lote no es creíble."""
+    check = check_batch_delivery(batch)
+    if check and not check.plausible:
+        messages.warning(request, f'Revisa el almacén del lote {batch.batch_id}: {check.reason}.')
+
+
 def batch_list(request):
-    batches = Batch.objects.all()
-    return render(request, 'inventory/batch_list.html', {'batches': batches})
+    batches = Batch.objects.select_related('producer', 'plot', 'warehouse_location').defer(
+        *(f'plot__{name}' for name in Plot.GEOMETRY_PAYLOAD_FIELDS)
+    )
+    page = keyset_page(request, batches, ('-created_at', '-pk'), with_total=True)
+    return render(request, 'inventory/batch_list.html', {'batches': page, 'page': page})
 
 def create_batch(request):
     if request.method == 'POST':
@@ -54,6 +66,7 @@ def create_batch(request):
                 _recalculate_warehouse_stock(warehouse_id)
             log_activity('Inventario', f"Lote registrado: {batch.batch_id}", batch.producer.full_name, event_type=ActivityLog.EVENT_CREATE)
             messages.success(request, 'Lote registrado correctamente.')
+            _warn_implausible_delivery(request, batch)
             return redirect('batch_list')
 
     producers = Producer.objects.all()
@@ -97,9 +110,10 @@ def edit_batch(request, pk):
 
             log_activity('Inventario', f"Lote actualizado: {batch.batch_id}", batch.producer.full_name, event_type=ActivityLog.EVENT_UPDATE)
             messages.success(request, 'Lote actualizado correctamente.')
+            _warn_implausible_delivery(request, batch)
             return redirect('batch_list')
 
-    plots = Plot.objects.filter(producer=batch.producer)
+    plots = Plot.objects.filter(producer=batch.producer).defer(*Plot.GEOMETRY_PAYLOAD_FIELDS)
     return render(
         request,
         'inventory/edit_batch.html',
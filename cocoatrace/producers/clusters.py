@@ -0,0 +1,253 @@
+"""Agrupación de centroides de parcelas para el mapa general.
+
+Para cada zoom hasta ``MAX_CLUSTER_ZOOM`` los centroides se reparten en una
+grilla de celdas de ``CELL_PX`` píxeles (en Web Mercator) y cada celda guarda
+sumas: parcelas, parcelas conformes, longitudes, latitudes y la suma de los
+ids (que, con una sola parcela en la celda, es su id). Como todo son sumas,
+mover una parcela es restar su aporte anterior y sumar el nuevo, sin
+reconstruir la grilla. Por encima de ``MAX_CLUSTER_ZOOM`` se devuelven las
+parcelas sueltas, buscadas con el índice espacial.
+
+La grilla se construye una vez por proceso y se mantiene igual que
+``spatial_index``: los cambios de ``Plot.save``/``delete`` y de
+``plots_bulk_changed`` se aplican en el proceso que los hizo y quedan
+anotados con una generación en la base de datos (``core.generations``); los
+demás procesos leen los centroides de esas parcelas y los aplican con
+``upsert``. La grilla se lee entera solo al arrancar o si los cambios
+pendientes son demasiados.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from django.utils import timezone
+
+from core import generations
+
+from . import spatial_index
+from .geometry import TILE_SIZE
+from .models import Plot
+
+MAX_CLUSTER_ZOOM = 16
+CELL_PX = 64
+GENERATION_KEY = "producers:plot-clusters"
+# Fracción de la grilla a partir de la cual conviene releerla entera en
+# lugar de aplicar los cambios de otros procesos.
+RELOAD_RATIO = 0.25
+_MAX_LATITUDE = 85.0511
+
+# (lng, lat, conforme)
+Point = Tuple[float, float, bool]
+
+
+def _mercator(lng: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas Web Mercator normalizadas a ``[0, 1)`` (y crece hacia el sur)."""
+    x = (np.asarray(lng, dtype=float) + 180) / 360
+    radians = np.radians(np.clip(np.asarray(lat, dtype=float), -_MAX_LATITUDE, _MAX_LATITUDE))
+    y = (1 - np.log(np.tan(np.pi / 4 + radians / 2)) / np.pi) / 2
+    return x, y
+
+
+def _cells_per_side(zoom: int) -> int:
+    return 2**zoom * TILE_SIZE // CELL_PX
+
+
+def _cell_keys(x: np.ndarray, y: np.ndarray, zoom: int) -> np.ndarray:
+    cells = _cells_per_side(zoom)
+    column = np.clip((x * cells).astype(np.int64), 0, cells - 1)
+    row = np.clip((y * cells).astype(np.int64), 0, cells - 1)
+    return column * cells + row
+
+
+class _Level:
+    """Celdas de un zoom: claves ordenadas y sus sumas.
+
+    ``counts`` guarda por celda parcelas, conformes y suma de ids;
+    ``sums`` la suma de longitudes y latitudes. Las celdas que quedan vacías
+    se conservan hasta la siguiente fusión completa.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty((0, 3), dtype=np.int64)
+        self.sums = np.empty((0, 2), dtype=float)
+
+    def add(self, keys: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> None:
+        if len(keys) * 4 > len(self.keys):
+            self._merge(keys, counts, sums)
+            return
+        positions = np.searchsorted(self.keys, keys)
+        found = self.keys[np.minimum(positions, len(self.keys) - 1)] == keys
+        if not found.all():
+            missing = np.unique(keys[~found])
+            at = np.searchsorted(self.keys, missing)
+            self.keys = np.insert(self.keys, at, missing)
+            self.counts = np.insert(self.counts, at, 0, axis=0)
+            self.sums = np.insert(self.sums, at, 0.0, axis=0)
+            positions = np.searchsorted(self.keys, keys)
+        np.add.at(self.counts, positions, counts)
+        np.add.at(self.sums, positions, sums)
+
+    def _merge(self, keys: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> None:
+        merged, inverse = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        all_counts = np.concatenate((self.counts, counts))
+        all_sums = np.concatenate((self.sums, sums))
+        # Los enteros se suman por separado: bincount solo pesa con float.
+        new_counts = np.zeros((len(merged), 3), dtype=np.int64)
+        np.add.at(new_counts, inverse, all_counts)
+        new_sums = np.column_stack(
+            [np.bincount(inverse, weights=all_sums[:, column], minlength=len(merged)) for column in range(2)]
+        )
+        keep = new_counts[:, 0] > 0
+        self.keys, self.counts, self.sums = merged[keep], new_counts[keep], new_sums[keep]
+
+
+class PlotClusterIndex:
+    """Grilla de agregados por zoom más el último centroide conocido de cada parcela."""
+
+    def __init__(self, ids: Sequence[int], lngs: Sequence[float], lats: Sequence[float], compliant: Sequence[bool]):
+        self.points: Dict[int, Point] = dict(zip(ids, zip(lngs, lats, compliant)))
+        self.levels = [_Level() for _zoom in range(MAX_CLUSTER_ZOOM + 1)]
+        self._add(ids, lngs, lats, compliant, np.ones(len(ids), dtype=np.int64))
+
+    def _add(self, ids, lngs, lats, compliant, signs: np.ndarray) -> None:
+        if not len(ids):
+            return
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        counts = np.column_stack(
+            (signs, signs * np.asarray(compliant, dtype=np.int64), signs * np.asarray(ids, dtype=np.int64))
+        )
+        sums = np.column_stack((signs * lngs, signs * lats))
+        x, y = _mercator(lngs, lats)
+        for zoom, level in enumerate(self.levels):
+            level.add(_cell_keys(x, y, zoom), counts, sums)
+
+    def upsert(self, points: Dict[int, Optional[Point]]) -> None:
+        """Reemplaza el centroide de cada parcela (``None`` la saca de la grilla)."""
+        entries = []
+        for plot_id, point in points.items():
+            previous = self.points.pop(plot_id, None)
+            if previous is not None:
+                entries.append((plot_id, *previous, -1))
+            if point is not None:
+                self.points[plot_id] = point
+                entries.append((plot_id, *point, 1))
+        if entries:
+            ids, lngs, lats, compliant, signs = zip(*entries)
+            self._add(ids, lngs, lats, compliant, np.array(signs, dtype=np.int64))
+
+    def clusters(self, zoom: int, min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> List[dict]:
+        """Grupos de la grilla de ``zoom`` cuyas celdas tocan el rectángulo."""
+        level = self.levels[zoom]
+        cells = _cells_per_side(zoom)
+        (left, right), (top, bottom) = _mercator([min_lng, max_lng], [max_lat, min_lat])
+        columns, rows = np.divmod(level.keys, cells)
+        inside = (
+            (level.counts[:, 0] > 0)
+            & (columns >= int(left * cells))
+            & (columns <= int(right * cells))
+            & (rows >= int(top * cells))
+            & (rows <= int(bottom * cells))
+        )
+        counts, sums = level.counts[inside], level.sums[inside]
+        return [
+            _cluster(count, compliant, id_sum, lng_sum / count, lat_sum / count)
+            for (count, compliant, id_sum), (lng_sum, lat_sum) in zip(counts.tolist(), sums.tolist())
+        ]
+
+
+def _cluster(count: int, compliant: int, id_sum: int, lng: float, lat: float) -> dict:
+    return {
+        "lng": round(lng, 6),
+        "lat": round(lat, 6),
+        "count": count,
+        "compliant": compliant,
+        "non_compliant": count - compliant,
+        "plot_id": id_sum if count == 1 else None,
+    }
+
+
+def plot_point(plot: Plot) -> Optional[Point]:
+    """Centroide y estado de una parcela, o ``None`` si todavía no tiene polígono."""
+    if plot.bbox_min_lng is None:
+        return None
+    return (plot.centroid_lng, plot.centroid_lat, plot.eudr_compliant)
+
+
+_POINT_FIELDS = ("pk", "centroid_lng", "centroid_lat", "eudr_compliant")
+
+
+def _load_index() -> PlotClusterIndex:
+    rows = Plot.objects.filter(bbox_min_lng__isnull=False).values_list(*_POINT_FIELDS)
+    columns = list(zip(*rows.iterator(chunk_size=5000))) or [(), (), (), ()]
+    return PlotClusterIndex(*columns)
+
+
+_lock = threading.Lock()
+_index: Optional[PlotClusterIndex] = None
+_index_generation: Optional[int] = None
+_synced_at = None
+
+
+def _catch_up(generation: int) -> None:
+    """Lleva la grilla del proceso a ``generation``; se llama con ``_lock`` tomado."""
+    global _index, _index_generation, _synced_at
+    started = timezone.now()
+    if _index is not None and _index_generation < generation and not generations.changes_expired(_synced_at):
+        changed = generations.changed_between(GENERATION_KEY, _index_generation, generation)
+        if len(changed) <= max(spatial_index.PENDING_LIMIT, RELOAD_RATIO * len(_index.points)):
+            _index.upsert(current_points(changed))
+            _index_generation, _synced_at = generation, started
+            return
+    _index = _load_index()
+    _index_generation, _synced_at = generation, started
+
+
+def cluster_index() -> PlotClusterIndex:
+    """Grilla del proceso, al día con los cambios de parcelas de todos los procesos."""
+    generation = generations.current(GENERATION_KEY)
+    with _lock:
+        if _index is None or _index_generation != generation:
+            _catch_up(generation)
+        return _index
+
+
+def plot_clusters(zoom: int, min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> List[dict]:
+    """Grupos de parcelas visibles en el rectángulo para el zoom del mapa."""
+    index = cluster_index()
+    if zoom <= MAX_CLUSTER_ZOOM:
+        return index.clusters(zoom, min_lng, min_lat, max_lng, max_lat)
+    found = []
+    for plot_id in spatial_index.plots_in_bbox(min_lng, min_lat, max_lng, max_lat):
+        point = index.points.get(plot_id)
+        if point and min_lng <= point[0] <= max_lng and min_lat <= point[1] <= max_lat:
+            found.append(_cluster(1, int(point[2]), plot_id, point[0], point[1]))
+    return found
+
+
+def apply_plot_changes(points: Dict[int, Optional[Point]]) -> None:
+    """Anota centroides nuevos (o ``None`` para bajas) y los aplica a la grilla de este proceso."""
+    global _index_generation, _synced_at
+    if not points:
+        return
+    generation = generations.record(GENERATION_KEY, points)
+    with _lock:
+        if _index is None or _index_generation != generation - 1:
+            return
+        _index.upsert(points)
+        _index_generation, _synced_at = generation, timezone.now()
+
+
+def current_points(plot_ids: Iterable[int]) -> Dict[int, Optional[Point]]:
+    """Centroides guardados de ``plot_ids`` (``None`` si la parcela no existe o no tiene polígono)."""
+    wanted = sorted(set(plot_ids))
+    points: Dict[int, Optional[Point]] = {plot_id: None for plot_id in wanted}
+    # SQL Server admite como mucho 2100 parámetros por consulta.
+    for start in range(0, len(wanted), 2000):
+        rows = Plot.objects.filter(pk__in=wanted[start : start + 2000], bbox_min_lng__isnull=False)
+        for plot_id, lng, lat, compliant in rows.values_list(*_POINT_FIELDS):
+            points[plot_id] = (lng, lat, compliant)
+    return points
@@ -0,0 +1,112 @@
+"""Exportación de parcelas como GeoJSON por partes.
+
+``plot_feature_collection`` recorre el queryset con ``.iterator()`` y va
+entregando el texto del FeatureCollection por bloques de features, así la
+memoria no depende de cuántas parcelas se exporten. La geometría sale de
+``polygon_packed`` (sin decodificar el JSON completo) o, si se pide, del nivel
+simplificado precalculado para un zoom; ``polygon`` solo se lee para las
+parcelas que todavía no tienen la forma compacta.
+"""
+
+import json
+from typing import Any, Iterator, List, Optional
+
+from django.db.models import Case, F, JSONField, When
+
+from .geometry import COMPACT_SCALE, decode_compact, pick_level, round_geometry
+
+# Filas que trae cada ida a la base de datos.
+FETCH_SIZE = 2000
+# Features por bloque de texto entregado a la respuesta.
+FEATURES_PER_CHUNK = 500
+
+_PRODUCER_FIELDS = (
+    "producer__code",
+    "producer__full_name",
+    "producer__department",
+    "producer__municipality",
+    "producer__compliance_status",
+)
+_PLOT_FIELDS = ("pk", "plot_code", "name", "area_hectares", "measured_area_ha", "eudr_compliant")
+
+
+def _geometry(packed: Any, fallback: Any, levels: Optional[dict], zoom: Optional[int], decimals: Optional[int]) -> Any:
+    geometry = pick_level(levels, None, zoom) if zoom is not None else None
+    if geometry is None:
+        geometry = decode_compact(packed) if packed is not None else fallback
+    if not geometry:
+        return None
+    # La forma compacta ya viene cuantizada a 1e-7; redondear más solo
+    # tiene sentido por debajo de esa precisión.
+    if decimals is not None and 10**decimals < COMPACT_SCALE:
+        return round_geometry(geometry, decimals)
+    return geometry
+
+
+def plot_feature_collection(plots, decimals: Optional[int] = None, zoom: Optional[int] = None) -> Iterator[str]:
+    """Texto de un FeatureCollection con las parcelas de ``plots``, por partes.
+
+    ``decimals`` redondea las coordenadas; ``zoom`` usa la geometría
+    simplificada para ese nivel de zoom cuando existe.
+    """
+    columns = [*_PLOT_FIELDS, *_PRODUCER_FIELDS, "polygon_packed", "export_fallback"]
+    if zoom is not None:
+        columns.append("polygon_simplified")
+    rows = (
+        plots.annotate(
+            export_fallback=Case(
+                When(polygon_packed__isnull=True, then=F("polygon")),
+                default=None,
+                output_field=JSONField(),
+            )
+        )
+        .order_by("pk")
+        .values_list(*columns)
+        .iterator(chunk_size=FETCH_SIZE)
+    )
+
+    yield '{"type":"FeatureCollection","features":['
+    separator = ""
+    features: List[str] = []
+    for row in rows:
+        (
+            plot_id,
+            plot_code,
+            name,
+            area_hectares,
+            measured_area_ha,
+            eudr_compliant,
+            producer_code,
+            producer_name,
+            department,
+            municipality,
+            compliance_status,
+            packed,
+            fallback,
+            *levels,
+        ) = row
+        feature = {
+            "type": "Feature",
+            "id": plot_id,
+            "geometry": _geometry(packed, fallback, levels[0] if levels else None, zoom, decimals),
+            "properties": {
+                "plot_code": plot_code,
+                "name": name,
+                "area_hectares": float(area_hectares) if area_hectares is not None else None,
+                "measured_area_ha": float(measured_area_ha) if measured_area_ha is not None else None,
+                "eudr_compliant": eudr_compliant,
+                "producer_code": producer_code,
+                "producer_name": producer_name,
+                "department": department,
+                "municipality": municipality,
+                "compliance_status": compliance_status,
+            },
+        }
+        features.append(json.dumps(feature, ensure_ascii=False, separators=(",", ":")))
+        if len(features) >= FEATURES_PER_CHUNK:
+            yield separator + ",".join(features)
+            separator = ","
+            features = []
+    if features:
+        yield separator + ",".join(features)
+    yield "]}"
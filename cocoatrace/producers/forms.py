@@ -3,6 +3,7 @@ import json
 from django import forms
 
 from .models import Document, Plot, Producer, compute_centroid
+from .validation import normalize_geometry
 
 
 class ProducerForm(forms.ModelForm):
@@ -70,6 +71,14 @@ class PlotForm(forms.ModelForm):
             parsed = json.loads(raw_value)
         except json.JSONDecodeError as exc:
             raise forms.ValidationError("El GeoJSON proporcionado no es válido.") from exc
+        check = normalize_geometry(parsed)
+        if check.errors:
+            raise forms.ValidationError(check.errors)
+        if check.self_intersections:
+            raise forms.ValidationError(
+                "El límite de la parcela se cruza consigo mismo; corrige el dibujo antes de guardar."
+            )
+        parsed = check.geometry
         centroid = compute_centroid(parsed)
         if not centroid:
             raise forms.ValidationError("No fue posible calcular el centroide de la geometría proporcionada.")
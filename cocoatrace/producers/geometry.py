@@ -0,0 +1,692 @@
+"""Cálculos geométricos vectorizados sobre muchas parcelas a la vez.
+
+Reproduce las reglas de ``compute_centroid``/``_ring_centroid`` de
+``producers.models`` (solo el anillo exterior de cada polígono, centroide de
+área con la fórmula del polígono y promedio de vértices para anillos
+degenerados), pero empaqueta los anillos de todas las geometrías en un único
+arreglo de NumPy para evitar los bucles por vértice en Python.
+
+``geodesic_areas`` mide además la superficie real de cada geometría sobre el
+elipsoide WGS84, descontando los huecos, y ``bounding_boxes`` devuelve los
+rectángulos envolventes que usa ``producers.spatial_index``.
+``simplify_geometry`` genera las versiones reducidas (Douglas–Peucker) que se
+envían a los mapas según el zoom.
+
+Todas las funciones que reciben listas de geometrías aceptan también la forma
+binaria de ``encode_compact`` (``Plot.polygon_packed``), que se empaqueta
+directamente desde sus enteros sin pasar por JSON ni listas de Python.
+"""
+
+import math
+import struct
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class PackedRings:
+    """Anillos exteriores cerrados de varias geometrías, uno tras otro.
+
+    ``coords`` tiene forma (n, 2) con columnas lng/lat; el anillo ``i`` ocupa
+    ``coords[offsets[i]:offsets[i + 1]]`` y pertenece a la geometría
+    ``owners[i]``. ``holes[i]`` indica si es un anillo interior.
+    """
+
+    coords: np.ndarray
+    offsets: np.ndarray
+    owners: np.ndarray
+    holes: np.ndarray
+    geometry_count: int
+
+    @property
+    def ring_count(self) -> int:
+        return len(self.owners)
+
+
+def _polygons(geometry: Any) -> List[Any]:
+    if not isinstance(geometry, dict):
+        return []
+    coordinates = geometry.get("coordinates") or []
+    if geometry.get("type") == "Polygon":
+        return [coordinates] if coordinates else []
+    if geometry.get("type") == "MultiPolygon":
+        return [polygon or [[]] for polygon in coordinates]
+    return []
+
+
+def pack_rings(geometries: Sequence[Any], holes: bool = False) -> PackedRings:
+    """Empaqueta (y cierra) los anillos exteriores de ``geometries``.
+
+    Con ``holes=True`` incluye también los anillos interiores. Las geometrías
+    pueden ser GeoJSON o la forma compacta de ``encode_compact``.
+    """
+    if any(_is_compact(geometry) for geometry in geometries):
+        return _pack_compact(geometries, holes)
+    points: List[Any] = []
+    offsets = [0]
+    owners: List[int] = []
+    interior: List[bool] = []
+    for owner, geometry in enumerate(geometries):
+        for polygon in _polygons(geometry):
+            for position, ring in enumerate(polygon if holes else polygon[:1]):
+                points.extend(ring)
+                if ring and (ring[0][0] != ring[-1][0] or ring[0][1] != ring[-1][1]):
+                    points.append(ring[0])
+                offsets.append(len(points))
+                owners.append(owner)
+                interior.append(position > 0)
+    flat = np.fromiter(chain.from_iterable(points), dtype=float)
+    if len(flat) != 2 * len(points):
+        # Coordenadas con altitud u otras dimensiones extra.
+        flat = np.fromiter(chain.from_iterable(point[:2] for point in points), dtype=float)
+    coords = flat.reshape(-1, 2)
+    return PackedRings(
+        coords=coords,
+        offsets=np.array(offsets, dtype=np.int64),
+        owners=np.array(owners, dtype=np.int64),
+        holes=np.array(interior, dtype=bool),
+        geometry_count=len(geometries),
+    )
+
+
+# --- Forma compacta ---------------------------------------------------------
+#
+# Cabecera ``<BBBBII`` (versión, tipo, bytes por desplazamiento, reservado,
+# cantidad de polígonos y de anillos), anillos por polígono y puntos por
+# anillo en uint32, el primer punto en int32 y luego las diferencias entre
+# puntos consecutivos de toda la geometría en int16, int32 o int64 (el ancho
+# más chico que alcance). Las coordenadas se cuantizan a 1e-7 grados
+# (~1 cm) y los anillos se guardan cerrados.
+
+COMPACT_VERSION = 1
+COMPACT_SCALE = 10_000_000
+_COMPACT_HEADER = struct.Struct("<BBBBII")
+_COMPACT_TYPES = {"Polygon": 1, "MultiPolygon": 2}
+_COMPACT_TYPE_NAMES = {code: name for name, code in _COMPACT_TYPES.items()}
+_DELTA_DTYPES = {2: np.dtype("<i2"), 4: np.dtype("<i4"), 8: np.dtype("<i8")}
+
+
+def _is_compact(geometry: Any) -> bool:
+    return isinstance(geometry, (bytes, bytearray, memoryview))
+
+
+def geometry_type(geometry: Any) -> Optional[str]:
+    """Tipo GeoJSON de una geometría, en cualquiera de las dos formas."""
+    if _is_compact(geometry):
+        return _COMPACT_TYPE_NAMES.get(geometry[1]) if len(geometry) >= _COMPACT_HEADER.size else None
+    return geometry.get("type") if isinstance(geometry, dict) else None
+
+
+def encode_compact(geometry: Any) -> Optional[bytes]:
+    """Codifica un Polygon/MultiPolygon GeoJSON en la forma compacta.
+
+    Devuelve ``None`` si la geometría no es de esos tipos o tiene
+    coordenadas que no son números finitos.
+    """
+    geom_type = geometry_type(geometry)
+    if geom_type not in _COMPACT_TYPES:
+        return None
+    polygons = _polygons(geometry)
+    ring_counts: List[int] = []
+    point_counts: List[int] = []
+    points: List[Any] = []
+    try:
+        for polygon in polygons:
+            ring_counts.append(len(polygon))
+            for ring in polygon:
+                ring = [point[:2] for point in ring]
+                if ring and (ring[0][0] != ring[-1][0] or ring[0][1] != ring[-1][1]):
+                    ring.append(ring[0])
+                point_counts.append(len(ring))
+                points.extend(ring)
+        coords = np.array(points, dtype=float).reshape(-1, 2)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if not np.isfinite(coords).all() or (np.abs(coords) > 180).any():
+        return None
+
+    quantized = np.round(coords * COMPACT_SCALE).astype(np.int64)
+    deltas = np.diff(quantized, axis=0).reshape(-1)
+    largest = int(np.abs(deltas).max()) if len(deltas) else 0
+    width = 2 if largest < 2 ** 15 else 4 if largest < 2 ** 31 else 8
+    return b"".join(
+        (
+            _COMPACT_HEADER.pack(COMPACT_VERSION, _COMPACT_TYPES[geom_type], width, 0, len(ring_counts), len(point_counts)),
+            np.array(ring_counts + point_counts, dtype="<u4").tobytes(),
+            quantized[:1].astype("<i4").tobytes(),
+            deltas.astype(_DELTA_DTYPES[width]).tobytes(),
+        )
+    )
+
+
+def _read_compact(blob: Any) -> Tuple[str, np.ndarray, np.ndarray, np.ndarray]:
+    """Tipo, anillos por polígono, puntos por anillo y coordenadas enteras."""
+    version, type_code, width, _reserved, polygon_count, ring_count = _COMPACT_HEADER.unpack_from(blob)
+    if version != COMPACT_VERSION:
+        raise ValueError(f"Versión de geometría compacta desconocida: {version}")
+    offset = _COMPACT_HEADER.size
+    counts = np.frombuffer(blob, dtype="<u4", count=polygon_count + ring_count, offset=offset).astype(np.int64)
+    offset += 4 * (polygon_count + ring_count)
+    ring_counts, point_counts = counts[:polygon_count], counts[polygon_count:]
+    total = int(point_counts.sum())
+    if not total:
+        return _COMPACT_TYPE_NAMES[type_code], ring_counts, point_counts, np.zeros((0, 2), dtype=np.int64)
+    first = np.frombuffer(blob, dtype="<i4", count=2, offset=offset).astype(np.int64)
+    deltas = np.frombuffer(blob, dtype=_DELTA_DTYPES[width], count=2 * (total - 1), offset=offset + 8)
+    steps = np.concatenate((first, deltas.astype(np.int64))).reshape(-1, 2)
+    return _COMPACT_TYPE_NAMES[type_code], ring_counts, point_counts, np.cumsum(steps, axis=0)
+
+
+def decode_compact(blob: Any) -> Optional[dict]:
+    """GeoJSON de una geometría compacta (con las coordenadas cuantizadas)."""
+    if blob is None:
+        return None
+    geom_type, ring_counts, point_counts, quantized = _read_compact(blob)
+    coords = (quantized / COMPACT_SCALE).tolist()
+    rings = []
+    position = 0
+    for count in point_counts.tolist():
+        rings.append(coords[position : position + count])
+        position += count
+    polygons = []
+    position = 0
+    for count in ring_counts.tolist():
+        polygons.append(rings[position : position + count])
+        position += count
+    if geom_type == "Polygon":
+        return {"type": "Polygon", "coordinates": polygons[0] if polygons else []}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def round_geometry(geometry: dict, decimals: int) -> dict:
+    """Copia de la geometría con las coordenadas redondeadas (todas de una vez)."""
+    polygons = _polygons(geometry)
+    ring_counts = [len(polygon) for polygon in polygons]
+    point_counts = [len(ring) for polygon in polygons for ring in polygon]
+    points = [point[:2] for polygon in polygons for ring in polygon for point in ring]
+    coords = np.round(np.array(points, dtype=float).reshape(-1, 2), decimals).tolist()
+    rings: List[Any] = []
+    position = 0
+    for count in point_counts:
+        rings.append(coords[position : position + count])
+        position += count
+    rebuilt = []
+    position = 0
+    for count in ring_counts:
+        rebuilt.append(rings[position : position + count])
+        position += count
+    if geometry.get("type") == "Polygon":
+        return {"type": "Polygon", "coordinates": rebuilt[0] if rebuilt else []}
+    return {"type": "MultiPolygon", "coordinates": rebuilt}
+
+
+def _expand_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Índices ``start, start + 1, …`` de cada rango ``[start, start + length)``, uno tras otro."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, lengths) + np.arange(lengths.sum())
+
+
+def _pack_compact(geometries: Sequence[Any], holes: bool) -> PackedRings:
+    """``pack_rings`` para geometrías compactas, leyendo los enteros de todas a la vez.
+
+    Solo las cabeceras se leen una por una; los conteos, puntos y diferencias
+    se extraen con índices sobre los bytes concatenados. Las geometrías
+    GeoJSON de la lista se codifican antes.
+    """
+    blobs: List[Any] = []
+    blob_owners: List[int] = []
+    for owner, geometry in enumerate(geometries):
+        if not _is_compact(geometry):
+            geometry = encode_compact(geometry)
+            if geometry is None:
+                continue
+        blobs.append(geometry)
+        blob_owners.append(owner)
+    headers = np.array([_COMPACT_HEADER.unpack_from(blob) for blob in blobs], dtype=np.int64).reshape(-1, 6)
+    if (headers[:, 0] != COMPACT_VERSION).any():
+        raise ValueError("Versión de geometría compacta desconocida.")
+    widths, polygon_counts, ring_counts = headers[:, 2], headers[:, 4], headers[:, 5]
+    data = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+    sizes = np.array([len(blob) for blob in blobs], dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+
+    # Conteos: por cada geometría, anillos por polígono y luego puntos por anillo.
+    entries = polygon_counts + ring_counts
+    counts = data[_expand_ranges(starts + _COMPACT_HEADER.size, 4 * entries)].view("<u4").astype(np.int64)
+    entry_blob = np.repeat(np.arange(len(blobs)), entries)
+    entry_position = np.arange(len(counts)) - np.repeat(np.cumsum(entries) - entries, entries)
+    is_point_count = entry_position >= np.repeat(polygon_counts, entries)
+    point_counts = counts[is_point_count]
+    rings_per_polygon = counts[~is_point_count]
+    ring_blob = entry_blob[is_point_count]
+    exterior = np.zeros(len(point_counts), dtype=bool)
+    exterior[(np.cumsum(rings_per_polygon) - rings_per_polygon)[rings_per_polygon > 0]] = True
+
+    # Primer punto absoluto y diferencias, colocados en el orden de los puntos.
+    totals = np.bincount(ring_blob, weights=point_counts, minlength=len(blobs)).astype(np.int64)
+    point_base = np.cumsum(totals) - totals
+    first_at = starts + _COMPACT_HEADER.size + 4 * entries
+    filled = totals > 0
+    steps = np.zeros((int(totals.sum()), 2), dtype=np.int64)
+    steps[point_base[filled]] = data[_expand_ranges(first_at[filled], np.full(filled.sum(), 8))].view("<i4").reshape(-1, 2)
+    flat_steps = steps.reshape(-1)
+    for width, dtype in _DELTA_DTYPES.items():
+        selected = filled & (widths == width)
+        if not selected.any():
+            continue
+        delta_counts = 2 * (totals[selected] - 1)
+        deltas = data[_expand_ranges(first_at[selected] + 8, width * delta_counts)].view(dtype)
+        flat_steps[_expand_ranges(2 * (point_base[selected] + 1), delta_counts)] = deltas
+    quantized = np.cumsum(steps, axis=0)
+    # La suma acumulada cruza geometrías: se descuenta lo acumulado antes de cada una.
+    carried = np.zeros((len(blobs), 2), dtype=np.int64)
+    later = filled & (point_base > 0)
+    carried[later] = quantized[point_base[later] - 1]
+    quantized -= np.repeat(carried, totals, axis=0)
+
+    if not holes:
+        quantized = quantized[np.repeat(exterior, point_counts)]
+        point_counts, ring_blob, exterior = point_counts[exterior], ring_blob[exterior], exterior[exterior]
+    return PackedRings(
+        coords=quantized / COMPACT_SCALE,
+        offsets=np.concatenate(([0], np.cumsum(point_counts))).astype(np.int64),
+        owners=np.array(blob_owners, dtype=np.int64)[ring_blob],
+        holes=~exterior,
+        geometry_count=len(geometries),
+    )
+
+
+def _range_sums(values: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Suma ``values[start:stop]`` de cada rango en orden, elemento por elemento.
+
+    ``np.add.reduceat`` suma por pares y cambia el redondeo; como los términos
+    del área se cancelan casi por completo, eso basta para mover el centroide.
+    Aquí se avanza una posición a la vez sobre todos los rangos activos, con
+    las mismas operaciones que el bucle de ``_ring_centroid``.
+    """
+    lengths = np.maximum(stops - starts, 0)
+    totals = np.zeros(len(starts))
+    if not len(starts) or not lengths.max():
+        return totals
+    order = np.argsort(-lengths, kind="stable")
+    ordered_starts = starts[order]
+    descending = -lengths[order]
+    partial = np.zeros(len(starts))
+    for position in range(int(lengths.max())):
+        active = int(np.searchsorted(descending, -position, side="left"))
+        partial[:active] += values[ordered_starts[:active] + position]
+    totals[order] = partial
+    return totals
+
+
+def ring_centroids(packed: PackedRings) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Centroide (lng, lat) y área plana (grados²) de cada anillo.
+
+    Los anillos vacíos devuelven NaN como centroide.
+    """
+    coords = packed.coords
+    x, y = coords[:, 0], coords[:, 1]
+    x0, y0, x1, y1 = x[:-1], y[:-1], x[1:], y[1:]
+    cross = (x0 * y1) - (x1 * y0)
+
+    # La arista k une el punto k con el k+1; la última de cada anillo apunta
+    # al anillo siguiente y queda fuera del rango.
+    starts, ends = packed.offsets[:-1], packed.offsets[1:]
+    twice_area = _range_sums(cross, starts, ends - 1)
+    cx_sum = _range_sums((x0 + x1) * cross, starts, ends - 1)
+    cy_sum = _range_sums((y0 + y1) * cross, starts, ends - 1)
+
+    lengths = ends - starts
+    degenerate = lengths < 4
+    flat = ~degenerate & (twice_area == 0)
+    regular = ~degenerate & ~flat
+
+    lng = np.full(packed.ring_count, np.nan)
+    lat = np.full(packed.ring_count, np.nan)
+    lng[regular] = cx_sum[regular] / (3 * twice_area[regular])
+    lat[regular] = cy_sum[regular] / (3 * twice_area[regular])
+
+    # Anillos degenerados: promedio de todos los puntos (incluido el de
+    # cierre); anillos de área nula: promedio sin el punto de cierre.
+    stops = ends - flat.astype(np.int64)
+    counts = stops - starts
+    averaged = (degenerate | flat) & (counts > 0)
+    lng[averaged] = _range_sums(x, starts[averaged], stops[averaged]) / counts[averaged]
+    lat[averaged] = _range_sums(y, starts[averaged], stops[averaged]) / counts[averaged]
+
+    area = np.where(regular, np.abs(twice_area / 2.0), 0.0)
+    return lng, lat, area
+
+
+def compute_centroids(geometries: Sequence[Any]) -> List[Optional[Tuple[float, float]]]:
+    """Equivalente vectorizado de ``compute_centroid`` para una lista de geometrías.
+
+    Devuelve ``(lat, lng)`` o ``None`` por geometría, en el mismo orden.
+    """
+    packed = pack_rings(geometries)
+    if not packed.ring_count:
+        return [None] * len(geometries)
+    lng, lat, area = ring_centroids(packed)
+    owners = packed.owners
+    valid = ~np.isnan(lng)
+
+    weighted_lat = np.bincount(owners[valid], weights=lat[valid] * area[valid], minlength=packed.geometry_count)
+    weighted_lng = np.bincount(owners[valid], weights=lng[valid] * area[valid], minlength=packed.geometry_count)
+    total_area = np.bincount(owners[valid], weights=area[valid], minlength=packed.geometry_count)
+
+    # Primer anillo de cada geometría (para polígonos simples y para el
+    # respaldo de MultiPolygon cuyas áreas suman cero).
+    first_ring = np.full(packed.geometry_count, -1, dtype=np.int64)
+    first_ring[owners[::-1]] = np.arange(packed.ring_count)[::-1]
+
+    results: List[Optional[Tuple[float, float]]] = []
+    for index, geometry in enumerate(geometries):
+        ring = first_ring[index]
+        geom_type = geometry_type(geometry)
+        if geom_type == "MultiPolygon" and total_area[index]:
+            results.append((float(weighted_lat[index] / total_area[index]), float(weighted_lng[index] / total_area[index])))
+        elif geom_type in {"Polygon", "MultiPolygon"} and ring >= 0 and valid[ring]:
+            results.append((float(lat[ring]), float(lng[ring])))
+        else:
+            results.append(None)
+    return results
+
+
+def planar_areas(geometries: Sequence[Any]) -> np.ndarray:
+    """Suma de las áreas planas (grados²) de los anillos exteriores de cada geometría."""
+    packed = pack_rings(geometries)
+    if not packed.ring_count:
+        return np.zeros(len(geometries))
+    _lng, _lat, area = ring_centroids(packed)
+    return np.bincount(packed.owners, weights=area, minlength=packed.geometry_count)
+
+
+def bounding_boxes(geometries: Sequence[Any]) -> np.ndarray:
+    """Rectángulo envolvente de cada geometría como (min_lng, min_lat, max_lng, max_lat).
+
+    Los huecos quedan dentro del anillo exterior, así que basta con este. Las
+    geometrías sin anillos devuelven NaN.
+    """
+    packed = pack_rings(geometries)
+    boxes = np.full((packed.geometry_count, 4), np.nan)
+    lengths = np.diff(packed.offsets)
+    filled = lengths > 0
+    if not filled.any():
+        return boxes
+
+    # Los anillos vacíos no ocupan posiciones, así que cada inicio no vacío
+    # delimita exactamente su anillo.
+    starts = packed.offsets[:-1][filled]
+    owners = packed.owners[filled]
+    lng, lat = packed.coords[:, 0], packed.coords[:, 1]
+    mins = np.full((packed.geometry_count, 2), np.inf)
+    maxs = np.full((packed.geometry_count, 2), -np.inf)
+    np.minimum.at(mins[:, 0], owners, np.minimum.reduceat(lng, starts))
+    np.minimum.at(mins[:, 1], owners, np.minimum.reduceat(lat, starts))
+    np.maximum.at(maxs[:, 0], owners, np.maximum.reduceat(lng, starts))
+    np.maximum.at(maxs[:, 1], owners, np.maximum.reduceat(lat, starts))
+
+    present = np.isfinite(mins[:, 0])
+    boxes[present, :2] = mins[present]
+    boxes[present, 2:] = maxs[present]
+    return boxes
+
+
+def contains_point(geometries: Sequence[Any], lng: float, lat: float) -> np.ndarray:
+    """Si cada geometría contiene el punto, por la regla par/impar sobre todos sus anillos.
+
+    Un rayo hacia +x desde el punto cruza un número impar de aristas si el
+    punto está dentro; los huecos lo vuelven a sacar. Las aristas se toman
+    semiabiertas en y, así que los vértices no se cuentan dos veces.
+    """
+    packed = pack_rings(geometries, holes=True)
+    if len(packed.coords) < 2:
+        return np.zeros(packed.geometry_count, dtype=bool)
+    ring_ids = np.repeat(np.arange(packed.ring_count), np.diff(packed.offsets))
+    same_ring = ring_ids[:-1] == ring_ids[1:]
+    x0, y0 = packed.coords[:-1][same_ring].T
+    x1, y1 = packed.coords[1:][same_ring].T
+    spans = (y0 > lat) != (y1 > lat)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+    crossings = spans & (lng < x_at)
+    owners = packed.owners[ring_ids[:-1][same_ring]]
+    return np.bincount(owners, weights=crossings, minlength=packed.geometry_count) % 2 == 1
+
+
+# Elipsoide WGS84.
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_E = WGS84_E2 ** 0.5
+
+
+def _authalic_q(latitudes: np.ndarray) -> np.ndarray:
+    sin_lat = np.sin(np.radians(latitudes))
+    e_sin = WGS84_E * sin_lat
+    return (1 - WGS84_E2) * (
+        sin_lat / (1 - WGS84_E2 * sin_lat ** 2) - np.log((1 - e_sin) / (1 + e_sin)) / (2 * WGS84_E)
+    )
+
+
+def equal_area_xy(coords: np.ndarray, origin: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """Proyecta puntos lng/lat a metros con la proyección cilíndrica equivalente.
+
+    ``origin`` (un punto o uno por fila) queda en (0, 0); las áreas calculadas
+    con la fórmula del polígono sobre el resultado son áreas del elipsoide.
+    """
+    coords = np.asarray(coords, dtype=float)
+    origin = np.asarray(origin, dtype=float)
+    x = WGS84_A * np.radians(coords[..., 0] - origin[..., 0])
+    y = WGS84_A * (_authalic_q(coords[..., 1]) - _authalic_q(origin[..., 1])) / 2
+    return x, y
+
+
+def geodesic_areas(geometries: Sequence[Any]) -> np.ndarray:
+    """Superficie en hectáreas de cada geometría sobre el elipsoide WGS84.
+
+    Los vértices se proyectan con la proyección cilíndrica equivalente (de
+    áreas iguales) del elipsoide y se aplica la fórmula del polígono: el
+    error frente a aristas geodésicas es despreciable para parcelas de
+    algunos kilómetros. Los huecos se restan del anillo exterior.
+    """
+    packed = pack_rings(geometries, holes=True)
+    areas = np.zeros(packed.geometry_count)
+    if not len(packed.coords):
+        return areas
+
+    ring_ids = np.repeat(np.arange(packed.ring_count), np.diff(packed.offsets))
+    first = packed.offsets[:-1][ring_ids]
+    # Coordenadas relativas al primer vértice de cada anillo para no perder
+    # precisión en la resta de productos grandes.
+    x, y = equal_area_xy(packed.coords, packed.coords[first])
+
+    same_ring = ring_ids[:-1] == ring_ids[1:]
+    cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+    ring_areas = np.abs(
+        np.bincount(ring_ids[:-1][same_ring], weights=cross[same_ring], minlength=packed.ring_count) / 2
+    )
+    signed = np.where(packed.holes, -ring_areas, ring_areas)
+    areas = np.bincount(packed.owners, weights=signed, minlength=packed.geometry_count)
+    return np.maximum(areas, 0) / 10_000
+
+
+# Niveles de zoom (de Leaflet) con geometría simplificada precalculada. Por
+# encima del último se usa el polígono completo.
+SIMPLIFIED_ZOOMS = (10, 13, 16, 18)
+TILE_SIZE = 256
+MAX_MAP_ZOOM = 19
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Ancho en grados de un píxel de mapa en ``zoom``."""
+    return 360 / (TILE_SIZE * 2 ** zoom)
+
+
+def _mercator_y(latitude: float) -> float:
+    latitude = min(max(latitude, -85.0511), 85.0511)
+    return float(np.log(np.tan(np.pi / 4 + np.radians(latitude) / 2)))
+
+
+def fit_zoom(box: Sequence[float], width_px: int = 800, height_px: int = 500, padding_px: int = 30) -> int:
+    """Zoom que elige ``map.fitBounds`` para que ``box`` quepa en el mapa."""
+    min_lng, min_lat, max_lng, max_lat = box
+    usable_width = max(width_px - 2 * padding_px, 1)
+    usable_height = max(height_px - 2 * padding_px, 1)
+    zooms = [MAX_MAP_ZOOM]
+    if max_lng > min_lng:
+        zooms.append(np.log2(usable_width * 360 / (TILE_SIZE * (max_lng - min_lng))))
+    span_y = _mercator_y(max_lat) - _mercator_y(min_lat)
+    if span_y > 0:
+        zooms.append(np.log2(usable_height * 2 * np.pi / (TILE_SIZE * span_y)))
+    return int(min(max(np.floor(min(zooms)), 0), MAX_MAP_ZOOM))
+
+
+# Tramos más cortos se recorren en Python: con pocos vértices el costo de
+# llamar a NumPy supera al del cálculo.
+_SHORT_SPAN = 32
+
+
+def _farthest(points: np.ndarray, xs: List[float], ys: List[float], start: int, stop: int) -> Tuple[int, float]:
+    """Vértice entre ``start`` y ``stop`` más alejado del segmento que los une."""
+    x0, y0 = xs[start], ys[start]
+    chord_x, chord_y = xs[stop] - x0, ys[stop] - y0
+    length = math.hypot(chord_x, chord_y)
+    if stop - start <= _SHORT_SPAN:
+        best, best_distance = start + 1, -1.0
+        for index in range(start + 1, stop):
+            offset_x, offset_y = xs[index] - x0, ys[index] - y0
+            if length:
+                distance = abs(chord_x * offset_y - chord_y * offset_x) / length
+            else:
+                distance = math.hypot(offset_x, offset_y)
+            if distance > best_distance:
+                best, best_distance = index, distance
+        return best, best_distance
+    offsets = points[start + 1 : stop] - points[start]
+    if length:
+        distances = np.abs(chord_x * offsets[:, 1] - chord_y * offsets[:, 0]) / length
+    else:
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+    index = int(np.argmax(distances))
+    return start + 1 + index, float(distances[index])
+
+
+def simplify_ring_levels(ring: Sequence[Any], tolerances: Sequence[float]) -> List[List[Any]]:
+    """Douglas–Peucker sobre un anillo cerrado para varias tolerancias a la vez.
+
+    Una sola pasada guarda, por vértice, la tolerancia máxima con la que
+    Douglas–Peucker lo conservaría (la distancia con que se partió, acotada
+    por la de su tramo padre); cada nivel es un filtro sobre ese valor. Cada
+    nivel conserva al menos un triángulo y devuelve vértices originales.
+    """
+    ring = list(ring)
+    if ring and (ring[0][0] != ring[-1][0] or ring[0][1] != ring[-1][1]):
+        ring.append(ring[0])
+    if len(ring) <= 4:
+        return [ring for _ in tolerances]
+    xs = [float(point[0]) for point in ring]
+    ys = [float(point[1]) for point in ring]
+    points = np.column_stack((xs, ys))
+    last = len(ring) - 1
+
+    finest = min(tolerances)
+    significance = [0.0] * len(ring)
+    significance[0] = significance[last] = math.inf
+    stack = [(0, last, math.inf)]
+    while stack:
+        start, stop, ceiling = stack.pop()
+        if stop - start < 2:
+            continue
+        index, distance = _farthest(points, xs, ys, start, stop)
+        if distance > finest:
+            significance[index] = min(distance, ceiling)
+            stack.append((start, index, significance[index]))
+            stack.append((index, stop, significance[index]))
+
+    levels = []
+    for tolerance in tolerances:
+        kept = [index for index, value in enumerate(significance) if value > tolerance]
+        if len(kept) < 4:
+            # Anillo más pequeño que la tolerancia: el triángulo más ancho
+            # posible a partir del primer vértice.
+            apex, _ = _farthest(points, xs, ys, 0, last)
+            sides = [_farthest(points, xs, ys, start, stop) for start, stop in ((0, apex), (apex, last)) if stop - start >= 2]
+            kept = sorted({0, apex, max(sides, key=lambda found: found[1])[0], last})
+        levels.append([ring[index] for index in kept])
+    return levels
+
+
+def simplify_ring(ring: Sequence[Any], tolerance: float) -> List[Any]:
+    """Douglas–Peucker sobre un anillo cerrado, conservando al menos un triángulo."""
+    return simplify_ring_levels(ring, [tolerance])[0]
+
+
+def simplify_geometry_levels(geometry: Any, tolerances: Sequence[float]) -> Optional[List[dict]]:
+    """Simplifica cada anillo de un Polygon/MultiPolygon con cada tolerancia.
+
+    Los huecos más pequeños que la tolerancia se descartan.
+    """
+    polygons = _polygons(geometry)
+    if not polygons:
+        return None
+    simplified: List[List[List[Any]]] = [[] for _ in tolerances]
+    for polygon in polygons:
+        polygon_levels: List[List[Any]] = [[] for _ in tolerances]
+        for position, ring in enumerate(polygon):
+            if not ring:
+                continue
+            extent = math.inf
+            if position:
+                xs = [point[0] for point in ring]
+                ys = [point[1] for point in ring]
+                extent = max(max(xs) - min(xs), max(ys) - min(ys))
+            for level, ring_level in enumerate(simplify_ring_levels(ring, tolerances)):
+                if extent >= tolerances[level]:
+                    polygon_levels[level].append(ring_level)
+        for level, rings in enumerate(polygon_levels):
+            simplified[level].append(rings)
+    if geometry.get("type") == "Polygon":
+        return [{"type": "Polygon", "coordinates": level[0]} for level in simplified]
+    return [{"type": "MultiPolygon", "coordinates": level} for level in simplified]
+
+
+def simplify_geometry(geometry: Any, tolerance: float) -> Optional[dict]:
+    levels = simplify_geometry_levels(geometry, [tolerance])
+    return levels[0] if levels else None
+
+
+def vertex_count(geometry: Any) -> int:
+    return sum(len(ring) for polygon in _polygons(geometry) for ring in polygon)
+
+
+def simplified_levels(geometry: Any) -> Optional[dict]:
+    """Geometrías simplificadas por zoom (claves en texto, para JSON).
+
+    Solo se guardan los niveles que realmente quitan vértices respecto del
+    nivel siguiente más fino; ``pick_level`` sube al siguiente si falta uno.
+    """
+    zooms = sorted(SIMPLIFIED_ZOOMS, reverse=True)
+    simplified = simplify_geometry_levels(geometry, [zoom_tolerance(zoom) for zoom in zooms])
+    if simplified is None:
+        return None
+    levels = {}
+    finer_count = vertex_count(geometry)
+    for zoom, level in zip(zooms, simplified):
+        count = vertex_count(level)
+        if count < finer_count:
+            levels[str(zoom)] = level
+            finer_count = count
+    return levels or None
+
+
+def pick_level(levels: Optional[dict], full: Any, zoom: int) -> Any:
+    """Geometría más simple cuya tolerancia no supera un píxel en ``zoom``."""
+    for level in SIMPLIFIED_ZOOMS:
+        if level >= zoom and levels and str(level) in levels:
+            return levels[str(level)]
+    return full
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from producers.models import Plot
+from reports.area_discrepancy import area_discrepancies, write_area_discrepancy_csv
+
+
+class Command(BaseCommand):
+    help = "Lista las parcelas cuya superficie declarada difiere de la medida en más del porcentaje indicado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=20.0, help="Diferencia máxima tolerada, en %%.")
+        parser.add_argument("--output", help="Ruta del CSV a generar (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        pending = Plot.objects.filter(polygon__isnull=False, measured_area_ha__isnull=True).count()
+        if pending:
+            self.stderr.write(
+                self.style.WARNING(f"{pending} parcelas aún no tienen superficie medida; ejecuta recompute_plot_geometry.")
+            )
+
+        queryset = area_discrepancies(options["threshold"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                count = write_area_discrepancy_csv(queryset, output)
+            self.stderr.write(self.style.SUCCESS(f"{count} parcelas exceden el {options['threshold']}% de diferencia."))
+        else:
+            write_area_discrepancy_csv(queryset, self.stdout)
@@ -0,0 +1,102 @@
+import json
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from producers.models import Plot, PlotOverlap
+from producers.overlaps import MIN_OVERLAP_HA, candidate_pairs, measure_pairs
+from producers.spatial_index import BBOX_FIELDS
+
+# SQL Server admite como mucho 2100 parámetros por consulta.
+POLYGON_FETCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Detecta parcelas de productores distintos cuyos polígonos se superponen y reconstruye la tabla de superposiciones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-area",
+            type=float,
+            default=MIN_OVERLAP_HA,
+            help="Área común mínima (ha) para registrar una superposición.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Solo informa las superposiciones encontradas.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = list(
+            Plot.objects.filter(bbox_min_lng__isnull=False, polygon__isnull=False)
+            .values_list("pk", "producer_id", *BBOX_FIELDS)
+            .iterator(chunk_size=5000)
+        )
+        rows = [row for row in rows if None not in row]
+        if not rows:
+            self.stdout.write("No hay parcelas con geometría; ejecuta recompute_plot_geometry si faltan rectángulos.")
+            return
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        producers = np.array([row[1] for row in rows], dtype=np.int64)
+        boxes = np.array([row[2:] for row in rows], dtype=float)
+        origin = (float(np.median(boxes[:, 0])), float(np.median(boxes[:, 1])))
+        # Posición de cada parcela en el barrido, para soltar polígonos que ya
+        # no volverán a aparecer.
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[np.argsort(boxes[:, 0], kind="stable")] = np.arange(len(ids))
+
+        geometries = {}
+        overlaps = []
+        candidates = 0
+        for pairs in candidate_pairs(boxes, producers):
+            candidates += len(pairs)
+            self._load_polygons(ids, np.unique(pairs), geometries)
+            for first, second, area_m2, percent in measure_pairs(pairs, geometries, origin, options["min_area"] * 10_000):
+                plot_a, plot_b = sorted((int(ids[first]), int(ids[second])))
+                overlaps.append(
+                    PlotOverlap(
+                        plot_a_id=plot_a,
+                        plot_b_id=plot_b,
+                        overlap_area_ha=Decimal(f"{area_m2 / 10_000:.4f}"),
+                        overlap_percent=Decimal(f"{min(percent, 100):.2f}"),
+                    )
+                )
+            done = int(rank[pairs[:, 0]].max())
+            for position in [position for position in geometries if rank[position] <= done]:
+                del geometries[position]
+            self.stdout.write(f"{candidates} pares candidatos revisados, {len(overlaps)} superposiciones...")
+
+        if not options["dry_run"]:
+            with transaction.atomic():
+                PlotOverlap.objects.all().delete()
+                PlotOverlap.objects.bulk_create(overlaps, batch_size=1000)
+
+        elapsed = time.monotonic() - started
+        verb = "encontradas" if options["dry_run"] else "registradas"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(ids)} parcelas y {candidates} pares candidatos en {elapsed:.1f}s; {len(overlaps)} superposiciones {verb}."
+            )
+        )
+
+    @staticmethod
+    def _load_polygons(ids, positions, geometries):
+        missing = [int(position) for position in positions if int(position) not in geometries]
+        for start in range(0, len(missing), POLYGON_FETCH_SIZE):
+            chunk = missing[start : start + POLYGON_FETCH_SIZE]
+            by_id = {int(ids[position]): position for position in chunk}
+            unpacked = []
+            for plot_id, packed in Plot.objects.filter(pk__in=by_id).values_list("pk", "polygon_packed"):
+                geometries[by_id[plot_id]] = packed
+                if packed is None:
+                    unpacked.append(plot_id)
+            # Parcelas que aún no tienen forma compacta (ver recompute_plot_geometry).
+            for plot_id, polygon in Plot.objects.filter(pk__in=unpacked).values_list("pk", "polygon"):
+                if isinstance(polygon, str):
+                    try:
+                        polygon = json.loads(polygon)
+                    except json.JSONDecodeError:
+                        polygon = None
+                geometries[by_id[plot_id]] = polygon
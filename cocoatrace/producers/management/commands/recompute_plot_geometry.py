@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db import bulk_update_rows
+from producers.models import Plot
+from producers.signals import plots_bulk_changed
+from producers.spatial_index import plot_box
+
+
+class Command(BaseCommand):
+    help = "Recalcula los campos derivados de la geometría de todas las parcelas por bloques."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Parcelas leídas y actualizadas por bloque.")
+        parser.add_argument("--dry-run", action="store_true", help="Solo informa cuántas parcelas cambiarían.")
+
+    def handle(self, *args, **options):
+        chunk_size = max(options["chunk_size"], 1)
+        fields = Plot.DERIVED_GEOMETRY_FIELDS
+        started = time.monotonic()
+        processed = changed = 0
+        last_pk = 0
+
+        while True:
+            # Paginación por clave para no depender de OFFSET en tablas grandes.
+            plots = list(
+                Plot.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "polygon", *fields)[:chunk_size]
+            )
+            if not plots:
+                break
+            last_pk = plots[-1].pk
+
+            before = [tuple(getattr(plot, field) for field in fields) for plot in plots]
+            previous_boxes = {plot.pk: plot_box(plot) for plot in plots}
+            Plot.refresh_derived_geometry_bulk(plots)
+            stale = [
+                plot
+                for plot, previous in zip(plots, before)
+                if tuple(getattr(plot, field) for field in fields) != previous
+            ]
+            if stale and not options["dry_run"]:
+                bulk_update_rows(Plot, stale, fields)
+                plots_bulk_changed.send(
+                    sender=Plot,
+                    plot_ids=[plot.pk for plot in stale],
+                    previous_boxes=[previous_boxes[plot.pk] for plot in stale],
+                )
+
+            processed += len(plots)
+            changed += len(stale)
+            self.stdout.write(f"{processed} parcelas revisadas, {changed} con cambios...")
+
+        verb = "cambiarían" if options["dry_run"] else "actualizadas"
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"{processed} parcelas revisadas en {elapsed:.1f}s; {changed} {verb}."))
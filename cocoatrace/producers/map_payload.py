@@ -0,0 +1,78 @@
+"""Datos del mapa de parcelas en la ficha de un productor.
+
+El ``<script type="application/json">`` que arma ``json_script`` con las
+parcelas se guarda en la caché de Django por productor, zoom y versión. La
+versión es la generación ``producers:map:<id>`` de ``core.generations``,
+guardada en la base de datos para que la vean todos los procesos;
+``producers.signals`` la incrementa al confirmarse un cambio en las
+parcelas del productor (``save``/``delete`` o ``plots_bulk_changed``, que
+envía la importación). Con una versión nueva, cada proceso deja de usar las
+entradas que tenga guardadas, que expiran solas.
+"""
+
+import json
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.html import json_script
+
+from core import generations
+
+from .models import Plot
+
+ELEMENT_ID = "producer-plot-data"
+_GENERATION_KEY = "producers:map:{}"
+_PAYLOAD_KEY = "producers:map-payload:{}:{}:{}"
+
+
+def map_version(producer_id: int) -> int:
+    return generations.current(_GENERATION_KEY.format(producer_id))
+
+
+def expire_maps(producer_ids: Iterable[Optional[int]]) -> None:
+    """Invalida el mapa guardado de cada productor (llamar después del commit)."""
+    keys = [_GENERATION_KEY.format(producer_id) for producer_id in set(producer_ids) if producer_id]
+    if keys:
+        generations.bump_many(keys)
+
+
+def plot_features(plots: Iterable[Plot], zoom: int) -> List[dict]:
+    features = []
+    for plot in plots:
+        geometry = plot.polygon_for_zoom(zoom)
+        if isinstance(geometry, str) and geometry:
+            try:
+                geometry = json.loads(geometry)
+            except json.JSONDecodeError:
+                geometry = None
+
+        features.append(
+            {
+                "id": plot.pk,
+                "name": plot.name,
+                "code": plot.plot_code,
+                "area": float(plot.area_hectares),
+                "geometry": geometry,
+                "centroid": {
+                    "lat": plot.centroid_lat,
+                    "lng": plot.centroid_lng,
+                },
+            }
+        )
+    return features
+
+
+def plot_data_script(producer_id: int, zoom: int) -> str:
+    """``json_script`` de las parcelas del productor para ``zoom``, desde la caché si está al día."""
+    # La versión se lee antes que las parcelas: si cambian en el medio, lo
+    # que se guarde queda bajo una versión que ya no se usa.
+    key = _PAYLOAD_KEY.format(producer_id, zoom, map_version(producer_id))
+    script = cache.get(key)
+    if script is None:
+        # El mapa usa los niveles simplificados y, si hace falta, la forma
+        # compacta; el JSON completo no se lee.
+        plots = Plot.objects.filter(producer_id=producer_id).defer("polygon")
+        script = json_script(plot_features(plots, zoom), ELEMENT_ID)
+        cache.set(key, script, timeout=settings.PRODUCER_MAP_CACHE_TIMEOUT)
+    return script
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0007_plot_global_id_plot_reported_area_ha_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
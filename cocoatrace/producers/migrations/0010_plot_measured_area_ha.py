@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0009_plotcodesequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='measured_area_ha',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True),
+        ),
+    ]
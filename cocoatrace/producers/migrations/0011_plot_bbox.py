@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0010_plot_measured_area_ha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='bbox_max_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plot',
+            name='bbox_max_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plot',
+            name='bbox_min_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plot',
+            name='bbox_min_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['bbox_min_lng', 'bbox_min_lat'], name='producers_plot_bbox_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0011_plot_bbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlotOverlap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overlap_area_ha', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('overlap_percent', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('plot_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overlaps_as_a', to='producers.plot')),
+                ('plot_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overlaps_as_b', to='producers.plot')),
+            ],
+            options={
+                'ordering': ['-overlap_area_ha'],
+                'unique_together': {('plot_a', 'plot_b')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0012_plotoverlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='polygon_simplified',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0013_plot_polygon_simplified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plot',
+            name='polygon_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0014_plot_polygon_packed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producer',
+            index=models.Index(fields=['created_at', 'id'], name='producers_producer_created_idx'),
+        ),
+    ]
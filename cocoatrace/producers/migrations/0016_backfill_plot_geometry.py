@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.models import Q
+
+# Parcelas leídas y actualizadas por bloque.
+CHUNK_SIZE = 2000
+
+DERIVED_GEOMETRY_FIELDS = (
+    "centroid_lat",
+    "centroid_lng",
+    "measured_area_ha",
+    "bbox_min_lng",
+    "bbox_min_lat",
+    "bbox_max_lng",
+    "bbox_max_lat",
+    "polygon_simplified",
+    "polygon_packed",
+)
+
+
+def backfill_plot_geometry(apps, schema_editor):
+    """Llena los campos derivados (0010, 0011, 0013 y 0014) de las parcelas existentes.
+
+    Sin ``bbox_*`` una parcela no aparece en el índice espacial, los grupos
+    del mapa, las teselas ni los controles de superposición y deforestación.
+    Es lo mismo que ``recompute_plot_geometry``, pero solo para las parcelas
+    que todavía no tienen esos campos.
+    """
+    from core.db import bulk_update_rows
+    from producers.models import Plot as CurrentPlot
+
+    Plot = apps.get_model("producers", "Plot")
+    missing = Plot.objects.filter(Q(bbox_min_lng__isnull=True) | Q(polygon_packed__isnull=True))
+    last_pk = 0
+    while True:
+        # Paginación por clave para no depender de OFFSET en tablas grandes.
+        plots = list(
+            missing.filter(pk__gt=last_pk).order_by("pk").only("pk", "polygon", *DERIVED_GEOMETRY_FIELDS)[:CHUNK_SIZE]
+        )
+        if not plots:
+            break
+        last_pk = plots[-1].pk
+        CurrentPlot.refresh_derived_geometry_bulk(plots)
+        bulk_update_rows(Plot, plots, DERIVED_GEOMETRY_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("producers", "0015_keyset_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_plot_geometry, migrations.RunPython.noop, elidable=True),
+    ]
@@ -1,6 +1,22 @@
-from django.db import models
+from collections import Counter
+from decimal import Decimal
+
+import numpy as np
+
+from django.db import IntegrityError, models, transaction
 from django.core.exceptions import ValidationError
 
+from .geometry import (
+    bounding_boxes,
+    compute_centroids,
+    decode_compact,
+    encode_compact,
+    geodesic_areas,
+    pick_level,
+    simplified_levels,
+)
+from .validation import normalize_geometry
+
 
 def _ensure_closed_ring(ring):
     if not ring:
@@ -76,31 +92,13 @@ def compute_centroid(geometry):
 def validate_geojson(value):
     """
     Validator to ensure the JSONField contains valid GeoJSON.
-    """
-    try:
-        if not isinstance(value, dict):
-            raise ValidationError("GeoJSON inválido: debe ser un diccionario.")
-
-        geom_type = value.get("type")
-        coordinates = value.get("coordinates")
-
-        if not geom_type or not coordinates:
-            raise ValidationError("GeoJSON inválido: los campos 'type' y 'coordinates' son obligatorios.")
 
-        if geom_type not in ["Polygon", "MultiPolygon"]:
-            raise ValidationError("Tipo de GeoJSON inválido: debe ser 'Polygon' o 'MultiPolygon'.")
-
-        if not isinstance(coordinates, list):
-            raise ValidationError("GeoJSON inválido: 'coordinates' debe ser una lista.")
-
-        if geom_type == "Polygon":
-            if not all(isinstance(ring, list) for ring in coordinates):
-                raise ValidationError("Polígono inválido: las coordenadas deben ser una lista de anillos.")
-            if not all(isinstance(point, list) and len(point) >= 2 for ring in coordinates for point in ring):
-                raise ValidationError("Polígono inválido: cada anillo debe ser una lista de puntos (listas numéricas).")
-
-    except (ValueError, TypeError):
-        raise ValidationError("Formato de GeoJSON inválido.")
+    Las autointersecciones no se rechazan aquí: la importación las guarda
+    marcadas y el formulario de parcela las rechaza por su cuenta.
+    """
+    check = normalize_geometry(value)
+    if check.errors:
+        raise ValidationError(f"GeoJSON inválido: {check.errors[0]}")
 
 
 class Producer(models.Model):
@@ -130,6 +128,12 @@ class Producer(models.Model):
     # Auditoría
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Orden de la paginación por clave del listado.
+            models.Index(fields=["created_at", "id"], name="producers_producer_created_idx"),
+        ]
     
     def __str__(self):
         readable_code = self.code or "SIN-CODIGO"
@@ -149,6 +153,7 @@ class Plot(models.Model):
     name = models.CharField(max_length=200)
     plot_code = models.CharField(max_length=50, unique=True)
     global_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     area_hectares = models.DecimalField(max_digits=10, decimal_places=2)
     reported_area_ha = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
 
@@ -161,22 +166,204 @@ class Plot(models.Model):
     )
     centroid_lat = models.FloatField(default=0)
     centroid_lng = models.FloatField(default=0, db_column="centroid_lon")
+    # Superficie del polígono medida sobre el elipsoide (no la declarada).
+    measured_area_ha = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    # Rectángulo envolvente del polígono (ver producers.spatial_index).
+    bbox_min_lng = models.FloatField(null=True, blank=True)
+    bbox_min_lat = models.FloatField(null=True, blank=True)
+    bbox_max_lng = models.FloatField(null=True, blank=True)
+    bbox_max_lat = models.FloatField(null=True, blank=True)
+    # Versiones simplificadas de ``polygon`` por nivel de zoom del mapa
+    # (ver ``geometry.simplified_levels``).
+    polygon_simplified = models.JSONField(null=True, blank=True)
+    # ``polygon`` en forma binaria compacta (ver ``geometry.encode_compact``)
+    # para los procesos masivos que no necesitan decodificar el JSON.
+    polygon_packed = models.BinaryField(null=True, blank=True)
 
     # Estado (hereda del productor pero puede tener validación adicional)
     is_active = models.BooleanField(default=True)
     eudr_compliant = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["bbox_min_lng", "bbox_min_lat"], name="producers_plot_bbox_idx"),
+        ]
     
     def __str__(self):
         readable_code = self.plot_code or self.global_id or "SIN-CODIGO"
         return f"{readable_code} · {self.name}".strip()
 
+    # Campos calculados a partir de ``polygon``; las escrituras masivas
+    # (bulk_create/bulk_update) deben incluirlos porque no pasan por save().
+    DERIVED_GEOMETRY_FIELDS = (
+        "centroid_lat",
+        "centroid_lng",
+        "measured_area_ha",
+        "bbox_min_lng",
+        "bbox_min_lat",
+        "bbox_max_lng",
+        "bbox_max_lat",
+        "polygon_simplified",
+        "polygon_packed",
+    )
+    # Columnas pesadas que las páginas sin mapa no necesitan: ``.defer(*...)``.
+    GEOMETRY_PAYLOAD_FIELDS = ("polygon", "polygon_simplified", "polygon_packed")
+
+    def refresh_derived_geometry(self):
+        self.refresh_derived_geometry_bulk([self])
+
+    @classmethod
+    def refresh_derived_geometry_bulk(cls, plots):
+        """Igual que ``refresh_derived_geometry``, calculando todas las parcelas a la vez."""
+        polygons = [plot.polygon or None for plot in plots]
+        centroids = compute_centroids(polygons)
+        areas = geodesic_areas(polygons)
+        boxes = bounding_boxes(polygons)
+        for plot, polygon, centroid, area, box in zip(plots, polygons, centroids, areas, boxes):
+            if centroid:
+                plot.centroid_lat, plot.centroid_lng = centroid
+            else:
+                plot.centroid_lat = plot.centroid_lat or 0
+                plot.centroid_lng = plot.centroid_lng or 0
+            plot.measured_area_ha = Decimal(f"{area:.4f}") if polygon else None
+            if np.isnan(box[0]):
+                plot.bbox_min_lng = plot.bbox_min_lat = plot.bbox_max_lng = plot.bbox_max_lat = None
+            else:
+                plot.bbox_min_lng, plot.bbox_min_lat, plot.bbox_max_lng, plot.bbox_max_lat = map(float, box)
+            plot.polygon_simplified = simplified_levels(polygon) if polygon else None
+            plot.polygon_packed = encode_compact(polygon) if polygon else None
+
+    @property
+    def has_geometry(self):
+        if "polygon" in self.get_deferred_fields() and self.polygon_packed is not None:
+            return True
+        return bool(self.polygon)
+
+    def polygon_for_zoom(self, zoom):
+        """Geometría con el detalle justo para mostrarse en ``zoom``.
+
+        Si ``polygon`` se difirió, el completo sale de ``polygon_packed``.
+        """
+        if "polygon" in self.get_deferred_fields() and self.polygon_packed is not None:
+            levels = self.polygon_simplified
+            return pick_level(levels, None, zoom) or decode_compact(self.polygon_packed)
+        return pick_level(self.polygon_simplified, self.polygon, zoom)
+
     def save(self, *args, **kwargs):
-        centroid = compute_centroid(self.polygon) if self.polygon else None
-        if centroid:
-            self.centroid_lat, self.centroid_lng = centroid
-        else:
-            self.centroid_lat = self.centroid_lat or 0
-            self.centroid_lng = self.centroid_lng or 0
+        self.refresh_derived_geometry()
         super().save(*args, **kwargs)
+
+
+class PlotOverlap(models.Model):
+    """Par de parcelas de productores distintos cuyos polígonos se superponen.
+
+    La tabla se reconstruye completa con ``detect_plot_overlaps``; ``plot_a``
+    es siempre la parcela de menor id.
+    """
+
+    plot_a = models.ForeignKey(Plot, on_delete=models.CASCADE, related_name="overlaps_as_a")
+    plot_b = models.ForeignKey(Plot, on_delete=models.CASCADE, related_name="overlaps_as_b")
+    overlap_area_ha = models.DecimalField(max_digits=12, decimal_places=4)
+    # Porcentaje de la parcela más pequeña del par cubierto por la otra.
+    overlap_percent = models.DecimalField(max_digits=6, decimal_places=2)
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("plot_a", "plot_b")
+        ordering = ["-overlap_area_ha"]
+
+    def __str__(self):
+        return f"{self.plot_a_id} ∩ {self.plot_b_id} · {self.overlap_area_ha} ha"
+
+    @classmethod
+    def for_producers(cls, producer_ids):
+        """Superposiciones en las que participa alguno de ``producer_ids`` (lista o subconsulta)."""
+        return (
+            cls.objects.filter(models.Q(plot_a__producer__in=producer_ids) | models.Q(plot_b__producer__in=producer_ids))
+            .select_related("plot_a__producer", "plot_b__producer")
+        )
+
+    @classmethod
+    def for_producer(cls, producer):
+        return cls.for_producers([producer.pk])
+
+    @classmethod
+    def for_diligence(cls, diligence):
+        return cls.for_producers(diligence.producers.values("pk"))
+
+
+class PlotCodeSequence(models.Model):
+    """Último sufijo asignado a cada prefijo de código de parcela.
+
+    El primer código de un prefijo es el prefijo mismo y los siguientes
+    ``PREFIJO-2``, ``PREFIJO-3``…, igual que antes, pero sin cargar todos los
+    códigos existentes para buscar el siguiente libre.
+    """
+
+    prefix = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix} · {self.last_value}"
+
+    @staticmethod
+    def format_code(prefix, value):
+        return prefix if value == 1 else f"{prefix}-{value}"
+
+    @classmethod
+    def allocate(cls, prefixes):
+        """Reserva un código único por cada prefijo recibido, en el mismo orden.
+
+        Las filas de secuencia quedan bloqueadas hasta el final de la
+        transacción del llamador, por lo que importaciones concurrentes no
+        pueden entregar el mismo código.
+        """
+        counts = Counter(prefixes)
+        if not counts:
+            return []
+
+        with transaction.atomic():
+            sequences = {
+                sequence.prefix: sequence
+                for sequence in cls.objects.select_for_update().filter(prefix__in=counts)
+            }
+            missing = [prefix for prefix in counts if prefix not in sequences]
+            if missing:
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create([cls(prefix=prefix) for prefix in missing])
+                except IntegrityError:
+                    # Otro proceso creó alguno de los prefijos al mismo tiempo.
+                    for prefix in missing:
+                        cls.objects.get_or_create(prefix=prefix)
+                sequences.update(
+                    (sequence.prefix, sequence)
+                    for sequence in cls.objects.select_for_update().filter(prefix__in=missing)
+                )
+
+            allocated = {prefix: [] for prefix in counts}
+            pending = dict(counts)
+            claimed = set()
+            while pending:
+                candidates = []
+                for prefix, needed in pending.items():
+                    sequence = sequences[prefix]
+                    for _ in range(needed):
+                        sequence.last_value += 1
+                        candidates.append((cls.format_code(prefix, sequence.last_value), prefix))
+                # Códigos creados a mano o anteriores a la secuencia se saltan.
+                codes = [code for code, _prefix in candidates]
+                taken = set(Plot.objects.filter(plot_code__in=codes).values_list("plot_code", flat=True))
+                pending = {}
+                for code, prefix in candidates:
+                    if code in taken or code in claimed:
+                        pending[prefix] = pending.get(prefix, 0) + 1
+                        continue
+                    claimed.add(code)
+                    allocated[prefix].append(code)
+
+            cls.objects.bulk_update(list(sequences.values()), ["last_value"])
+
+        return [allocated[prefix].pop(0) for prefix in prefixes]
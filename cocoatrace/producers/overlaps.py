@@ -0,0 +1,292 @@
+"""Detección de parcelas superpuestas entre productores distintos.
+
+El trabajo tiene dos fases:
+
+1. Poda: un barrido por longitud sobre las columnas ``bbox_*`` encuentra los
+   pares cuyos rectángulos envolventes se tocan, sin leer ningún polígono.
+2. Área exacta: para cada par sobreviviente se calcula el área de la
+   intersección con el teorema de Green. Cada arista de una parcela se corta
+   en los puntos donde cruza el borde de la otra y solo se suman los tramos
+   que quedan dentro; la suma de ambas partes es el doble del área común. Los
+   bordes compartidos en el mismo sentido se cuentan una vez y los opuestos
+   (linderos entre vecinos) ninguna, así que dos parcelas que solo comparten
+   un lindero no se superponen.
+
+Las coordenadas se proyectan con ``equal_area_xy``, por lo que las áreas son
+áreas del elipsoide en metros cuadrados.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .geometry import equal_area_xy, pack_rings
+
+# Intersecciones menores se consideran ruido de digitalización.
+MIN_OVERLAP_HA = 0.01
+# Pares candidatos expandidos por bloque del barrido.
+PAIR_BLOCK_SIZE = 50_000
+# Aristas de una parcela que se cruzan a la vez con las de la otra.
+EDGE_BLOCK_SIZE = 256
+# Tolerancia (en metros) para decidir que un punto está sobre un borde.
+BOUNDARY_TOLERANCE_M = 1e-6
+
+
+@dataclass
+class PlotEdges:
+    """Aristas orientadas de una parcela (exteriores antihorarios, huecos horarios)."""
+
+    starts: np.ndarray
+    ends: np.ndarray
+    area_m2: float
+
+
+def _signed_area(x: np.ndarray, y: np.ndarray) -> float:
+    return float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]) / 2)
+
+
+def plot_edges(geometry: Any, origin: Tuple[float, float]) -> Optional[PlotEdges]:
+    """Proyecta y orienta los anillos de ``geometry`` (GeoJSON o compacta) alrededor de ``origin``."""
+    packed = pack_rings([geometry], holes=True)
+    starts: List[np.ndarray] = []
+    ends: List[np.ndarray] = []
+    area = 0.0
+    bounds = packed.offsets.tolist()
+    for ring, is_hole in enumerate(packed.holes.tolist()):
+        points = packed.coords[bounds[ring] : bounds[ring + 1]]
+        if len(points) < 4:
+            continue
+        x, y = equal_area_xy(points, origin)
+        ring_area = _signed_area(x, y)
+        if ring_area == 0:
+            continue
+        # Exterior antihorario (área positiva) y huecos horarios.
+        if (ring_area < 0) != is_hole:
+            x, y, ring_area = x[::-1], y[::-1], -ring_area
+        xy = np.column_stack((x, y))
+        # Vértices repetidos dejan aristas de largo cero.
+        moving = np.any(xy[:-1] != xy[1:], axis=1)
+        starts.append(xy[:-1][moving])
+        ends.append(xy[1:][moving])
+        area += ring_area
+    if not starts:
+        return None
+    return PlotEdges(np.concatenate(starts), np.concatenate(ends), area)
+
+
+def _cross(ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray) -> np.ndarray:
+    return ax * by - ay * bx
+
+
+def _edge_boxes(edges: PlotEdges) -> np.ndarray:
+    """``(min_x, min_y, max_x, max_y)`` de cada arista."""
+    return np.concatenate((np.minimum(edges.starts, edges.ends), np.maximum(edges.starts, edges.ends)), axis=1)
+
+
+def _cut_pieces(
+    p0: np.ndarray,
+    p1: np.ndarray,
+    r0: np.ndarray,
+    r1: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Corta las aristas ``p0``–``p1`` donde tocan las aristas ``r0``–``r1``; devuelve inicio y fin de cada tramo."""
+    d = p1 - p0
+    e = r1 - r0
+    wx = r0[None, :, 0] - p0[:, None, 0]
+    wy = r0[None, :, 1] - p0[:, None, 1]
+    dx, dy = d[:, None, 0], d[:, None, 1]
+    ex, ey = e[None, :, 0], e[None, :, 1]
+
+    denom = _cross(dx, dy, ex, ey)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = _cross(wx, wy, ex, ey) / denom
+        u = _cross(wx, wy, dx, dy) / denom
+    crossing = (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+    # Aristas colineales: los extremos de la otra arista también cortan.
+    length2 = (dx * dx + dy * dy)
+    collinear = (denom == 0) & (_cross(wx, wy, dx, dy) == 0)
+    t_start = (wx * dx + wy * dy) / length2
+    t_end = ((wx + ex) * dx + (wy + ey) * dy) / length2
+    cuts = np.concatenate(
+        (
+            np.zeros((len(p0), 1)),
+            np.ones((len(p0), 1)),
+            np.where(crossing, t, np.nan),
+            np.where(collinear & (t_start > 0) & (t_start < 1), t_start, np.nan),
+            np.where(collinear & (t_end > 0) & (t_end < 1), t_end, np.nan),
+        ),
+        axis=1,
+    )
+    cuts.sort(axis=1)
+    lower, upper = cuts[:, :-1], cuts[:, 1:]
+    pieces = ~np.isnan(upper) & (upper - lower > 1e-12)
+    edge_index = np.nonzero(pieces)[0]
+    lower, upper = lower[pieces], upper[pieces]
+    a = p0[edge_index] + lower[:, None] * d[edge_index]
+    b = p0[edge_index] + upper[:, None] * d[edge_index]
+    return a, b
+
+
+def _inside_pieces(
+    a: np.ndarray,
+    b: np.ndarray,
+    region: PlotEdges,
+    keep_shared: bool,
+) -> np.ndarray:
+    """Qué tramos ``a``–``b`` quedan dentro de ``region``."""
+    mid = (a + b) / 2
+    direction = b - a
+    r0, r1 = region.starts, region.ends
+    e = r1 - r0
+    mx, my = mid[:, None, 0], mid[:, None, 1]
+    ex, ey = e[None, :, 0], e[None, :, 1]
+
+    # Tramos sobre el borde de la región: cuentan solo si van en el mismo
+    # sentido y ``keep_shared`` lo permite.
+    e_length2 = ex * ex + ey * ey
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.clip(((mx - r0[None, :, 0]) * ex + (my - r0[None, :, 1]) * ey) / e_length2, 0, 1)
+    gap_x = mx - (r0[None, :, 0] + s * ex)
+    gap_y = my - (r0[None, :, 1] + s * ey)
+    on_edge = gap_x * gap_x + gap_y * gap_y <= BOUNDARY_TOLERANCE_M ** 2
+    on_boundary = on_edge.any(axis=1)
+    same_direction = (on_edge & ((direction[:, None, 0] * ex + direction[:, None, 1] * ey) > 0)).any(axis=1)
+
+    # Par/impar con un rayo horizontal hacia +x.
+    y0, y1 = r0[None, :, 1], r1[None, :, 1]
+    spans = (y0 > my) != (y1 > my)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = r0[None, :, 0] + (my - y0) * ex / (y1 - y0)
+    inside = ((spans & (mx < x_at)).sum(axis=1) % 2) == 1
+
+    return np.where(on_boundary, same_direction & keep_shared, inside)
+
+
+def _overlapping(boxes: np.ndarray, window: np.ndarray) -> np.ndarray:
+    return (
+        (boxes[:, 0] <= window[2]) & (boxes[:, 2] >= window[0]) & (boxes[:, 1] <= window[3]) & (boxes[:, 3] >= window[1])
+    )
+
+
+def _inside_contribution(edges: PlotEdges, region: PlotEdges, keep_shared: bool) -> float:
+    """Suma de ``x0*y1 - x1*y0`` de los tramos de ``edges`` dentro de ``region``.
+
+    Solo importa la ventana común a los rectángulos de ambas parcelas: las
+    aristas de ``edges`` que no la tocan quedan fuera de ``region``. Las que
+    la tocan se recorren en bloques de ``EDGE_BLOCK_SIZE`` y cada bloque se
+    compara solo con las aristas de ``region`` que pueden cortarlo o cruzar
+    el rayo de sus tramos, así que la memoria crece con el bloque y no con
+    el producto de los tamaños de ambas parcelas.
+    """
+    edge_boxes, region_boxes = _edge_boxes(edges), _edge_boxes(region)
+    window = np.concatenate(
+        (
+            np.maximum(edge_boxes[:, :2].min(axis=0), region_boxes[:, :2].min(axis=0)) - BOUNDARY_TOLERANCE_M,
+            np.minimum(edge_boxes[:, 2:].max(axis=0), region_boxes[:, 2:].max(axis=0)) + BOUNDARY_TOLERANCE_M,
+        )
+    )
+    if window[0] > window[2] or window[1] > window[3]:
+        return 0.0
+    selected = _overlapping(edge_boxes, window)
+    p0, p1, edge_boxes = edges.starts[selected], edges.ends[selected], edge_boxes[selected]
+
+    total = 0.0
+    for start in range(0, len(p0), EDGE_BLOCK_SIZE):
+        block = slice(start, start + EDGE_BLOCK_SIZE)
+        block_box = np.concatenate((edge_boxes[block, :2].min(axis=0), edge_boxes[block, 2:].max(axis=0)))
+        near = _overlapping(region_boxes, block_box)
+        a, b = _cut_pieces(p0[block], p1[block], region.starts[near], region.ends[near])
+        # Fuera de la ventana no hay región (y ahí el rayo no vería todas
+        # sus aristas), así que esos tramos se descartan sin probarlos.
+        mid = (a + b) / 2
+        in_window = _overlapping(np.concatenate((mid, mid), axis=1), window)
+        a, b, mid = a[in_window], b[in_window], mid[in_window]
+        for piece in range(0, len(a), EDGE_BLOCK_SIZE):
+            chunk = slice(piece, piece + EDGE_BLOCK_SIZE)
+            # Aristas que pueden tocar los tramos o cortar su rayo hacia +x.
+            band = np.array(
+                (
+                    mid[chunk, 0].min() - BOUNDARY_TOLERANCE_M,
+                    mid[chunk, 1].min() - BOUNDARY_TOLERANCE_M,
+                    np.inf,
+                    mid[chunk, 1].max() + BOUNDARY_TOLERANCE_M,
+                )
+            )
+            crossing = _overlapping(region_boxes, band)
+            region_part = PlotEdges(region.starts[crossing], region.ends[crossing], region.area_m2)
+            keep = _inside_pieces(a[chunk], b[chunk], region_part, keep_shared)
+            kept_a, kept_b = a[chunk][keep], b[chunk][keep]
+            total += float(np.sum(_cross(kept_a[:, 0], kept_a[:, 1], kept_b[:, 0], kept_b[:, 1])))
+    return total
+
+
+def intersection_area(first: PlotEdges, second: PlotEdges) -> float:
+    """Área común (m²) de dos parcelas proyectadas con el mismo origen."""
+    total = _inside_contribution(first, second, keep_shared=True) + _inside_contribution(second, first, keep_shared=False)
+    return max(total / 2, 0.0)
+
+
+def candidate_pairs(boxes: np.ndarray, groups: Sequence[int], block_size: int = PAIR_BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """Pares ``(i, j)`` de posiciones con rectángulos que se tocan y grupos distintos.
+
+    Barrido por longitud mínima: para cada caja, las candidatas son las que
+    empiezan antes de que ella termine. Los pares salen en bloques, ordenados
+    por el primer elemento en el orden del barrido.
+    """
+    groups = np.asarray(groups)
+    order = np.argsort(boxes[:, 0], kind="stable")
+    sorted_boxes = boxes[order]
+    sorted_groups = groups[order]
+    stops = np.searchsorted(sorted_boxes[:, 0], sorted_boxes[:, 2], side="right")
+    counts = np.maximum(stops - np.arange(len(order)) - 1, 0)
+
+    position = 0
+    while position < len(order):
+        # Tantas filas del barrido como quepan en un bloque (al menos una).
+        cumulative = np.cumsum(counts[position:])
+        stop = position + max(int(np.searchsorted(cumulative, block_size, side="right")), 1)
+        rows = np.arange(position, min(stop, len(order)))
+        position = rows[-1] + 1
+        row_counts = counts[rows]
+        if not row_counts.sum():
+            continue
+        first = np.repeat(rows, row_counts)
+        offsets = np.cumsum(row_counts) - row_counts
+        second = np.arange(row_counts.sum()) - np.repeat(offsets, row_counts) + first + 1
+        keep = (
+            (sorted_boxes[second, 1] <= sorted_boxes[first, 3])
+            & (sorted_boxes[second, 3] >= sorted_boxes[first, 1])
+            & (sorted_groups[first] != sorted_groups[second])
+        )
+        if keep.any():
+            yield np.column_stack((order[first[keep]], order[second[keep]]))
+
+
+def measure_pairs(
+    pairs: np.ndarray,
+    geometries: Dict[int, Any],
+    origin: Tuple[float, float],
+    min_area_m2: float,
+) -> List[Tuple[int, int, float, float]]:
+    """Área común y porcentaje (de la parcela más pequeña) de cada par.
+
+    ``geometries`` asocia cada posición con su GeoJSON o su forma compacta.
+    Devuelve solo los pares con al menos ``min_area_m2``.
+    """
+    edges: Dict[int, Optional[PlotEdges]] = {}
+    results = []
+    for first, second in pairs.tolist():
+        for position in (first, second):
+            if position not in edges:
+                edges[position] = plot_edges(geometries.get(position), origin)
+        a, b = edges[first], edges[second]
+        if a is None or b is None:
+            continue
+        area = intersection_area(a, b)
+        if area < min_area_m2:
+            continue
+        smaller = min(a.area_m2, b.area_m2)
+        results.append((first, second, area, 100 * area / smaller if smaller else 0.0))
+    return results
@@ -0,0 +1,48 @@
+"""Documentos de búsqueda de productores y parcelas (ver ``core.search``).
+
+Las encuestas no tienen documento propio: su ``global_id`` es el de su
+parcela, así que se encuentran por la parcela o por el productor.
+"""
+
+from core import search
+
+from .models import Plot, Producer
+
+PRODUCER = "producer"
+PLOT = "plot"
+
+
+def _text(*values) -> str:
+    return " ".join(str(value) for value in values if value)
+
+
+def producer_documents(**filters):
+    rows = Producer.objects.filter(**filters).order_by().values_list("pk", "full_name", "code", "document_number")
+    for pk, full_name, code, document_number in rows.iterator(chunk_size=search.CHUNK_SIZE):
+        yield pk, f"{full_name} · {code}", _text(full_name, code, document_number)
+
+
+def plot_documents(**filters):
+    rows = Plot.objects.filter(**filters).order_by().values_list("pk", "name", "plot_code", "global_id", "producer__code")
+    for pk, name, plot_code, global_id, producer_code in rows.iterator(chunk_size=search.CHUNK_SIZE):
+        yield pk, f"{name} · {plot_code or global_id or ''} ({producer_code})", _text(name, plot_code, global_id)
+
+
+search.register(PRODUCER, producer_documents)
+search.register(PLOT, plot_documents)
+
+
+def index_producers(producer_ids) -> int:
+    return search.refresh(PRODUCER, producer_ids)
+
+
+def index_plots(plot_ids) -> int:
+    return search.refresh(PLOT, plot_ids)
+
+
+def unindex_producers(producer_ids) -> None:
+    search.remove(PRODUCER, producer_ids)
+
+
+def unindex_plots(plot_ids) -> None:
+    search.remove(PLOT, plot_ids)
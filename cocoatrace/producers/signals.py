@@ -0,0 +1,140 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .models import Plot, Producer
+from . import clusters, map_payload, search, spatial_index, tiles
+
+# Escrituras masivas de parcelas (bulk_create/bulk_update no envían
+# post_save). Argumentos: ``plot_ids`` y, para las que cambiaron de polígono,
+# ``previous_boxes`` con sus rectángulos anteriores; si alguna cambió de
+# productor, ``previous_producer_ids`` con los que la tenían.
+plots_bulk_changed = Signal()
+
+
+@receiver(pre_save, sender=Plot)
+def _remember_plot_box(sender, instance, raw=False, **kwargs):
+    instance._previous_box = None
+    instance._previous_producer_id = None
+    if raw or instance.pk is None:
+        return
+    previous = Plot.objects.filter(pk=instance.pk).values_list(*spatial_index.BBOX_FIELDS, "producer_id").first()
+    if previous:
+        instance._previous_producer_id = previous[-1]
+        if None not in previous[:-1]:
+            instance._previous_box = tuple(previous[:-1])
+
+
+@receiver(post_save, sender=Plot)
+def _index_saved_plot(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    box = spatial_index.plot_box(instance)
+    point = clusters.plot_point(instance)
+    previous = getattr(instance, "_previous_box", None)
+    producer_ids = [instance.producer_id, getattr(instance, "_previous_producer_id", None)]
+
+    def refresh():
+        spatial_index.apply_plot_changes({instance.pk: box})
+        clusters.apply_plot_changes({instance.pk: point})
+        tiles.invalidate_boxes([previous, box])
+        map_payload.expire_maps(producer_ids)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Plot)
+def _unindex_deleted_plot(sender, instance, **kwargs):
+    plot_id = instance.pk
+    producer_id = instance.producer_id
+    box = spatial_index.plot_box(instance)
+
+    def refresh():
+        spatial_index.apply_plot_changes({plot_id: None})
+        clusters.apply_plot_changes({plot_id: None})
+        tiles.invalidate_boxes([box])
+        map_payload.expire_maps([producer_id])
+
+    transaction.on_commit(refresh)
+
+
+@receiver(plots_bulk_changed)
+def _index_bulk_changes(sender, plot_ids, previous_boxes=(), **kwargs):
+    plot_ids = list(plot_ids)
+    previous_boxes = list(previous_boxes)
+
+    def refresh():
+        boxes = spatial_index.current_boxes(plot_ids)
+        spatial_index.apply_plot_changes(boxes)
+        clusters.apply_plot_changes(clusters.current_points(plot_ids))
+        tiles.invalidate_boxes([*previous_boxes, *boxes.values()])
+
+    if plot_ids:
+        transaction.on_commit(refresh)
+
+
+@receiver(pre_save, sender=Producer)
+def _remember_producer_code(sender, instance, raw=False, **kwargs):
+    instance._previous_code = None
+    if not raw and instance.pk is not None:
+        instance._previous_code = Producer.objects.filter(pk=instance.pk).values_list("code", flat=True).first()
+
+
+@receiver(post_save, sender=Producer)
+def _refresh_producer_tiles(sender, instance, created=False, raw=False, **kwargs):
+    # El código del productor viaja en las teselas de sus parcelas.
+    if raw or created or getattr(instance, "_previous_code", None) == instance.code:
+        return
+    producer_id = instance.pk
+
+    def refresh():
+        # Igual que con las parcelas: una tesela que otro proceso esté
+        # armando con el código anterior se descarta al ver la generación nueva.
+        spatial_index.bump_generation()
+        boxes = Plot.objects.filter(producer_id=producer_id).values_list(*spatial_index.BBOX_FIELDS)
+        tiles.invalidate_boxes(tuple(box) for box in boxes if None not in box)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Producer)
+def _index_producer_text(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_producers([instance.pk])
+    # La etiqueta de cada parcela lleva el código del productor.
+    if not created and getattr(instance, "_previous_code", None) != instance.code:
+        search.index_plots(Plot.objects.filter(producer_id=instance.pk).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Plot)
+def _index_plot_text(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_plots([instance.pk])
+
+
+@receiver(post_delete, sender=Producer)
+def _unindex_producer_text(sender, instance, **kwargs):
+    search.unindex_producers([instance.pk])
+
+
+@receiver(post_delete, sender=Plot)
+def _unindex_plot_text(sender, instance, **kwargs):
+    search.unindex_plots([instance.pk])
+
+
+@receiver(plots_bulk_changed)
+def _index_bulk_plot_texts(sender, plot_ids, **kwargs):
+    search.index_plots(plot_ids)
+
+
+@receiver(plots_bulk_changed)
+def _expire_bulk_producer_maps(sender, plot_ids, previous_producer_ids=(), **kwargs):
+    plot_ids = sorted(set(plot_ids))
+    producer_ids = set(previous_producer_ids)
+    # SQL Server admite como mucho 2100 parámetros por consulta.
+    for start in range(0, len(plot_ids), 2000):
+        rows = Plot.objects.filter(pk__in=plot_ids[start : start + 2000]).values_list("producer_id", flat=True)
+        producer_ids.update(rows.distinct())
+    if producer_ids:
+        transaction.on_commit(lambda: map_payload.expire_maps(producer_ids))
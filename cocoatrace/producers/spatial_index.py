@@ -0,0 +1,283 @@
+"""Índice espacial en memoria sobre los rectángulos envolventes de las parcelas.
+
+Un R-tree empaquetado con STR (Sort-Tile-Recursive) se construye una vez a
+partir de las columnas ``bbox_*`` de ``Plot`` y responde consultas por
+rectángulo o por punto bajando nivel por nivel, sin leer ningún polígono.
+Las consultas devuelven candidatos: parcelas cuyo rectángulo toca la consulta,
+no necesariamente su polígono. ``plots_containing_point`` completa la
+búsqueda con la prueba exacta sobre los polígonos de esos candidatos.
+
+Los cambios hechos con ``Plot.save``/``delete`` (y las escrituras masivas que
+envían ``plots_bulk_changed``) se aplican sobre una capa de cambios pendientes,
+con su propio árbol pequeño, que se funde con el principal cuando crece.
+Entre procesos, cada cambio incrementa una generación guardada en la base de
+datos y anota las parcelas que tocó (``core.generations.record``); un proceso
+que ve una generación más nueva que la suya lee solo esas parcelas y las
+aplica igual. El índice completo se lee al arrancar o si los cambios
+pendientes son demasiados.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from django.utils import timezone
+
+from core import generations
+
+from .geometry import contains_point
+from .models import Plot
+
+NODE_CAPACITY = 16
+# Cambios pendientes tolerados antes de reconstruir el árbol en memoria.
+PENDING_LIMIT = 512
+# Fracción del índice a partir de la cual conviene releerlo entero en lugar
+# de aplicar los cambios de otros procesos uno por uno.
+RELOAD_RATIO = 0.25
+GENERATION_KEY = "producers:plot-index"
+BBOX_FIELDS = ("bbox_min_lng", "bbox_min_lat", "bbox_max_lng", "bbox_max_lat")
+
+Box = Tuple[float, float, float, float]
+
+
+def _str_order(boxes: np.ndarray, capacity: int) -> np.ndarray:
+    """Orden STR: franjas verticales por centro en x y, dentro de cada una, por y."""
+    count = len(boxes)
+    if count <= capacity:
+        return np.arange(count)
+    centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    leaves = -(-count // capacity)
+    slices = int(np.ceil(np.sqrt(leaves)))
+    per_slice = slices * capacity
+    by_x = np.argsort(centers_x, kind="stable")
+    slice_of = np.empty(count, dtype=np.int64)
+    slice_of[by_x] = np.arange(count) // per_slice
+    return np.lexsort((centers_y, slice_of))
+
+
+def _intersects(boxes: np.ndarray, query: Box) -> np.ndarray:
+    min_lng, min_lat, max_lng, max_lat = query
+    return (boxes[:, 0] <= max_lng) & (boxes[:, 2] >= min_lng) & (boxes[:, 1] <= max_lat) & (boxes[:, 3] >= min_lat)
+
+
+class STRTree:
+    """R-tree estático empaquetado por STR.
+
+    ``levels[0]`` son las hojas (una entrada por parcela); cada nodo de un
+    nivel superior cubre un rango contiguo ``[start, stop)`` del nivel de
+    abajo, así que no hace falta guardar punteros a hijos.
+    """
+
+    def __init__(self, ids: Sequence[int], boxes: np.ndarray, capacity: int = NODE_CAPACITY):
+        self.capacity = capacity
+        ids = np.asarray(ids, dtype=np.int64)
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        order = _str_order(boxes, capacity)
+        self.ids = ids[order]
+        self.levels: List[np.ndarray] = [boxes[order]]
+        self.ranges: List[np.ndarray] = [np.empty((0, 2), dtype=np.int64)]
+
+        while len(self.levels[-1]) > capacity:
+            below = self.levels[-1]
+            starts = np.arange(0, len(below), capacity)
+            stops = np.minimum(starts + capacity, len(below))
+            parents = np.column_stack(
+                (
+                    np.minimum.reduceat(below[:, 0], starts),
+                    np.minimum.reduceat(below[:, 1], starts),
+                    np.maximum.reduceat(below[:, 2], starts),
+                    np.maximum.reduceat(below[:, 3], starts),
+                )
+            )
+            # Los padres también se ordenan por STR; cada uno conserva el
+            # rango de hijos que le tocó antes de reordenarlos.
+            parent_order = _str_order(parents, capacity)
+            self.levels.append(parents[parent_order])
+            self.ranges.append(np.column_stack((starts, stops))[parent_order])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, query: Box) -> np.ndarray:
+        """Identificadores cuyas cajas intersectan ``query`` (bordes incluidos)."""
+        if not len(self.ids):
+            return self.ids
+        top = len(self.levels) - 1
+        candidates = np.nonzero(_intersects(self.levels[top], query))[0]
+        for level in range(top, 0, -1):
+            if not len(candidates):
+                return self.ids[:0]
+            ranges = self.ranges[level][candidates]
+            lengths = ranges[:, 1] - ranges[:, 0]
+            # Expande cada rango [start, stop) en los índices del nivel de abajo.
+            offsets = np.cumsum(lengths) - lengths
+            children = np.repeat(ranges[:, 0] - offsets, lengths) + np.arange(lengths.sum())
+            below = self.levels[level - 1]
+            candidates = children[_intersects(below[children], query)]
+        return self.ids[candidates]
+
+
+class PlotSpatialIndex:
+    """Árbol STR más una capa de cambios pendientes (altas, cambios y bajas)."""
+
+    def __init__(self, ids: Sequence[int], boxes: np.ndarray):
+        self.tree = STRTree(ids, boxes)
+        self.pending: Dict[int, Optional[Box]] = {}
+        # Árbol de las cajas pendientes; se arma en la primera consulta
+        # después de un cambio.
+        self._pending_tree: Optional[STRTree] = None
+
+    def upsert(self, plot_id: int, box: Optional[Box]) -> None:
+        """Registra la caja actual de una parcela (``None`` la saca del índice)."""
+        self.pending[plot_id] = box
+        self._pending_tree = None
+        if len(self.pending) > max(PENDING_LIMIT, len(self.tree) // 20):
+            self._merge()
+
+    def remove(self, plot_id: int) -> None:
+        self.upsert(plot_id, None)
+
+    def _merge(self) -> None:
+        keep = ~np.isin(self.tree.ids, np.fromiter(self.pending, dtype=np.int64, count=len(self.pending)))
+        added = [(plot_id, box) for plot_id, box in self.pending.items() if box is not None]
+        ids = np.concatenate((self.tree.ids[keep], np.array([plot_id for plot_id, _box in added], dtype=np.int64)))
+        boxes = np.concatenate((self.tree.levels[0][keep], np.array([box for _id, box in added], dtype=float).reshape(-1, 4)))
+        self.tree = STRTree(ids, boxes)
+        self.pending = {}
+        self._pending_tree = None
+
+    def _pending_index(self) -> STRTree:
+        if self._pending_tree is None:
+            added = [(plot_id, box) for plot_id, box in self.pending.items() if box is not None]
+            self._pending_tree = STRTree(
+                [plot_id for plot_id, _box in added], np.array([box for _id, box in added], dtype=float).reshape(-1, 4)
+            )
+        return self._pending_tree
+
+    def query_bbox(self, min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> List[int]:
+        """Parcelas cuyo rectángulo envolvente intersecta el rectángulo dado."""
+        query = (min_lng, min_lat, max_lng, max_lat)
+        found = [plot_id for plot_id in self.tree.query(query).tolist() if plot_id not in self.pending]
+        if self.pending:
+            found.extend(self._pending_index().query(query).tolist())
+        return found
+
+    def query_point(self, lng: float, lat: float) -> List[int]:
+        """Parcelas cuyo rectángulo envolvente contiene el punto."""
+        return self.query_bbox(lng, lat, lng, lat)
+
+
+def plot_box(plot: Plot) -> Optional[Box]:
+    values = tuple(getattr(plot, field) for field in BBOX_FIELDS)
+    if any(value is None for value in values):
+        return None
+    return values
+
+
+def _load_index() -> PlotSpatialIndex:
+    rows = Plot.objects.filter(bbox_min_lng__isnull=False).values_list("pk", *BBOX_FIELDS)
+    ids = []
+    boxes = []
+    for plot_id, *box in rows.iterator(chunk_size=5000):
+        if None in box:
+            continue
+        ids.append(plot_id)
+        boxes.append(box)
+    return PlotSpatialIndex(ids, np.array(boxes, dtype=float).reshape(-1, 4))
+
+
+_lock = threading.Lock()
+_index: Optional[PlotSpatialIndex] = None
+_index_generation: Optional[int] = None
+_synced_at = None
+
+
+def current_generation(key: str = GENERATION_KEY) -> int:
+    """Contador de cambios de parcelas compartido entre procesos."""
+    return generations.current(key)
+
+
+def bump_generation(key: str = GENERATION_KEY) -> int:
+    return generations.bump(key)
+
+
+def _catch_up(generation: int) -> None:
+    """Lleva el índice del proceso a ``generation``; se llama con ``_lock`` tomado."""
+    global _index, _index_generation, _synced_at
+    started = timezone.now()
+    if _index is not None and _index_generation < generation and not generations.changes_expired(_synced_at):
+        changed = generations.changed_between(GENERATION_KEY, _index_generation, generation)
+        if len(changed) <= max(PENDING_LIMIT, RELOAD_RATIO * len(_index.tree)):
+            for plot_id, box in current_boxes(changed).items():
+                _index.upsert(plot_id, box)
+            _index_generation, _synced_at = generation, started
+            return
+    _index = _load_index()
+    _index_generation, _synced_at = generation, started
+
+
+def plot_index() -> PlotSpatialIndex:
+    """Índice del proceso, al día con los cambios de parcelas de todos los procesos."""
+    generation = current_generation()
+    with _lock:
+        if _index is None or _index_generation != generation:
+            _catch_up(generation)
+        return _index
+
+
+def plots_in_bbox(min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> List[int]:
+    return plot_index().query_bbox(min_lng, min_lat, max_lng, max_lat)
+
+
+def plots_at_point(lng: float, lat: float) -> List[int]:
+    return plot_index().query_point(lng, lat)
+
+
+def plots_containing_point(lng: float, lat: float) -> List[int]:
+    """Parcelas cuyo polígono contiene el punto: candidatas del índice y prueba exacta."""
+    candidates = plots_at_point(lng, lat)
+    if not candidates:
+        return []
+    geometries = {}
+    # SQL Server admite como mucho 2100 parámetros por consulta.
+    for start in range(0, len(candidates), 2000):
+        chunk = candidates[start : start + 2000]
+        geometries.update(Plot.objects.filter(pk__in=chunk).values_list("pk", "polygon_packed"))
+    unpacked = [plot_id for plot_id, packed in geometries.items() if packed is None]
+    if unpacked:
+        geometries.update(Plot.objects.filter(pk__in=unpacked).values_list("pk", "polygon"))
+    plot_ids = list(geometries)
+    inside = contains_point([geometries[plot_id] for plot_id in plot_ids], lng, lat)
+    return [plot_id for plot_id, found in zip(plot_ids, inside.tolist()) if found]
+
+
+def apply_plot_changes(boxes: Dict[int, Optional[Box]]) -> None:
+    """Anota cajas nuevas (o ``None`` para bajas) y las aplica al índice de este proceso.
+
+    Si otro proceso cambió parcelas desde la última lectura, el índice local
+    no se toca: la próxima consulta lee todos los cambios que le faltan.
+    """
+    global _index_generation, _synced_at
+    if not boxes:
+        return
+    generation = generations.record(GENERATION_KEY, boxes)
+    with _lock:
+        if _index is None or _index_generation != generation - 1:
+            return
+        for plot_id, box in boxes.items():
+            _index.upsert(plot_id, box)
+        _index_generation, _synced_at = generation, timezone.now()
+
+
+def current_boxes(plot_ids: Iterable[int]) -> Dict[int, Optional[Box]]:
+    """Cajas guardadas de ``plot_ids`` (``None`` si la parcela no existe o no tiene)."""
+    wanted = sorted(set(plot_ids))
+    boxes: Dict[int, Optional[Box]] = {plot_id: None for plot_id in wanted}
+    # SQL Server admite como mucho 2100 parámetros por consulta.
+    for start in range(0, len(wanted), 2000):
+        rows = Plot.objects.filter(pk__in=wanted[start : start + 2000]).values_list("pk", *BBOX_FIELDS)
+        for plot_id, *box in rows:
+            boxes[plot_id] = None if None in box else tuple(box)
+    return boxes
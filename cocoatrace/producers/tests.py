@@ -1,3 +1,56 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .overlaps import intersection_area, plot_edges
+
+ORIGIN = (-60.0, 5.0)
+
+
+def _square(west, south, east, north):
+    return {
+        "type": "Polygon",
+        "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]],
+    }
+
+
+def _area(west, south, east, north):
+    return plot_edges(_square(west, south, east, north), ORIGIN).area_m2
+
+
+class IntersectionAreaTests(SimpleTestCase):
+    def assertOverlap(self, first, second, expected):
+        a, b = plot_edges(_square(*first), ORIGIN), plot_edges(_square(*second), ORIGIN)
+        self.assertAlmostEqual(intersection_area(a, b), expected, delta=1e-6 * max(expected, 1.0))
+        self.assertAlmostEqual(intersection_area(b, a), expected, delta=1e-6 * max(expected, 1.0))
+
+    def test_half_overlapping_squares(self):
+        self.assertOverlap((-60.0, 5.0, -59.99, 5.01), (-59.995, 5.0, -59.985, 5.01), _area(-59.995, 5.0, -59.99, 5.01))
+
+    def test_nested_squares(self):
+        self.assertOverlap((-60.0, 5.0, -59.99, 5.01), (-59.997, 5.003, -59.994, 5.006), _area(-59.997, 5.003, -59.994, 5.006))
+
+    def test_corner_squares(self):
+        self.assertOverlap((-60.0, 5.0, -59.99, 5.01), (-59.995, 5.005, -59.985, 5.015), _area(-59.995, 5.005, -59.99, 5.01))
+
+    def test_identical_squares(self):
+        self.assertOverlap((-60.0, 5.0, -59.99, 5.01), (-60.0, 5.0, -59.99, 5.01), _area(-60.0, 5.0, -59.99, 5.01))
+
+    def test_neighbours_sharing_a_boundary_do_not_overlap(self):
+        self.assertOverlap((-60.0, 5.0, -59.99, 5.01), (-59.99, 5.0, -59.98, 5.01), 0.0)
+
+    def test_disjoint_squares(self):
+        self.assertOverlap((-60.0, 5.0, -59.99, 5.01), (-59.98, 5.02, -59.97, 5.03), 0.0)
+
+    def test_many_vertices_stay_exact(self):
+        # Los lados de cada cuadrado se parten en miles de vértices colineales.
+        def dense(west, south, east, north, steps=1500):
+            ring = []
+            corners = [(west, south), (east, south), (east, north), (west, north), (west, south)]
+            for (x0, y0), (x1, y1) in zip(corners, corners[1:]):
+                ring.extend([x0 + (x1 - x0) * i / steps, y0 + (y1 - y0) * i / steps] for i in range(steps))
+            ring.append(ring[0])
+            return {"type": "Polygon", "coordinates": [ring]}
+
+        a = plot_edges(dense(-60.0, 5.0, -59.99, 5.01), ORIGIN)
+        b = plot_edges(dense(-59.995, 5.005, -59.985, 5.015), ORIGIN)
+        expected = _area(-59.995, 5.005, -59.99, 5.01)
+        self.assertAlmostEqual(intersection_area(a, b), expected, delta=1e-6 * expected)
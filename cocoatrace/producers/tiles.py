@@ -0,0 +1,411 @@
+"""Teselas vectoriales (Mapbox Vector Tile 2.1) con los polígonos de las parcelas.
+
+Cada tesela ``z/x/y`` (esquema XYZ de Web Mercator, como Leaflet) toma las
+parcelas que ``spatial_index`` encuentra en su rectángulo, usa la geometría
+simplificada adecuada para ``z`` (ver ``Plot.polygon_for_zoom``), la recorta
+al borde de la tesela más un margen y la cuantiza a una grilla de ``EXTENT``
+unidades. El protobuf se escribe a mano; el formato solo necesita varints y
+campos delimitados por longitud.
+
+Las teselas se guardan en disco (``settings.PLOT_TILE_CACHE_DIR``) y se
+borran desde ``producers.signals`` cuando cambia una parcela que las toca.
+Solo se escriben si la generación compartida del índice espacial no cambió
+mientras se generaban.
+"""
+
+import math
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from . import spatial_index
+from .geometry import pack_rings, pick_level
+from .models import Plot
+
+LAYER_NAME = "plots"
+EXTENT = 4096
+# Margen alrededor de cada tesela para que los bordes no se vean cortados.
+BUFFER = 64
+# Por debajo de este zoom las parcelas miden menos de un píxel; por encima
+# del máximo el cliente amplía las teselas del último nivel.
+MIN_TILE_ZOOM = 8
+MAX_TILE_ZOOM = 16
+PROPERTY_KEYS = ("plot_code", "eudr_compliant", "producer_code")
+# SQL Server admite como mucho 2100 parámetros por consulta.
+FETCH_SIZE = 2000
+
+Box = Tuple[float, float, float, float]
+
+
+def _world_xy(lng: np.ndarray, lat: np.ndarray, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas de tesela (en unidades de tesela) de Web Mercator."""
+    scale = 2 ** zoom
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    x = (lng + 180.0) / 360.0 * scale
+    y = (1 - np.log(np.tan(np.radians(lat)) + 1 / np.cos(np.radians(lat))) / math.pi) / 2 * scale
+    return x, y
+
+
+def tile_bounds(zoom: int, x: int, y: int, buffer: float = 0.0) -> Box:
+    """Rectángulo lng/lat de la tesela, ampliado ``buffer`` unidades de tesela."""
+    scale = 2 ** zoom
+
+    def lng(tile_x):
+        return tile_x / scale * 360.0 - 180.0
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / scale))))
+
+    return (lng(x - buffer), lat(y + 1 + buffer), lng(x + 1 + buffer), lat(y - buffer))
+
+
+# --- Protobuf ---------------------------------------------------------------
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _varint_blocks(blocks: Sequence[np.ndarray]) -> List[bytes]:
+    """Varints de varios arreglos de enteros no negativos, codificados de una vez."""
+    if not blocks:
+        return []
+    lengths = np.array([len(block) for block in blocks], dtype=np.int64)
+    values = np.concatenate(blocks).astype(np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for index in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * index))
+    if sizes.max(initial=1) == 1:
+        data = values.astype(np.uint8).tobytes()
+    else:
+        groups = np.stack([(values >> np.uint64(7 * index)) & np.uint64(0x7F) for index in range(10)], axis=1)
+        used = np.arange(10) < sizes[:, None]
+        more = np.arange(10) < (sizes - 1)[:, None]
+        data = (groups | (more.astype(np.uint64) << np.uint64(7)))[used].astype(np.uint8).tobytes()
+    stops = np.concatenate(([0], np.cumsum(sizes)))[np.cumsum(lengths)].tolist()
+    return [data[start:stop] for start, stop in zip([0] + stops[:-1], stops)]
+
+
+def _key(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number: int, payload: bytes) -> bytes:
+    return _key(number, 2) + _varint(len(payload)) + payload
+
+
+def _varint_field(number: int, value: int) -> bytes:
+    return _key(number, 0) + _varint(value)
+
+
+def _packed_field(number: int, values: Sequence[int]) -> bytes:
+    return _bytes_field(number, b"".join(_varint(value) for value in values))
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return _varint_field(7, int(value))
+    return _bytes_field(1, str(value).encode("utf-8"))
+
+
+# --- Geometría --------------------------------------------------------------
+
+
+def _clip_axis(points: np.ndarray, axis: int, limit: float, keep_below: bool) -> np.ndarray:
+    """Un paso de Sutherland–Hodgman contra el semiplano ``x[axis] <= limit`` (o ``>=``)."""
+    if not len(points):
+        return points
+    coordinate = points[:, axis]
+    inside = coordinate <= limit if keep_below else coordinate >= limit
+    if inside.all():
+        return points
+    if not inside.any():
+        return points[:0]
+    start, end = points, np.roll(points, -1, axis=0)
+    start_inside, end_inside = inside, np.roll(inside, -1)
+    crossing = start_inside != end_inside
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (limit - start[:, axis]) / (end[:, axis] - start[:, axis])
+        cut = start + t[:, None] * (end - start)
+    cut[:, axis] = limit
+    # Por arista se emite, en orden, el corte (si cruza) y el punto final
+    # (si queda dentro).
+    candidates = np.stack((cut, end), axis=1).reshape(-1, 2)
+    emitted = np.column_stack((crossing, end_inside)).reshape(-1)
+    return candidates[emitted]
+
+
+def _clip_ring(points: np.ndarray, low: float, high: float) -> np.ndarray:
+    for axis in (0, 1):
+        points = _clip_axis(points, axis, low, keep_below=False)
+        points = _clip_axis(points, axis, high, keep_below=True)
+    return points
+
+
+def _quantized_rings(points: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cuantiza anillos consecutivos (sin punto de cierre) y quita vértices repetidos.
+
+    Devuelve los puntos enteros restantes, su cantidad por anillo y el área
+    con signo de cada anillo.
+    """
+    ring_count = len(lengths)
+    quantized = np.round(points).astype(np.int64)
+    ring_ids = np.repeat(np.arange(ring_count), lengths)
+    ring_starts = np.cumsum(lengths) - lengths
+    # El anterior del primer vértice de cada anillo es su último vértice.
+    previous = np.arange(len(quantized)) - 1
+    filled = lengths > 0
+    previous[ring_starts[filled]] = ring_starts[filled] + lengths[filled] - 1
+    keep = np.any(quantized != quantized[previous], axis=1)
+    quantized, ring_ids = quantized[keep], ring_ids[keep]
+    counts = np.bincount(ring_ids, minlength=ring_count)
+
+    starts = np.cumsum(counts) - counts
+    following = np.arange(len(quantized)) + 1
+    has_points = counts > 0
+    following[starts[has_points] + counts[has_points] - 1] = starts[has_points]
+    x, y = quantized[:, 0], quantized[:, 1]
+    cross = x * y[following] - x[following] * y
+    areas = np.bincount(ring_ids, weights=cross, minlength=ring_count) / 2
+    return quantized, counts, areas
+
+
+def _tile_rings(geometries: Sequence[Any], zoom: int, tile_x: int, tile_y: int) -> List[List[np.ndarray]]:
+    """Anillos recortados y cuantizados de cada geometría, exterior positivo y huecos negativos."""
+    packed = pack_rings(geometries, holes=True)
+    result: List[List[np.ndarray]] = [[] for _ in geometries]
+    if not packed.ring_count:
+        return result
+    x, y = _world_xy(packed.coords[:, 0], packed.coords[:, 1], zoom)
+    points = np.column_stack(((x - tile_x) * EXTENT, (y - tile_y) * EXTENT))
+    # ``pack_rings`` cierra todos los anillos; el punto de cierre sobra aquí.
+    starts = packed.offsets[:-1]
+    lengths = np.maximum(np.diff(packed.offsets) - 1, 0)
+
+    low, high = -BUFFER, EXTENT + BUFFER
+    filled = lengths > 0
+    ring_min = np.full(packed.ring_count, np.inf)
+    ring_max = np.full(packed.ring_count, -np.inf)
+    ring_min[filled] = np.minimum.reduceat(points.min(axis=1), starts[filled])
+    ring_max[filled] = np.maximum.reduceat(points.max(axis=1), starts[filled])
+    contained = filled & (ring_min >= low) & (ring_max <= high)
+
+    # Anillos dentro de la tesela (la gran mayoría): todo de una vez.
+    selected = np.flatnonzero(contained)
+    point_index = np.repeat(starts[selected] - (np.cumsum(lengths[selected]) - lengths[selected]), lengths[selected])
+    point_index += np.arange(len(point_index))
+    quantized, counts, areas = _quantized_rings(points[point_index], lengths[selected])
+    ring_points: Dict[int, Tuple[np.ndarray, float]] = {}
+    offset = 0
+    for ring, count, area in zip(selected.tolist(), counts.tolist(), areas.tolist()):
+        ring_points[ring] = (quantized[offset : offset + count], area)
+        offset += count
+
+    # Anillos que cruzan el borde: se recortan uno por uno.
+    crossing = filled & ~contained & (ring_max >= low) & (ring_min <= high)
+    for ring in np.flatnonzero(crossing).tolist():
+        clipped = _clip_ring(points[starts[ring] : starts[ring] + lengths[ring]], low, high)
+        quantized, counts, areas = _quantized_rings(clipped, np.array([len(clipped)]))
+        ring_points[ring] = (quantized, float(areas[0]))
+
+    for ring in sorted(ring_points):
+        ring_coords, area = ring_points[ring]
+        if len(ring_coords) < 3 or area == 0:
+            continue
+        if (area > 0) == bool(packed.holes[ring]):
+            ring_coords = ring_coords[::-1]
+        result[packed.owners[ring]].append(ring_coords)
+    return result
+
+
+def encode_geometry(rings: Sequence[np.ndarray]) -> np.ndarray:
+    """Comandos MoveTo/LineTo/ClosePath con desplazamientos en zigzag.
+
+    El cursor sigue de un anillo al siguiente, así que los desplazamientos
+    son simplemente las diferencias sobre todos los vértices concatenados.
+    """
+    vertices = np.concatenate(rings)
+    deltas = _zigzag(np.diff(vertices, axis=0, prepend=[[0, 0]])).reshape(-1)
+    pieces = []
+    offset = 0
+    for ring in rings:
+        count = len(ring)
+        pieces.append(np.array([1 | (1 << 3)], dtype=np.uint64))  # MoveTo(1)
+        pieces.append(deltas[2 * offset : 2 * offset + 2])
+        pieces.append(np.array([2 | ((count - 1) << 3)], dtype=np.uint64))  # LineTo(n - 1)
+        pieces.append(deltas[2 * offset + 2 : 2 * (offset + count)])
+        pieces.append(np.array([7 | (1 << 3)], dtype=np.uint64))  # ClosePath
+        offset += count
+    return np.concatenate(pieces)
+
+
+def encode_tile(features: Sequence[Tuple[int, Any, Dict[str, Any]]], zoom: int, tile_x: int, tile_y: int) -> bytes:
+    """Codifica ``(id, geometría, propiedades)`` como una tesela de una capa."""
+    keys = {key: index for index, key in enumerate(PROPERTY_KEYS)}
+    values: Dict[Tuple[type, Any], int] = {}
+    kept = []
+    rings_by_feature = _tile_rings([geometry for _id, geometry, _properties in features], zoom, tile_x, tile_y)
+    for (feature_id, _geometry, properties), rings in zip(features, rings_by_feature):
+        if rings:
+            kept.append((feature_id, properties, encode_geometry(rings)))
+    encoded_features = []
+    geometries = _varint_blocks([commands for _id, _properties, commands in kept])
+    for (feature_id, properties, _commands), geometry in zip(kept, geometries):
+        tags = []
+        for key, value in properties.items():
+            if value is None or value == "":
+                continue
+            tags.extend((keys[key], values.setdefault((type(value), value), len(values))))
+        encoded_features.append(
+            _varint_field(1, feature_id)
+            + _packed_field(2, tags)
+            + _varint_field(3, 3)  # POLYGON
+            + _bytes_field(4, geometry)
+        )
+    if not encoded_features:
+        return b""
+
+    layer = _varint_field(15, 2) + _bytes_field(1, LAYER_NAME.encode("utf-8"))
+    layer += b"".join(_bytes_field(2, feature) for feature in encoded_features)
+    layer += b"".join(_bytes_field(3, key.encode("utf-8")) for key in PROPERTY_KEYS)
+    layer += b"".join(_bytes_field(4, _encode_value(value)) for (_type, value) in values)
+    layer += _varint_field(5, EXTENT)
+    return _bytes_field(3, layer)
+
+
+# --- Datos y caché ----------------------------------------------------------
+
+
+def render_plot_tile(zoom: int, tile_x: int, tile_y: int) -> bytes:
+    if zoom < MIN_TILE_ZOOM:
+        return b""
+    ids = sorted(spatial_index.plots_in_bbox(*tile_bounds(zoom, tile_x, tile_y, buffer=BUFFER / EXTENT)))
+    features = []
+    missing = []
+    for start in range(0, len(ids), FETCH_SIZE):
+        rows = Plot.objects.filter(pk__in=ids[start : start + FETCH_SIZE]).values_list(
+            "pk", "polygon_simplified", "plot_code", "eudr_compliant", "producer__code"
+        )
+        for plot_id, simplified, plot_code, compliant, producer_code in rows:
+            properties = {"plot_code": plot_code, "eudr_compliant": compliant, "producer_code": producer_code}
+            geometry = pick_level(simplified, None, zoom)
+            if geometry is None:
+                missing.append(len(features))
+            features.append((plot_id, geometry, properties))
+
+    # El polígono completo solo se lee cuando ningún nivel simplificado sirve,
+    # y en su forma compacta si la parcela ya la tiene.
+    positions = {features[index][0]: index for index in missing}
+    for field in ("polygon_packed", "polygon"):
+        plot_ids = [plot_id for plot_id, index in positions.items() if features[index][1] is None]
+        for start in range(0, len(plot_ids), FETCH_SIZE):
+            rows = Plot.objects.filter(pk__in=plot_ids[start : start + FETCH_SIZE]).values_list("pk", field)
+            for plot_id, geometry in rows:
+                index = positions[plot_id]
+                features[index] = (plot_id, geometry, features[index][2])
+    return encode_tile(features, zoom, tile_x, tile_y)
+
+
+def tile_path(zoom: int, tile_x: int, tile_y: int) -> str:
+    return os.path.join(settings.PLOT_TILE_CACHE_DIR, str(zoom), str(tile_x), f"{tile_y}.mvt")
+
+
+def cached_plot_tile(zoom: int, tile_x: int, tile_y: int) -> bytes:
+    """Tesela desde el disco o, si no está, generada y guardada."""
+    path = tile_path(zoom, tile_x, tile_y)
+    try:
+        with open(path, "rb") as cached:
+            return cached.read()
+    except FileNotFoundError:
+        pass
+
+    # La generación es la compartida en la base de datos: también cambia
+    # cuando la parcela la modificó otro proceso (que además borra del disco
+    # las teselas que toca, después de incrementarla).
+    generation = spatial_index.current_generation()
+    content = render_plot_tile(zoom, tile_x, tile_y)
+    # Si una parcela cambió mientras se generaba, la tesela puede estar
+    # desactualizada: se sirve pero no se guarda.
+    if spatial_index.current_generation() != generation:
+        return content
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(handle, "wb") as output:
+        output.write(content)
+    os.replace(temporary, path)
+    # Un cambio entre la comprobación y el ``replace`` pudo borrar las
+    # teselas antes de que esta llegara al disco: se vuelve a mirar.
+    if spatial_index.current_generation() != generation:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return content
+
+
+def _tile_ranges(boxes: np.ndarray, zoom: int, buffer: float) -> Tuple[np.ndarray, ...]:
+    """Primera y última tesela en x e y que tocan cada caja (contando el margen)."""
+    xs, ys = _world_xy(boxes[:, [0, 2]], boxes[:, [3, 1]], zoom)
+    last = 2 ** zoom - 1
+    first_x = np.clip(np.floor(xs[:, 0] - buffer), 0, last)
+    last_x = np.clip(np.floor(xs[:, 1] + buffer), 0, last)
+    first_y = np.clip(np.floor(ys[:, 0] - buffer), 0, last)
+    last_y = np.clip(np.floor(ys[:, 1] + buffer), 0, last)
+    return first_x, last_x, first_y, last_y
+
+
+def invalidate_boxes(boxes: Iterable[Optional[Box]]) -> int:
+    """Borra del disco las teselas que tocan alguno de ``boxes``.
+
+    Recorre las teselas guardadas en vez de las que podrían tocar las cajas:
+    una importación masiva cambia miles de parcelas, pero la caché solo
+    tiene las teselas que alguien pidió.
+    """
+    boxes = np.array([box for box in boxes if box is not None], dtype=float).reshape(-1, 4)
+    removed = 0
+    if not len(boxes):
+        return removed
+    for zoom in range(MIN_TILE_ZOOM, MAX_TILE_ZOOM + 1):
+        zoom_dir = os.path.join(settings.PLOT_TILE_CACHE_DIR, str(zoom))
+        try:
+            columns = [int(name) for name in os.listdir(zoom_dir) if name.isdigit()]
+        except FileNotFoundError:
+            continue
+        first_x, last_x, first_y, last_y = _tile_ranges(boxes, zoom, BUFFER / EXTENT)
+        for tile_x in columns:
+            touching = (first_x <= tile_x) & (last_x >= tile_x)
+            if not touching.any():
+                continue
+            column_first_y, column_last_y = first_y[touching], last_y[touching]
+            column_dir = os.path.join(zoom_dir, str(tile_x))
+            try:
+                names = os.listdir(column_dir)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                tile_y = name[: -len(".mvt")]
+                if not name.endswith(".mvt") or not tile_y.isdigit():
+                    continue
+                if ((column_first_y <= int(tile_y)) & (column_last_y >= int(tile_y))).any():
+                    try:
+                        os.remove(os.path.join(column_dir, name))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+    return removed
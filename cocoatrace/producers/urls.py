@@ -13,4 +13,9 @@ urlpatterns = [
     path('producers/<int:producer_pk>/plots/<int:plot_pk>/', views.plot_detail, name='plot_detail'),
     path('producers/<int:producer_pk>/documents/<int:document_pk>/edit/', views.edit_document, name='edit_document'),
     path('producers/<int:producer_pk>/documents/<int:document_pk>/delete/', views.delete_document, name='delete_document'),
+    path('api/search/', views.search_records, name='search_records'),
+    path('api/plots/lookup/', views.plot_lookup, name='plot_lookup'),
+    path('api/plots/clusters/', views.plot_clusters, name='plot_clusters'),
+    path('api/plots/export.geojson', views.export_plots_geojson, name='export_plots_geojson'),
+    path('tiles/plots/<int:z>/<int:x>/<int:y>.mvt', views.plot_tile, name='plot_tile'),
 ]
@@ -0,0 +1,246 @@
+"""Validación y normalización de los polígonos de las parcelas.
+
+``normalize_geometry`` revisa la estructura de un Polygon/MultiPolygon
+GeoJSON y devuelve una copia normalizada:
+
+* solo lng/lat (se descarta la altitud), redondeadas a ``COORDINATE_DECIMALS``;
+* sin vértices consecutivos repetidos y con cada anillo cerrado;
+* exteriores antihorarios y huecos horarios (RFC 7946);
+* sin huecos degenerados (menos de tres vértices o área nula).
+
+Los problemas que no se pueden reparar (tipos incorrectos, coordenadas no
+numéricas o fuera de rango, exteriores degenerados) son errores. Las
+autointersecciones no se reparan: se cuentan en ``self_intersections`` y
+cada llamador decide si rechazar la geometría (el formulario) o solo
+marcarla (la importación).
+
+Cada geometría se procesa con NumPy sobre todos sus vértices a la vez; las
+autointersecciones se buscan con el mismo barrido por rectángulos que
+``overlaps.candidate_pairs``, así que el costo crece casi linealmente con los
+vértices.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import numpy as np
+
+from .overlaps import candidate_pairs
+
+# 1e-7 grados son ~1 cm, más que la precisión de cualquier GPS de campo.
+COORDINATE_DECIMALS = 7
+
+
+@dataclass
+class GeometryCheck:
+    """Resultado de ``normalize_geometry``."""
+
+    geometry: Optional[dict] = None
+    errors: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+    self_intersections: int = 0
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+
+def _rings_of(geometry: dict) -> Optional[List[List[Any]]]:
+    """Polígonos (listas de anillos) de la geometría, o ``None`` si la estructura no sirve."""
+    coordinates = geometry.get("coordinates")
+    if not isinstance(coordinates, list) or not coordinates:
+        return None
+    polygons = [coordinates] if geometry["type"] == "Polygon" else coordinates
+    for polygon in polygons:
+        if not isinstance(polygon, list) or not polygon:
+            return None
+        for ring in polygon:
+            if not isinstance(ring, list) or not all(isinstance(point, (list, tuple)) and len(point) >= 2 for point in ring):
+                return None
+    return polygons
+
+
+def _signed_areas(coords: np.ndarray, ring_ids: np.ndarray, ring_count: int) -> np.ndarray:
+    """Doble del área con signo de cada anillo (abierto), relativa a su primer vértice."""
+    starts = np.searchsorted(ring_ids, np.arange(ring_count))
+    relative = coords - coords[starts][ring_ids]
+    following = np.arange(len(coords)) + 1
+    last = np.append(starts[1:], len(coords)) - 1
+    following[last] = starts
+    x, y = relative[:, 0], relative[:, 1]
+    return np.bincount(ring_ids, weights=x * y[following] - x[following] * y, minlength=ring_count)
+
+
+def _orientation(ax, ay, bx, by, cx, cy) -> np.ndarray:
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _on_segment(ax, ay, bx, by, px, py) -> np.ndarray:
+    """Para puntos colineales: si ``p`` cae dentro del rectángulo del segmento ``ab``."""
+    return (
+        (np.minimum(ax, bx) <= px) & (px <= np.maximum(ax, bx)) & (np.minimum(ay, by) <= py) & (py <= np.maximum(ay, by))
+    )
+
+
+def count_self_intersections(rings: List[np.ndarray]) -> int:
+    """Pares de aristas de un polígono que se cruzan o se tocan indebidamente.
+
+    ``rings`` son los anillos abiertos (sin repetir el primer vértice) de un
+    mismo polígono. Dentro de un anillo cualquier contacto entre aristas no
+    consecutivas cuenta, y también dos consecutivas que vuelven sobre sí
+    mismas (una "espiga"); entre anillos distintos cuentan los cruces
+    propios.
+    """
+    if not rings:
+        return 0
+    origin = np.concatenate(rings).min(axis=0)
+    starts = np.concatenate([ring - origin for ring in rings])
+    ends = np.concatenate([np.roll(ring, -1, axis=0) - origin for ring in rings])
+    ring_ids = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+    positions = np.concatenate([np.arange(len(ring)) for ring in rings])
+    sizes = np.array([len(ring) for ring in rings])[ring_ids]
+
+    # Espigas: arista y la siguiente colineales y en sentidos opuestos.
+    direction = ends - starts
+    following = np.arange(len(starts)) + 1
+    following[positions == sizes - 1] -= sizes[positions == sizes - 1]
+    cross = direction[:, 0] * direction[following, 1] - direction[:, 1] * direction[following, 0]
+    dot = (direction * direction[following]).sum(axis=1)
+    count = int(np.sum((cross == 0) & (dot < 0) & (sizes > 2)))
+
+    boxes = np.column_stack((np.minimum(starts, ends), np.maximum(starts, ends)))
+    for pairs in candidate_pairs(boxes, np.arange(len(starts))):
+        first, second = pairs[:, 0], pairs[:, 1]
+        same_ring = ring_ids[first] == ring_ids[second]
+        gap = np.abs(positions[first] - positions[second])
+        adjacent = same_ring & ((gap == 1) | (gap == sizes[first] - 1))
+        first, second, same_ring = first[~adjacent], second[~adjacent], same_ring[~adjacent]
+        ax, ay = starts[first].T
+        bx, by = ends[first].T
+        cx, cy = starts[second].T
+        dx, dy = ends[second].T
+        o1 = _orientation(ax, ay, bx, by, cx, cy)
+        o2 = _orientation(ax, ay, bx, by, dx, dy)
+        o3 = _orientation(cx, cy, dx, dy, ax, ay)
+        o4 = _orientation(cx, cy, dx, dy, bx, by)
+        proper = (o1 * o2 < 0) & (o3 * o4 < 0)
+        touching = (
+            ((o1 == 0) & _on_segment(ax, ay, bx, by, cx, cy))
+            | ((o2 == 0) & _on_segment(ax, ay, bx, by, dx, dy))
+            | ((o3 == 0) & _on_segment(cx, cy, dx, dy, ax, ay))
+            | ((o4 == 0) & _on_segment(cx, cy, dx, dy, bx, by))
+        )
+        count += int(np.sum(proper | (same_ring & touching)))
+    return count
+
+
+def normalize_geometry(geometry: Any) -> GeometryCheck:
+    """Valida y normaliza un Polygon/MultiPolygon GeoJSON (ver el docstring del módulo)."""
+    check = GeometryCheck()
+    if not isinstance(geometry, dict):
+        check.errors.append("La geometría no es un objeto válido.")
+        return check
+    geom_type = geometry.get("type")
+    if geom_type not in {"Polygon", "MultiPolygon"}:
+        check.errors.append("Solo se admiten geometrías Polygon o MultiPolygon.")
+        return check
+    polygons = _rings_of(geometry)
+    if polygons is None:
+        check.errors.append("Las coordenadas deben ser listas de anillos con puntos [lng, lat].")
+        return check
+
+    ring_lengths = [len(ring) for polygon in polygons for ring in polygon]
+    try:
+        raw = np.array([point[:2] for polygon in polygons for ring in polygon for point in ring], dtype=float)
+    except (TypeError, ValueError):
+        check.errors.append("Hay coordenadas que no son números.")
+        return check
+    raw = raw.reshape(-1, 2)
+    if not np.isfinite(raw).all():
+        check.errors.append("Hay coordenadas vacías o infinitas.")
+        return check
+    if (np.abs(raw[:, 0]) > 180).any() or (np.abs(raw[:, 1]) > 90).any():
+        check.errors.append("Hay coordenadas fuera de rango (lng ±180, lat ±90).")
+        return check
+    if any(len(point) > 2 for polygon in polygons for ring in polygon for point in ring):
+        check.repairs.append("se descartó la altitud de los vértices")
+
+    coords = np.round(raw, COORDINATE_DECIMALS)
+    if not np.array_equal(coords, raw):
+        check.repairs.append(f"coordenadas redondeadas a {COORDINATE_DECIMALS} decimales")
+
+    ring_count = len(ring_lengths)
+    ring_ids = np.repeat(np.arange(ring_count), ring_lengths)
+    starts = np.cumsum(ring_lengths) - ring_lengths
+    lengths = np.array(ring_lengths)
+
+    # Cierre: el último vértice igual al primero se quita y se vuelve a
+    # poner al final, así los anillos abiertos y cerrados se tratan igual.
+    filled = lengths > 0
+    closed = np.zeros(ring_count, dtype=bool)
+    closed[filled] = np.all(coords[starts[filled]] == coords[(starts + lengths - 1)[filled]], axis=1) & (lengths[filled] > 1)
+    keep = np.ones(len(coords), dtype=bool)
+    keep[(starts + lengths - 1)[closed]] = False
+    unclosed = int(np.sum(filled & ~closed))
+    if unclosed:
+        check.repairs.append(f"se cerraron {unclosed} anillos")
+
+    # Vértices repetidos: se compara cada uno con el siguiente del anillo
+    # (el último con el primero) y se quita el repetido.
+    coords, ring_ids = coords[keep], ring_ids[keep]
+    counts = np.bincount(ring_ids, minlength=ring_count)
+    starts = np.cumsum(counts) - counts
+    following = np.arange(len(coords)) + 1
+    nonempty = counts > 0
+    following[(starts + counts - 1)[nonempty]] = starts[nonempty]
+    unique = np.any(coords != coords[following], axis=1) | (counts[ring_ids] == 1)
+    duplicates = int(np.sum(~unique))
+    if duplicates:
+        check.repairs.append(f"se quitaron {duplicates} vértices repetidos")
+    coords, ring_ids = coords[unique], ring_ids[unique]
+    counts = np.bincount(ring_ids, minlength=ring_count)
+
+    areas = np.zeros(ring_count)
+    usable = counts >= 3
+    if usable.any():
+        present = np.flatnonzero(usable)
+        selected = usable[ring_ids]
+        remap = np.full(ring_count, -1)
+        remap[present] = np.arange(len(present))
+        areas[present] = _signed_areas(coords[selected], remap[ring_ids[selected]], len(present))
+
+    exterior = np.zeros(ring_count, dtype=bool)
+    exterior[np.cumsum([0] + [len(polygon) for polygon in polygons[:-1]])] = True
+    degenerate = ~usable | (areas == 0)
+    if (degenerate & exterior).any():
+        check.errors.append("Un anillo exterior tiene menos de tres vértices distintos o área nula.")
+        return check
+    dropped = int(np.sum(degenerate & ~exterior))
+    if dropped:
+        check.repairs.append(f"se descartaron {dropped} huecos degenerados")
+    reversed_rings = ~degenerate & ((areas < 0) == exterior)
+    if reversed_rings.any():
+        check.repairs.append(f"se corrigió la orientación de {int(reversed_rings.sum())} anillos")
+
+    counts_list = counts.tolist()
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    normalized: List[List[List[List[float]]]] = []
+    ring = 0
+    for polygon in polygons:
+        open_rings: List[np.ndarray] = []
+        for _ in polygon:
+            if not degenerate[ring]:
+                points = coords[offsets[ring] : offsets[ring] + counts_list[ring]]
+                if reversed_rings[ring]:
+                    # Invertida conservando el primer vértice.
+                    points = np.concatenate((points[:1], points[:0:-1]))
+                open_rings.append(points)
+            ring += 1
+        check.self_intersections += count_self_intersections(open_rings)
+        normalized.append([np.concatenate((points, points[:1])).tolist() for points in open_rings])
+
+    check.geometry = {
+        "type": geom_type,
+        "coordinates": normalized[0] if geom_type == "Polygon" else normalized,
+    }
+    return check
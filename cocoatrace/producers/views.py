@@ -1,52 +1,66 @@
 import json
 
 from django.contrib import messages
-from django.http import HttpResponse
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils.text import slugify
 
 from core.models import ActivityLog
+from core import search as text_search
+from core.pagination import keyset_page
 from core.utils import log_activity
 from reports.producer_dossier import build_producer_dossier
 
+from .clusters import plot_clusters as cluster_plots
+from .export import plot_feature_collection
 from .forms import DocumentForm, PlotForm, ProducerForm
-from .models import Document, Plot, Producer
+from .geometry import MAX_MAP_ZOOM, fit_zoom
+from .map_payload import plot_data_script
+from .models import Document, Plot, PlotOverlap, Producer
+from .search import PLOT, PRODUCER
+from .spatial_index import plots_containing_point
+from .tiles import MAX_TILE_ZOOM, cached_plot_tile
+from .validation import COORDINATE_DECIMALS
+
+
+def _map_zoom(request, plots):
+    """Zoom pedido en ``?zoom=`` o, si no, el que elegirá ``fitBounds`` sobre las parcelas."""
+    try:
+        return min(max(int(request.GET['zoom']), 0), MAX_MAP_ZOOM)
+    except (KeyError, ValueError):
+        pass
+    boxes = [
+        (plot.bbox_min_lng, plot.bbox_min_lat, plot.bbox_max_lng, plot.bbox_max_lat)
+        for plot in plots
+        if plot.bbox_min_lng is not None
+    ]
+    if not boxes:
+        return MAX_MAP_ZOOM
+    min_lng, min_lat, max_lng, max_lat = zip(*boxes)
+    return fit_zoom((min(min_lng), min(min_lat), max(max_lng), max(max_lat)))
 
 
 def producer_list(request):
-    producers = Producer.objects.prefetch_related('plot_set')
-    return render(request, 'producers/producer_list.html', {'producers': producers})
+    producers = Producer.objects.prefetch_related(
+        Prefetch('plot_set', queryset=Plot.objects.defer(*Plot.GEOMETRY_PAYLOAD_FIELDS))
+    )
+    page = keyset_page(request, producers, ('-created_at', '-pk'), with_total=True)
+    return render(request, 'producers/producer_list.html', {'producers': page, 'page': page})
 
 
 def producer_detail(request, pk):
     producer = get_object_or_404(
-        Producer.objects.prefetch_related('plot_set', 'documents'),
+        # La tabla solo mira polygon_packed (has_geometry); el mapa sale de
+        # map_payload, guardado en la caché.
+        Producer.objects.prefetch_related(
+            Prefetch('plot_set', queryset=Plot.objects.defer('polygon', 'polygon_simplified')), 'documents'
+        ),
         pk=pk,
     )
     plots = producer.plot_set.all()
-    plot_features = []
-    for plot in plots:
-        geometry = plot.polygon
-        if isinstance(geometry, str) and geometry:
-            try:
-                geometry = json.loads(geometry)
-            except json.JSONDecodeError:
-                geometry = None
-
-        plot_features.append(
-            {
-                'id': plot.pk,
-                'name': plot.name,
-                'code': plot.plot_code,
-                'area': float(plot.area_hectares),
-                'geometry': geometry,
-                'centroid': {
-                    'lat': plot.centroid_lat,
-                    'lng': plot.centroid_lng,
-                },
-            }
-        )
+    zoom = _map_zoom(request, plots)
 
     if request.method == 'POST':
         document = Document.objects.create(
@@ -58,13 +72,16 @@ def producer_detail(request, pk):
         messages.success(request, 'Documento cargado.')
         return redirect('producer_detail', pk=pk)
 
+    overlaps = PlotOverlap.for_producer(producer)
     return render(
         request,
         'producers/producer_detail.html',
         {
             'producer': producer,
             'plots': plots,
-            'plot_features': plot_features,
+            'plot_data_script': plot_data_script(producer.pk, zoom),
+            'overlaps': overlaps[:20],
+            'overlap_count': overlaps.count(),
         },
     )
 
@@ -192,7 +209,7 @@ def edit_producer(request, pk):
 def plot_detail(request, producer_pk, plot_pk):
     producer = get_object_or_404(Producer, pk=producer_pk)
     plot = get_object_or_404(Plot, pk=plot_pk, producer=producer)
-    geojson = json.dumps(plot.polygon) if plot.polygon else None
+    geojson = json.dumps(plot.polygon_for_zoom(_map_zoom(request, [plot]))) if plot.polygon else None
 
     return render(
         request,
@@ -268,3 +285,151 @@ def delete_producer(request, pk):
             'producer': producer,
         },
     )
+
+
+def plot_tile(request, z, x, y):
+    if z > MAX_TILE_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404("Tesela fuera de rango.")
+    response = HttpResponse(cached_plot_tile(z, x, y), content_type='application/vnd.mapbox-vector-tile')
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
+def plot_lookup(request):
+    """Parcela(s) registradas que contienen una coordenada GPS (``?lat=&lng=``)."""
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Indica lat y lng numéricos.'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({'error': 'Coordenadas fuera de rango.'}, status=400)
+
+    plot_ids = plots_containing_point(lng, lat)
+    plots = (
+        Plot.objects.filter(pk__in=plot_ids)
+        .select_related('producer')
+        .defer(*Plot.GEOMETRY_PAYLOAD_FIELDS)
+        .order_by('plot_code')
+    )
+    return JsonResponse(
+        {
+            'lat': lat,
+            'lng': lng,
+            'plots': [
+                {
+                    'id': plot.pk,
+                    'plot_code': plot.plot_code,
+                    'name': plot.name,
+                    'area_hectares': float(plot.area_hectares),
+                    'eudr_compliant': plot.eudr_compliant,
+                    'url': reverse('plot_detail', args=[plot.producer_id, plot.pk]),
+                    'producer': {
+                        'id': plot.producer_id,
+                        'code': plot.producer.code,
+                        'full_name': plot.producer.full_name,
+                        'compliance_status': plot.producer.compliance_status,
+                    },
+                }
+                for plot in plots
+            ],
+        }
+    )
+
+
+def _int_param(request, name, low, high):
+    """Entero de ``?name=`` acotado a ``[low, high]``, o ``None`` si no viene."""
+    value = request.GET.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        return min(max(int(value), low), high)
+    except ValueError:
+        raise ValueError(f'El parámetro {name} debe ser un número entero.')
+
+
+def export_plots_geojson(request):
+    """Parcelas en GeoJSON, escritas por partes para cualquier volumen.
+
+    Filtros: ``department``, ``municipality``, ``compliance`` (estado del
+    productor), ``eudr_compliant`` (1/0) y ``diligence`` (id de la diligencia
+    EUDR). ``precision`` fija los decimales de las coordenadas y ``zoom`` usa
+    la geometría simplificada de ese nivel de zoom.
+    """
+    plots = Plot.objects.all()
+    department = request.GET.get('department', '').strip()
+    if department:
+        plots = plots.filter(producer__department__iexact=department)
+    municipality = request.GET.get('municipality', '').strip()
+    if municipality:
+        plots = plots.filter(producer__municipality__iexact=municipality)
+    compliance = request.GET.get('compliance', '').strip()
+    if compliance:
+        plots = plots.filter(producer__compliance_status=compliance)
+    eudr_compliant = request.GET.get('eudr_compliant', '').strip().lower()
+    if eudr_compliant:
+        plots = plots.filter(eudr_compliant=eudr_compliant in ('1', 'true', 'si', 'sí'))
+    try:
+        diligence = _int_param(request, 'diligence', 1, 2**63 - 1)
+        decimals = _int_param(request, 'precision', 0, COORDINATE_DECIMALS)
+        zoom = _int_param(request, 'zoom', 0, MAX_MAP_ZOOM)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if diligence is not None:
+        # Subconsulta y no join: un productor puede figurar dos veces en la diligencia.
+        plots = plots.filter(producer__in=Producer.objects.filter(eudr_diligences=diligence).values('pk'))
+
+    response = StreamingHttpResponse(
+        plot_feature_collection(plots, decimals=decimals, zoom=zoom),
+        content_type='application/geo+json',
+    )
+    response['Content-Disposition'] = 'attachment; filename="parcelas.geojson"'
+    return response
+
+
+def plot_clusters(request):
+    """Grupos de parcelas para el mapa general (``?zoom=&bbox=oeste,sur,este,norte``)."""
+    try:
+        zoom = min(max(int(request.GET['zoom']), 0), MAX_MAP_ZOOM)
+        bbox = request.GET.get('bbox', '').strip()
+        min_lng, min_lat, max_lng, max_lat = (float(value) for value in bbox.split(',')) if bbox else (-180, -90, 180, 90)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Indica zoom entero y bbox como oeste,sur,este,norte.'}, status=400)
+    return JsonResponse({'zoom': zoom, 'clusters': cluster_plots(zoom, min_lng, min_lat, max_lng, max_lat)})
+
+
+def search_records(request):
+    """Productores y parcelas que coinciden con ``?q=``, ordenados por parecido.
+
+    Busca sin acentos en nombres, códigos, cédulas y globalid; ``limit``
+    acota los resultados (20 por omisión).
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = _int_param(request, 'limit', 1, 100) or 20
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    hits = text_search.search(query, kinds=(PRODUCER, PLOT), limit=limit)
+    labels = text_search.labels(hits)
+    plot_producers = dict(
+        Plot.objects.filter(pk__in=[hit.object_id for hit in hits if hit.kind == PLOT]).values_list('pk', 'producer_id')
+    )
+    results = []
+    for hit in hits:
+        if hit.kind == PRODUCER:
+            url = reverse('producer_detail', args=[hit.object_id])
+        elif hit.object_id in plot_producers:
+            url = reverse('plot_detail', args=[plot_producers[hit.object_id], hit.object_id])
+        else:
+            # Borrada después de la última sincronización del índice.
+            continue
+        results.append(
+            {
+                'kind': hit.kind,
+                'id': hit.object_id,
+                'label': labels.get((hit.kind, hit.object_id), ''),
+                'score': hit.score,
+                'url': url,
+            }
+        )
+    return JsonResponse({'query': query, 'results': results})
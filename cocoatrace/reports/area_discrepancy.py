@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import csv
+from decimal import Decimal
+from typing import IO
+
+from django.db.models import DecimalField, ExpressionWrapper, F, QuerySet
+from django.db.models.functions import Abs
+
+from producers.models import Plot
+
+AREA_DISCREPANCY_COLUMNS = [
+    "Código parcela",
+    "Parcela",
+    "Código productor",
+    "Productor",
+    "Declarada (ha)",
+    "Medida (ha)",
+    "Diferencia (%)",
+]
+
+
+def area_discrepancies(threshold_percent: Decimal | float | int = 20) -> QuerySet:
+    """Parcelas cuya superficie declarada difiere de la medida en más de ``threshold_percent``.
+
+    El porcentaje se calcula en la base de datos sobre ``measured_area_ha``
+    (ver ``recompute_plot_geometry``), por lo que la consulta recorre toda la
+    tabla sin cargar los polígonos.
+    """
+    difference = ExpressionWrapper(
+        Abs(F("area_hectares") - F("measured_area_ha")) * 100 / F("measured_area_ha"),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return (
+        Plot.objects.filter(measured_area_ha__gt=0, area_hectares__gt=0)
+        .annotate(difference_percent=difference)
+        .filter(difference_percent__gt=threshold_percent)
+        .order_by("-difference_percent", "pk")
+    )
+
+
+def write_area_discrepancy_csv(queryset: QuerySet, output: IO[str]) -> int:
+    writer = csv.writer(output)
+    writer.writerow(AREA_DISCREPANCY_COLUMNS)
+    rows = queryset.values_list(
+        "plot_code",
+        "name",
+        "producer__code",
+        "producer__full_name",
+        "area_hectares",
+        "measured_area_ha",
+        "difference_percent",
+    )
+    count = 0
+    for plot_code, name, producer_code, producer_name, declared, measured, difference in rows.iterator(chunk_size=2000):
+        writer.writerow([plot_code, name, producer_code, producer_name, declared, measured, f"{difference:.1f}"])
+        count += 1
+    return count
@@ -6,6 +6,7 @@ from io import BytesIO
 from compliance.models import EUDRStatusHistory
 from eudr.models import EudrDiligenceProducer
 from inventory.models import Batch
+from producers.models import Plot
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import LETTER
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
@@ -144,7 +145,7 @@ def build_producer_dossier(producer) -> bytes:
     story.append(_build_table(summary_data, col_widths=[2.2 * inch, 3.8 * inch]))
     story.append(Spacer(1, 0.2 * inch))
 
-    plots = list(producer.plot_set.all().order_by("name"))
+    plots = list(producer.plot_set.defer(*Plot.GEOMETRY_PAYLOAD_FIELDS).order_by("name"))
     plot_rows = [["Parcela", "Código", "Área (ha)", "Cumple EUDR"]]
     for plot in plots:
         plot_rows.append(
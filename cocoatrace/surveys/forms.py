@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 
 
 class FeatureCollectionUploadForm(forms.Form):
@@ -12,6 +13,7 @@ class FeatureCollectionUploadForm(forms.Form):
         uploaded = self.cleaned_data["geojson_file"]
         if uploaded.size == 0:
             raise forms.ValidationError("El archivo está vacío.")
-        if uploaded.size > 5 * 1024 * 1024:
-            raise forms.ValidationError("El archivo excede el límite de 5 MB.")
+        max_size_mb = settings.SURVEY_IMPORT_MAX_UPLOAD_MB
+        if uploaded.size > max_size_mb * 1024 * 1024:
+            raise forms.ValidationError(f"El archivo excede el límite de {max_size_mb} MB.")
         return uploaded
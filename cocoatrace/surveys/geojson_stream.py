@@ -0,0 +1,163 @@
+"""Lectura incremental de FeatureCollections GeoJSON.
+
+Los exportes de Survey123 pueden pesar cientos de MB. En lugar de ``json.load``
+sobre el archivo completo, el lector recorre el objeto raíz y decodifica los
+features del arreglo ``features`` uno a la vez, de modo que en memoria solo vive
+el feature actual y un búfer de lectura acotado.
+"""
+
+import codecs
+import json
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+READ_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+
+
+class FeatureCollectionReader:
+    """Itera los features de un FeatureCollection leído desde un archivo abierto.
+
+    ``header`` contiene las claves del objeto raíz que aparecen antes de
+    ``features`` (normalmente ``type``, ``name`` y ``crs``).
+    """
+
+    def __init__(self, fileobj: BinaryIO) -> None:
+        self._file = fileobj
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._consumed = False
+        self._has_features = False
+        self.header: Dict[str, Any] = {}
+        self.features_read = 0
+        self._read_header()
+
+    @property
+    def type(self) -> Optional[str]:
+        # Un arreglo "features" solo es válido en un FeatureCollection, por lo que
+        # se acepta aunque "type" aparezca después del arreglo.
+        if "type" in self.header:
+            return self.header["type"]
+        return "FeatureCollection" if self._has_features else None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._consumed:
+            raise ValueError("El FeatureCollection ya fue recorrido.")
+        self._consumed = True
+        if not self._has_features:
+            return
+        yield from self._iter_array()
+        self._read_trailer()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        if self._pos > READ_SIZE:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        # Se lee al menos lo pendiente para que reintentar un feature grande no
+        # sea cuadrático.
+        size = max(READ_SIZE, len(self._buffer) - self._pos)
+        chunk = self._file.read(size)
+        if not chunk:
+            self._eof = True
+            if isinstance(chunk, bytes):
+                self._buffer += self._decoder.decode(b"", final=True)
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        if not self._buffer and chunk.startswith("\ufeff"):
+            chunk = chunk[1:]
+        self._buffer += chunk
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("El archivo GeoJSON está incompleto.")
+
+    def _expect(self, *tokens: str) -> str:
+        char = self._peek()
+        if char not in tokens:
+            expected = " o ".join(f"'{token}'" for token in tokens)
+            raise ValueError(f"JSON inválido: se esperaba {expected} y se encontró '{char}'.")
+        self._pos += 1
+        return char
+
+    def _decode_value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as exc:
+                if self._fill():
+                    continue
+                raise ValueError(f"JSON inválido: {exc.msg}.") from exc
+            # Un número al final del búfer puede continuar en la siguiente lectura.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _decode_key(self) -> str:
+        if self._peek() != '"':
+            raise ValueError("JSON inválido: se esperaba el nombre de una clave.")
+        key = self._decode_value()
+        self._expect(":")
+        return key
+
+    def _read_header(self) -> None:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._decode_key()
+            if key == "features":
+                if self._peek() != "[":
+                    raise ValueError("El FeatureCollection no incluye una lista de features.")
+                self._pos += 1
+                self._has_features = True
+                return
+            self._store_member(key)
+            if self._expect(",", "}") == "}":
+                return
+
+    def _iter_array(self) -> Iterator[Dict[str, Any]]:
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            try:
+                feature = self._decode_value()
+            except ValueError as exc:
+                raise ValueError(f"Feature {self.features_read + 1}: {exc}") from exc
+            self.features_read += 1
+            yield feature
+            if self._expect(",", "]") == "]":
+                return
+
+    def _read_trailer(self) -> None:
+        while self._expect(",", "}") == ",":
+            self._store_member(self._decode_key())
+
+    def _store_member(self, key: str) -> None:
+        value = self._decode_value()
+        if key == "type" and value != "FeatureCollection":
+            raise ValueError("Solo se admiten archivos GeoJSON con type=FeatureCollection.")
+        self.header[key] = value
+
+
+def read_feature_collection(fileobj: BinaryIO) -> Dict[str, Any]:
+    """Devuelve un FeatureCollection cuyo ``features`` es un generador perezoso.
+
+    El resultado puede pasarse directamente a ``import_feature_collection``.
+    """
+    reader = FeatureCollectionReader(fileobj)
+    return {**reader.header, "type": reader.type, "features": iter(reader)}
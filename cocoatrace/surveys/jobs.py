@@ -0,0 +1,104 @@
+from datetime import timedelta
+from typing import Any, Dict, Iterator, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .geojson_stream import FeatureCollectionReader
+from .models import ImportJob
+from .services import DEFAULT_CHUNK_SIZE, ImportSummary, import_feature_collection
+
+# Un trabajo "en proceso" sin latido durante este tiempo se considera caído y
+# otro worker puede reanudarlo desde su último punto de control.
+STALE_AFTER = timedelta(minutes=10)
+
+
+def claim_next_job(stale_after: timedelta = STALE_AFTER) -> Optional[ImportJob]:
+    """Toma el siguiente trabajo pendiente (o abandonado) para este worker."""
+    stale_before = timezone.now() - stale_after
+    candidates = (
+        ImportJob.objects.filter(
+            Q(status=ImportJob.STATUS_PENDING)
+            | Q(status=ImportJob.STATUS_RUNNING, heartbeat_at__lt=stale_before)
+        )
+        .order_by("created_at")
+        .values_list("pk", "status", "heartbeat_at")
+    )
+    for pk, status, heartbeat_at in candidates[:10]:
+        # Actualización condicional: solo un worker gana la carrera por el trabajo.
+        claimed = ImportJob.objects.filter(pk=pk, status=status, heartbeat_at=heartbeat_at).update(
+            status=ImportJob.STATUS_RUNNING,
+            heartbeat_at=timezone.now(),
+        )
+        if claimed:
+            return ImportJob.objects.get(pk=pk)
+    return None
+
+
+def run_import_job(job: ImportJob, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 0) -> ImportJob:
+    """Procesa (o reanuda) un trabajo de importación en bloques confirmados.
+
+    ``workers`` > 1 reparte la normalización de los features entre procesos.
+    """
+    now = timezone.now()
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJob.STATUS_RUNNING,
+        started_at=job.started_at or now,
+        heartbeat_at=now,
+    )
+
+    read_state: Dict[str, Any] = {}
+    try:
+        with job.source_file.open("rb") as source:
+            reader = FeatureCollectionReader(source)
+            if reader.type != "FeatureCollection":
+                raise ValueError("Solo se admiten archivos GeoJSON con type=FeatureCollection.")
+
+            def checkpoint(last_index: int, chunk_summary: ImportSummary) -> None:
+                merged = ImportSummary.from_dict(job.summary)
+                merged.merge(chunk_summary)
+                values = {
+                    "processed_features": last_index,
+                    "bytes_processed": source.tell(),
+                    "summary": merged.as_dict(),
+                    "heartbeat_at": timezone.now(),
+                }
+                ImportJob.objects.filter(pk=job.pk).update(**values)
+                transaction.on_commit(lambda: _assign(job, values))
+
+            import_feature_collection(
+                {"type": reader.type, "features": _read_features(reader, read_state)},
+                bulk=True,
+                chunk_size=chunk_size,
+                start_index=job.processed_features,
+                on_chunk=checkpoint,
+                workers=workers,
+            )
+    except Exception as exc:  # pylint: disable=broad-except
+        read_state["error"] = str(exc)
+
+    values = {
+        "status": ImportJob.STATUS_FAILED if "error" in read_state else ImportJob.STATUS_COMPLETED,
+        "error_message": read_state.get("error", ""),
+        "finished_at": timezone.now(),
+    }
+    if "error" not in read_state:
+        values["bytes_processed"] = job.total_bytes
+    ImportJob.objects.filter(pk=job.pk).update(**values)
+    job.refresh_from_db()
+    return job
+
+
+def _read_features(reader: FeatureCollectionReader, state: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    # Un archivo truncado marca el trabajo como fallido, conservando los bloques
+    # ya confirmados en lugar de mezclarse con los errores por feature.
+    try:
+        yield from reader
+    except ValueError as exc:
+        state["error"] = str(exc)
+
+
+def _assign(job: ImportJob, values: Dict[str, Any]) -> None:
+    for field, value in values.items():
+        setattr(job, field, value)
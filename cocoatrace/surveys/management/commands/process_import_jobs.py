@@ -0,0 +1,57 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from surveys.jobs import claim_next_job, run_import_job
+from surveys.models import ImportJob
+from surveys.services import DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Procesa las importaciones GeoJSON en cola, reanudando las que quedaron interrumpidas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, help="Procesa solo el trabajo indicado.")
+        parser.add_argument("--once", action="store_true", help="Vacía la cola y termina en lugar de seguir esperando.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Procesos para normalizar features (1 = sin pool). Por defecto, un proceso por núcleo.",
+        )
+        parser.add_argument("--poll-seconds", type=float, default=5.0)
+        parser.add_argument("--stale-minutes", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        workers = options["workers"]
+
+        if options["job"]:
+            try:
+                job = ImportJob.objects.get(pk=options["job"])
+            except ImportJob.DoesNotExist as exc:
+                raise CommandError(f"No existe el trabajo {options['job']}.") from exc
+            self._run(job, chunk_size, workers)
+            return
+
+        stale_after = timedelta(minutes=options["stale_minutes"])
+        while True:
+            job = claim_next_job(stale_after)
+            if job:
+                self._run(job, chunk_size, workers)
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["poll_seconds"])
+
+    def _run(self, job, chunk_size, workers):
+        resume = f" desde el feature {job.processed_features + 1}" if job.processed_features else ""
+        self.stdout.write(f"Procesando {job}{resume}...")
+        job = run_import_job(job, chunk_size=chunk_size, workers=workers)
+        if job.status == ImportJob.STATUS_FAILED:
+            self.stderr.write(self.style.ERROR(f"{job}: {job.error_message}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{job}: {job.processed_features} features procesados."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='survey',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producers', '0015_keyset_index'),
+        ('surveys', '0003_survey_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['census_date', 'id'], name='surveys_survey_census_idx'),
+        ),
+    ]
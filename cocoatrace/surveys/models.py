@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 
@@ -79,12 +80,78 @@ class Survey(models.Model):
 	risk_eudr = models.CharField(max_length=50, blank=True)
 
 	raw_properties = models.JSONField(default=dict, blank=True)
+	# Huella del feature de origen: si coincide al reimportar, el feature se omite.
+	content_hash = models.CharField(max_length=64, blank=True, default="")
 
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
 	class Meta:
 		ordering = ("-census_date",)
+		indexes = [
+			# Orden de la paginación por clave del listado.
+			models.Index(fields=["census_date", "id"], name="surveys_survey_census_idx"),
+		]
 
 	def __str__(self) -> str:
 		return f"Encuesta {self.global_id}"
+
+
+class ImportJob(models.Model):
+	"""Importación de un FeatureCollection ejecutada por ``process_import_jobs``.
+
+	``processed_features`` es el punto de control: se guarda en la misma
+	transacción que cada bloque importado, por lo que una ejecución
+	interrumpida se reanuda a partir del siguiente feature.
+	"""
+
+	STATUS_PENDING = "pending"
+	STATUS_RUNNING = "running"
+	STATUS_COMPLETED = "completed"
+	STATUS_FAILED = "failed"
+	STATUS_CHOICES = [
+		(STATUS_PENDING, "En cola"),
+		(STATUS_RUNNING, "En proceso"),
+		(STATUS_COMPLETED, "Completada"),
+		(STATUS_FAILED, "Fallida"),
+	]
+
+	source_file = models.FileField(upload_to="imports/surveys/%Y/%m/")
+	original_name = models.CharField(max_length=255)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+	total_bytes = models.BigIntegerField(default=0)
+	bytes_processed = models.BigIntegerField(default=0)
+	processed_features = models.PositiveIntegerField(default=0)
+	summary = models.JSONField(default=dict, blank=True)
+	error_message = models.TextField(blank=True)
+
+	created_by = models.ForeignKey(
+		settings.AUTH_USER_MODEL,
+		on_delete=models.SET_NULL,
+		null=True,
+		blank=True,
+		related_name="survey_import_jobs",
+	)
+	heartbeat_at = models.DateTimeField(null=True, blank=True)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ("-created_at",)
+
+	def __str__(self) -> str:
+		return f"Importación {self.pk} · {self.original_name}"
+
+	@property
+	def is_finished(self) -> bool:
+		return self.status in {self.STATUS_COMPLETED, self.STATUS_FAILED}
+
+	@property
+	def progress_percent(self) -> int:
+		if self.status == self.STATUS_COMPLETED:
+			return 100
+		if not self.total_bytes:
+			return 0
+		return min(99, int(self.bytes_processed * 100 / self.total_bytes))
@@ -1,20 +1,43 @@
+import hashlib
 import json
-from dataclasses import dataclass
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, Iterable, Optional
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+import django
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.utils.text import slugify
 
+from core.db import bulk_update_rows
 from core.models import ActivityLog
-from core.utils import log_activity
-from producers.models import Plot, Producer
+from core.utils import buffered_activity_log, log_activity
+from producers.models import Plot, PlotCodeSequence, Producer
+from producers.search import index_producers
+from producers.signals import plots_bulk_changed
+from producers.spatial_index import plot_box
+from producers.validation import GeometryCheck, normalize_geometry
 
 from .models import Enumerator, Survey
 
+# Recibe el índice del último feature del bloque y el resumen de ese bloque.
+ChunkCallback = Callable[[int, "ImportSummary"], None]
+
+# Número de features que se resuelven y escriben juntos en el modo masivo.
+DEFAULT_CHUNK_SIZE = 500
+BULK_BATCH_SIZE = 500
+
+# Forma parte de la huella de cada feature: cambiarla cuando cambie la forma en
+# que se normalizan los datos obliga a reprocesar todo en la próxima importación.
+FEATURE_HASH_VERSION = "2"
+
 
 @dataclass
 class ImportSummary:
@@ -24,11 +47,16 @@ class ImportSummary:
     plots_updated: int = 0
     surveys_created: int = 0
     surveys_updated: int = 0
+    unchanged: int = 0
     errors: list[str] = None
+    # Geometrías importadas pero marcadas para revisión (autointersecciones).
+    warnings: list[str] = None
 
     def __post_init__(self) -> None:
         if self.errors is None:
             self.errors = []
+        if self.warnings is None:
+            self.warnings = []
 
     def as_dict(self) -> Dict[str, Any]:
         return {
@@ -38,9 +66,44 @@ class ImportSummary:
             "plots_updated": self.plots_updated,
             "surveys_created": self.surveys_created,
             "surveys_updated": self.surveys_updated,
+            "unchanged": self.unchanged,
             "errors": self.errors,
+            "warnings": self.warnings,
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImportSummary":
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in (data or {}).items() if key in names})
+
+    def merge(self, other: "ImportSummary") -> None:
+        for field in fields(self):
+            if field.name in ("errors", "warnings"):
+                getattr(self, field.name).extend(getattr(other, field.name))
+            else:
+                setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+@dataclass
+class NormalizedFeature:
+    """Valores de un feature ya convertidos a tipos del modelo.
+
+    Es el resultado de la etapa de normalización (solo CPU, sin consultas) y
+    la entrada de la etapa de escritura en base de datos.
+    """
+
+    index: int
+    global_id: str
+    content_hash: str
+    document_number: str
+    producer_code: str
+    producer_defaults: Dict[str, Any]
+    plot_code_base: str
+    plot_fields: Dict[str, Any]
+    enumerator_id: str
+    survey_fields: Dict[str, Any]
+    warnings: List[str] = field(default_factory=list)
+
 
 def _clean_string(value: Any) -> str:
     if value is None:
@@ -100,26 +163,80 @@ def _parse_datetime(value: Any) -> Optional[datetime]:
     return parsed
 
 
-def _ensure_polygon(geometry: Dict[str, Any]) -> Dict[str, Any]:
-    if not isinstance(geometry, dict):
-        raise ValueError("La geometría no es un objeto válido.")
-    geom_type = geometry.get("type")
-    if geom_type not in {"Polygon", "MultiPolygon"}:
-        raise ValueError("Solo se admiten geometrías Polygon o MultiPolygon.")
-    return geometry
+def _ensure_polygon(geometry: Dict[str, Any]) -> GeometryCheck:
+    """Geometría normalizada; los errores estructurales descartan el feature."""
+    check = normalize_geometry(geometry)
+    if check.errors:
+        raise ValueError(check.errors[0])
+    return check
+
+
+def feature_hash(properties: Dict[str, Any], geometry: Dict[str, Any]) -> str:
+    """Huella estable de las propiedades y la geometría de un feature."""
+    canonical = json.dumps(
+        [FEATURE_HASH_VERSION, properties, geometry],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
 
-def _unique_plot_code(base: str, existing_codes: set[str]) -> str:
-    candidate = base
-    suffix = 1
-    while candidate in existing_codes:
-        suffix += 1
-        candidate = f"{base}-{suffix}"
-    existing_codes.add(candidate)
-    return candidate
+def _chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 
-def import_feature_collection(data: Dict[str, Any]) -> Dict[str, Any]:
+def _iter_until_unreadable(features: Iterable[Any], summary: ImportSummary) -> Iterator[Any]:
+    # Con un generador (lectura incremental) un error de formato aparece a mitad
+    # de la importación: se registra y se detiene sin perder lo ya procesado.
+    iterator = iter(features)
+    while True:
+        try:
+            feature = next(iterator)
+        except StopIteration:
+            return
+        except ValueError as exc:
+            summary.errors.append(f"Lectura interrumpida: {exc}")
+            return
+        yield feature
+
+
+def import_feature_collection(
+    data: Dict[str, Any],
+    *,
+    bulk: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start_index: int = 0,
+    on_chunk: Optional[ChunkCallback] = None,
+    workers: int = 0,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Importa un FeatureCollection de Survey123.
+
+    ``data["features"]`` puede ser una lista o un generador, como el que
+    devuelve ``geojson_stream.read_feature_collection``.
+
+    Con ``bulk=True`` los features se procesan en bloques de ``chunk_size``:
+    productores, parcelas, encuestas y encuestadores se precargan con pocas
+    consultas ``IN`` y se escriben con ``bulk_create``/``bulk_update``.
+    ``on_chunk`` se ejecuta dentro de la transacción de cada bloque, lo que
+    permite guardar un punto de control junto con los datos; ``start_index``
+    omite los features ya procesados al reanudar. Con ``workers`` > 1 la
+    normalización de los bloques corre en un pool de procesos mientras el
+    proceso principal escribe los bloques ya normalizados.
+
+    Los features cuya huella (``feature_hash``) coincide con la guardada en su
+    encuesta y su parcela no se escriben y se cuentan en ``unchanged``.
+
+    Con ``dry_run=True`` no se escribe nada: el resumen describe lo que se
+    crearía, actualizaría u omitiría y qué features fallarían al normalizarse.
+    """
     if not isinstance(data, dict):
         raise ValueError("El archivo no contiene un objeto JSON válido.")
     if data.get("type") != "FeatureCollection":
@@ -130,36 +247,117 @@ def import_feature_collection(data: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("El FeatureCollection no incluye una lista de features.")
 
     summary = ImportSummary()
-    existing_plot_codes = set(Plot.objects.values_list("plot_code", flat=True))
-
-    for index, feature in enumerate(features, start=1):
-        try:
-            _process_feature(feature, summary, existing_plot_codes)
-        except Exception as exc:  # pylint: disable=broad-except
-            summary.errors.append(f"Feature {index}: {exc}")
+    numbered = islice(enumerate(_iter_until_unreadable(features, summary), start=1), start_index, None)
+
+    if dry_run:
+        plan = _ImportPlan()
+        chunks = _chunked(numbered, max(chunk_size, 1))
+        for _last_index, items, errors in _normalize_chunks(chunks, workers):
+            summary.errors.extend(errors)
+            summary.warnings.extend(warning for item in items for warning in item.warnings)
+            _plan_chunk(items, summary, plan)
+        return summary.as_dict()
+
+    # Los registros de actividad de _write_feature se escriben en lotes.
+    with buffered_activity_log():
+        if bulk:
+            chunks = _chunked(numbered, max(chunk_size, 1))
+            for last_index, items, errors in _normalize_chunks(chunks, workers):
+                _import_chunk(last_index, items, errors, summary, on_chunk)
+            return summary.as_dict()
+
+        for index, feature in numbered:
+            try:
+                _process_feature(index, feature, summary)
+            except Exception as exc:  # pylint: disable=broad-except
+                summary.errors.append(f"Feature {index}: {exc}")
 
     return summary.as_dict()
 
 
-@transaction.atomic
-def _process_feature(feature: Dict[str, Any], summary: ImportSummary, existing_plot_codes: set[str]) -> None:
+# --- Etapa de normalización -------------------------------------------------
+
+
+def _parse_feature(feature: Any) -> Tuple[Dict[str, Any], GeometryCheck, str]:
     if not isinstance(feature, dict):
         raise ValueError("El feature no es un objeto JSON válido.")
 
     properties = feature.get("properties") or {}
-    geometry = _ensure_polygon(feature.get("geometry"))
+    check = _ensure_polygon(feature.get("geometry"))
 
     global_id = _normalize_identifier(properties.get("globalid")) or _normalize_identifier(properties.get("globalId"))
     if not global_id:
         raise ValueError("El feature no incluye el identificador 'globalid'.")
-
-    producer = _get_or_create_producer(properties, summary)
-    plot = _get_or_create_plot(properties, geometry, producer, global_id, summary, existing_plot_codes)
-    enumerator = _get_or_create_enumerator(properties)
-    _create_or_update_survey(properties, global_id, producer, plot, enumerator, summary)
+    return properties, check, global_id
+
+
+def normalize_feature(index: int, feature: Any) -> NormalizedFeature:
+    """Convierte un feature crudo sin tocar la base de datos."""
+    properties, check, global_id = _parse_feature(feature)
+    geometry = check.geometry
+    warnings = []
+    if check.self_intersections:
+        # No se rechaza: el polígono viene del campo y se corrige después.
+        warnings.append(
+            f"Feature {index} ({global_id}): el polígono se cruza consigo mismo "
+            f"({check.self_intersections} cruces); se importó para revisión."
+        )
+    document_number, producer_code, producer_defaults = _producer_defaults(properties)
+
+    # Al resolver el productor su código queda igual a producer_code, por lo
+    # que los valores de la parcela que dependen de él pueden calcularse aquí.
+    plot_code_base = slugify(_clean_string(properties.get("ID_UP")) or producer_code or global_id) or global_id.lower()
+
+    return NormalizedFeature(
+        index=index,
+        global_id=global_id,
+        content_hash=feature_hash(properties, geometry),
+        document_number=document_number,
+        producer_code=producer_code,
+        producer_defaults=producer_defaults,
+        plot_code_base=plot_code_base.upper(),
+        plot_fields=_plot_fields(properties, geometry, producer_code, global_id),
+        enumerator_id=_normalize_identifier(properties.get("ID_Encuestador")),
+        survey_fields=_survey_fields(properties),
+        warnings=warnings,
+    )
 
 
-def _get_or_create_producer(properties: Dict[str, Any], summary: ImportSummary) -> Producer:
+def _normalize_chunk(chunk: List[Tuple[int, Any]]) -> Tuple[int, List[NormalizedFeature], List[str]]:
+    items: List[NormalizedFeature] = []
+    errors: List[str] = []
+    for index, feature in chunk:
+        try:
+            items.append(normalize_feature(index, feature))
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(f"Feature {index}: {exc}")
+    return chunk[-1][0], items, errors
+
+
+def _normalize_chunks(
+    chunks: Iterable[List[Tuple[int, Any]]],
+    workers: int,
+) -> Iterator[Tuple[int, List[NormalizedFeature], List[str]]]:
+    if workers <= 1:
+        yield from map(_normalize_chunk, chunks)
+        return
+
+    # "spawn" evita heredar las conexiones abiertas a SQL Server; cada proceso
+    # configura Django por su cuenta con el DJANGO_SETTINGS_MODULE heredado.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+        # Se mantiene un número acotado de bloques en vuelo para no leer todo
+        # el archivo por adelantado y conservar el orden de escritura.
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_normalize_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _producer_defaults(properties: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
     document_number = _normalize_identifier(properties.get("CI_RIF_Productor"))
     producer_name = _clean_string(properties.get("Nombre_Productor")) or "Productor sin nombre"
     producer_code = _clean_string(properties.get("ID_UP")) or document_number or f"PR-{slugify(producer_name) or 'sin-codigo'}"
@@ -167,12 +365,6 @@ def _get_or_create_producer(properties: Dict[str, Any], summary: ImportSummary)
     if producer_code in {"", "None"}:
         producer_code = f"PR-{timezone.now().strftime('%Y%m%d%H%M%S')}"
 
-    producer = None
-    if document_number:
-        producer = Producer.objects.filter(document_number=document_number).first()
-    if not producer:
-        producer = Producer.objects.filter(code=producer_code).first()
-
     defaults = {
         "code": producer_code,
         "full_name": producer_name,
@@ -187,46 +379,15 @@ def _get_or_create_producer(properties: Dict[str, Any], summary: ImportSummary)
         "community": _clean_string(properties.get("comunidad_unidad_producion")),
         "notes": _clean_string(properties.get("observaciones_encuestador")),
     }
+    return document_number, producer_code, defaults
 
-    if producer:
-        updated = False
-        for field, value in defaults.items():
-            if value and getattr(producer, field) != value:
-                setattr(producer, field, value)
-                updated = True
-        if updated:
-            producer.save()
-            summary.producers_updated += 1
-            log_activity("Productor", f"Datos actualizados: {producer.full_name}", producer.code, event_type=ActivityLog.EVENT_UPDATE)
-    else:
-        producer = Producer.objects.create(**defaults)
-        summary.producers_created += 1
-        log_activity("Productor", f"Nuevo productor importado: {producer.full_name}", producer.code, event_type=ActivityLog.EVENT_CREATE)
-
-    return producer
-
-
-def _get_or_create_plot(
-    properties: Dict[str, Any],
-    geometry: Dict[str, Any],
-    producer: Producer,
-    global_id: str,
-    summary: ImportSummary,
-    existing_plot_codes: set[str],
-) -> Plot:
-    plot = Plot.objects.filter(global_id=global_id).first()
 
+def _plot_fields(properties: Dict[str, Any], geometry: Dict[str, Any], producer_code: str, global_id: str) -> Dict[str, Any]:
     area_total = _decimal_or_zero(properties.get("Sup_UP_ha"))
     cocoa_area = _decimal_or_none(properties.get("Sup_Cacao_UP"))
 
-    plot_name = _clean_string(properties.get("ID_UP")) or f"Parcela {producer.code}"
-    plot_code_base = slugify(_clean_string(properties.get("ID_UP")) or producer.code or global_id) or global_id.lower()
-    plot_code = plot.plot_code if plot else _unique_plot_code(plot_code_base.upper(), existing_plot_codes)
-
-    plot_values = {
-        "producer": producer,
-        "name": plot_name,
-        "plot_code": plot_code,
+    plot_fields = {
+        "name": _clean_string(properties.get("ID_UP")) or f"Parcela {producer_code}",
         "global_id": global_id,
         "area_hectares": area_total,
         "reported_area_ha": area_total if area_total else None,
@@ -234,46 +395,12 @@ def _get_or_create_plot(
         "eudr_compliant": False,
     }
     if cocoa_area is not None:
-        plot_values["reported_area_ha"] = cocoa_area
-
-    if plot:
-        changed = False
-        for field, value in plot_values.items():
-            if getattr(plot, field) != value:
-                setattr(plot, field, value)
-                changed = True
-        if changed:
-            plot.save()
-            summary.plots_updated += 1
-            log_activity("Parcela", f"Parcela actualizada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_UPDATE)
-    else:
-        plot = Plot.objects.create(**plot_values)
-        summary.plots_created += 1
-        log_activity("Parcela", f"Parcela importada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_CREATE)
-
-    return plot
-
-
-def _get_or_create_enumerator(properties: Dict[str, Any]) -> Optional[Enumerator]:
-    enumerator_id = _normalize_identifier(properties.get("ID_Encuestador"))
-    if not enumerator_id:
-        return None
-    enumerator, _ = Enumerator.objects.get_or_create(document_number=enumerator_id)
-    return enumerator
+        plot_fields["reported_area_ha"] = cocoa_area
+    return plot_fields
 
 
-def _create_or_update_survey(
-    properties: Dict[str, Any],
-    global_id: str,
-    producer: Producer,
-    plot: Plot,
-    enumerator: Optional[Enumerator],
-    summary: ImportSummary,
-) -> None:
-    survey_defaults = {
-        "producer": producer,
-        "plot": plot,
-        "enumerator": enumerator,
+def _survey_fields(properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "census_date": _parse_datetime(properties.get("Data_Censo")) or timezone.now(),
         "creation_date": _parse_datetime(properties.get("CreationDate")),
         "edit_date": _parse_datetime(properties.get("EditDate")),
@@ -316,13 +443,465 @@ def _create_or_update_survey(
         "raw_properties": json.loads(json.dumps(properties)),
     }
 
+
+# --- Etapa de escritura -----------------------------------------------------
+
+
+def _apply_changes(instance: Any, values: Dict[str, Any], *, skip_empty: bool = False) -> List[str]:
+    """Asigna los valores distintos y devuelve los campos modificados."""
+    changed: List[str] = []
+    for field, value in values.items():
+        if skip_empty and not value:
+            continue
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed.append(field)
+    return changed
+
+
+def _plot_values(item: NormalizedFeature, producer: Producer, plot_code: str) -> Dict[str, Any]:
+    # Se compara por id para no cargar el productor de cada parcela existente.
+    return {"producer_id": producer.pk, "plot_code": plot_code, **item.plot_fields}
+
+
+def _survey_defaults(
+    item: NormalizedFeature,
+    producer: Producer,
+    plot: Plot,
+    enumerator: Optional[Enumerator],
+) -> Dict[str, Any]:
+    return {
+        "producer_id": producer.pk,
+        "plot_id": plot.pk,
+        "enumerator_id": enumerator.pk if enumerator else None,
+        **item.survey_fields,
+        "content_hash": item.content_hash,
+    }
+
+
+def _process_feature(index: int, feature: Dict[str, Any], summary: ImportSummary) -> None:
+    item = normalize_feature(index, feature)
+    summary.warnings.extend(item.warnings)
+    if _unchanged_global_ids([item]):
+        summary.unchanged += 1
+        return
+    _write_feature(item, summary)
+
+
+def _unchanged_global_ids(items: List[NormalizedFeature]) -> Set[str]:
+    """Features cuya encuesta y parcela guardan la misma huella que el archivo."""
+    hashes = {item.global_id: item.content_hash for item in items}
+    stored = Survey.objects.filter(global_id__in=hashes).values_list("global_id", "content_hash", "plot__content_hash")
+    return {
+        global_id
+        for global_id, survey_hash, plot_hash in stored
+        if survey_hash and survey_hash == plot_hash == hashes[global_id]
+    }
+
+
+@transaction.atomic
+def _write_feature(item: NormalizedFeature, summary: ImportSummary) -> None:
+    producer = _get_or_create_producer(item, summary)
+    plot = _get_or_create_plot(item, producer, summary)
+    enumerator = _get_or_create_enumerator(item.enumerator_id)
+    _create_or_update_survey(item, producer, plot, enumerator, summary)
+
+
+def _get_or_create_producer(item: NormalizedFeature, summary: ImportSummary) -> Producer:
+    producer = None
+    if item.document_number:
+        producer = Producer.objects.filter(document_number=item.document_number).first()
+    if not producer:
+        producer = Producer.objects.filter(code=item.producer_code).first()
+
+    if producer:
+        if _apply_changes(producer, item.producer_defaults, skip_empty=True):
+            producer.save()
+            summary.producers_updated += 1
+            log_activity("Productor", f"Datos actualizados: {producer.full_name}", producer.code, event_type=ActivityLog.EVENT_UPDATE)
+    else:
+        producer = Producer.objects.create(**item.producer_defaults)
+        summary.producers_created += 1
+        log_activity("Productor", f"Nuevo productor importado: {producer.full_name}", producer.code, event_type=ActivityLog.EVENT_CREATE)
+
+    return producer
+
+
+def _get_or_create_plot(
+    item: NormalizedFeature,
+    producer: Producer,
+    summary: ImportSummary,
+) -> Plot:
+    plot = Plot.objects.filter(global_id=item.global_id).first()
+
+    plot_code = plot.plot_code if plot else PlotCodeSequence.allocate([item.plot_code_base])[0]
+    plot_values = _plot_values(item, producer, plot_code)
+
+    if plot:
+        if _apply_changes(plot, plot_values):
+            plot.content_hash = item.content_hash
+            plot.save()
+            summary.plots_updated += 1
+            log_activity("Parcela", f"Parcela actualizada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_UPDATE)
+        elif plot.content_hash != item.content_hash:
+            # Solo cambió la encuesta: se registra la huella sin contar la parcela.
+            Plot.objects.filter(pk=plot.pk).update(content_hash=item.content_hash)
+            plot.content_hash = item.content_hash
+    else:
+        plot = Plot.objects.create(content_hash=item.content_hash, **plot_values)
+        summary.plots_created += 1
+        log_activity("Parcela", f"Parcela importada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_CREATE)
+
+    return plot
+
+
+def _get_or_create_enumerator(enumerator_id: str) -> Optional[Enumerator]:
+    if not enumerator_id:
+        return None
+    enumerator, _ = Enumerator.objects.get_or_create(document_number=enumerator_id)
+    return enumerator
+
+
+def _create_or_update_survey(
+    item: NormalizedFeature,
+    producer: Producer,
+    plot: Plot,
+    enumerator: Optional[Enumerator],
+    summary: ImportSummary,
+) -> None:
     survey, created = Survey.objects.update_or_create(
-        global_id=global_id,
-        defaults=survey_defaults,
+        global_id=item.global_id,
+        defaults=_survey_defaults(item, producer, plot, enumerator),
     )
     if created:
         summary.surveys_created += 1
         log_activity("Encuesta", f"Encuesta importada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_CREATE)
     else:
         summary.surveys_updated += 1
-        log_activity("Encuesta", f"Encuesta actualizada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_UPDATE)
\ No newline at end of file
+        log_activity("Encuesta", f"Encuesta actualizada: {plot.name}", producer.code, event_type=ActivityLog.EVENT_UPDATE)
+
+
+def _import_chunk(
+    last_index: int,
+    items: List[NormalizedFeature],
+    parse_errors: List[str],
+    summary: ImportSummary,
+    on_chunk: Optional[ChunkCallback] = None,
+) -> None:
+    warnings = [warning for item in items for warning in item.warnings]
+    chunk_summary = ImportSummary(errors=list(parse_errors), warnings=list(warnings))
+    try:
+        with transaction.atomic():
+            if items:
+                _write_chunk(items, chunk_summary)
+            if on_chunk:
+                on_chunk(last_index, chunk_summary)
+    except Exception:  # pylint: disable=broad-except
+        # Un error de base de datos invalida el bloque completo; se repite
+        # feature por feature para conservar el reporte de errores individual.
+        chunk_summary = ImportSummary(errors=list(parse_errors), warnings=list(warnings))
+        # Igual que en _write_chunk, lo que no cambió no se reescribe.
+        unchanged = _unchanged_global_ids(items) if items else set()
+        for item in items:
+            if item.global_id in unchanged:
+                chunk_summary.unchanged += 1
+                continue
+            try:
+                _write_feature(item, chunk_summary)
+            except Exception as exc:  # pylint: disable=broad-except
+                chunk_summary.errors.append(f"Feature {item.index}: {exc}")
+        if on_chunk:
+            with transaction.atomic():
+                on_chunk(last_index, chunk_summary)
+
+    summary.merge(chunk_summary)
+
+
+def _write_chunk(items: List[NormalizedFeature], summary: ImportSummary) -> None:
+    unchanged = _unchanged_global_ids(items)
+    if unchanged:
+        summary.unchanged += sum(1 for item in items if item.global_id in unchanged)
+        items = [item for item in items if item.global_id not in unchanged]
+        if not items:
+            return
+
+    log_entries: List[ActivityLog] = []
+    producers = _bulk_resolve_producers(items, summary, log_entries)
+    # bulk_create/bulk_update no envían post_save: el texto de búsqueda de
+    # los productores se actualiza aquí (el de las parcelas, con
+    # plots_bulk_changed).
+    index_producers(producer.pk for producer in producers)
+    plots = _bulk_resolve_plots(items, producers, summary, log_entries)
+    enumerators = _bulk_resolve_enumerators(items)
+    _bulk_write_surveys(items, producers, plots, enumerators, summary, log_entries)
+    ActivityLog.objects.bulk_create(log_entries, batch_size=BULK_BATCH_SIZE)
+
+
+def _bulk_update_changed(model: Any, changes: Dict[int, Tuple[Any, Set[str]]], extra_fields: Tuple[str, ...] = ()) -> None:
+    # Agrupar por los campos que de verdad cambiaron evita reescribir columnas
+    # idénticas en cada UPDATE.
+    groups: Dict[Tuple[str, ...], List[Any]] = {}
+    for instance, changed in changes.values():
+        groups.setdefault(tuple(sorted(changed)), []).append(instance)
+    for changed_fields, instances in groups.items():
+        bulk_update_rows(model, instances, [*changed_fields, *extra_fields], batch_size=BULK_BATCH_SIZE)
+
+
+def _ensure_primary_keys(model: Any, objects: List[Any], field_name: str) -> None:
+    # Algunos motores no devuelven los ids generados por bulk_create.
+    missing = [obj for obj in objects if obj.pk is None]
+    if not missing:
+        return
+    stored = model.objects.in_bulk([getattr(obj, field_name) for obj in missing], field_name=field_name)
+    for obj in missing:
+        obj.pk = stored[getattr(obj, field_name)].pk
+
+
+def _bulk_resolve_producers(
+    items: List[NormalizedFeature],
+    summary: ImportSummary,
+    log_entries: List[ActivityLog],
+) -> List[Producer]:
+    document_numbers = {item.document_number for item in items if item.document_number}
+    codes = {item.producer_code for item in items}
+
+    by_document: Dict[str, Producer] = {}
+    by_code: Dict[str, Producer] = {}
+    for producer in Producer.objects.filter(Q(document_number__in=document_numbers) | Q(code__in=codes)).order_by("pk"):
+        by_document.setdefault(producer.document_number, producer)
+        by_code.setdefault(producer.code, producer)
+
+    resolved: List[Producer] = []
+    to_create: List[Producer] = []
+    to_update: Dict[int, Tuple[Producer, Set[str]]] = {}
+    for item in items:
+        defaults = item.producer_defaults
+        producer = by_document.get(item.document_number) if item.document_number else None
+        if producer is None:
+            producer = by_code.get(item.producer_code)
+
+        if producer:
+            changed = _apply_changes(producer, defaults, skip_empty=True)
+            if changed:
+                if producer.pk is not None:
+                    to_update.setdefault(producer.pk, (producer, set()))[1].update(changed)
+                summary.producers_updated += 1
+                log_entries.append(
+                    ActivityLog(category="Productor", title=f"Datos actualizados: {producer.full_name}", meta=producer.code, event_type=ActivityLog.EVENT_UPDATE)
+                )
+        else:
+            producer = Producer(**defaults)
+            to_create.append(producer)
+            summary.producers_created += 1
+            log_entries.append(
+                ActivityLog(category="Productor", title=f"Nuevo productor importado: {producer.full_name}", meta=producer.code, event_type=ActivityLog.EVENT_CREATE)
+            )
+
+        by_document.setdefault(producer.document_number, producer)
+        by_code.setdefault(producer.code, producer)
+        resolved.append(producer)
+
+    Producer.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    _ensure_primary_keys(Producer, to_create, "code")
+    if to_update:
+        now = timezone.now()
+        for producer, _changed in to_update.values():
+            producer.updated_at = now
+        _bulk_update_changed(Producer, to_update, ("updated_at",))
+    return resolved
+
+
+def _bulk_resolve_plots(
+    items: List[NormalizedFeature],
+    producers: List[Producer],
+    summary: ImportSummary,
+    log_entries: List[ActivityLog],
+) -> List[Plot]:
+    plots_by_global_id: Dict[str, Plot] = Plot.objects.in_bulk([item.global_id for item in items], field_name="global_id")
+
+    # Un código por parcela nueva, reservados juntos (el mismo globalid puede
+    # repetirse en el bloque y solo crea una parcela).
+    new_plots = {item.global_id: item.plot_code_base for item in items if item.global_id not in plots_by_global_id}
+    new_codes = dict(zip(new_plots, PlotCodeSequence.allocate(list(new_plots.values()))))
+
+    resolved: List[Plot] = []
+    to_create: List[Plot] = []
+    to_update: Dict[int, Tuple[Plot, Set[str]]] = {}
+    new_geometry: List[Plot] = []
+    touched: List[Plot] = []
+    previous_boxes: List[Any] = []
+    previous_producer_ids: List[int] = []
+    for item, producer in zip(items, producers):
+        plot = plots_by_global_id.get(item.global_id)
+        plot_code = plot.plot_code if plot else new_codes[item.global_id]
+        plot_values = _plot_values(item, producer, plot_code)
+
+        if plot:
+            producer_id = plot.producer_id
+            changed = _apply_changes(plot, plot_values)
+            if plot.producer_id != producer_id:
+                previous_producer_ids.append(producer_id)
+            if changed:
+                if "polygon" in changed:
+                    new_geometry.append(plot)
+                    previous_boxes.append(plot_box(plot))
+                    changed.extend(Plot.DERIVED_GEOMETRY_FIELDS)
+                touched.append(plot)
+                summary.plots_updated += 1
+                log_entries.append(
+                    ActivityLog(category="Parcela", title=f"Parcela actualizada: {plot.name}", meta=producer.code, event_type=ActivityLog.EVENT_UPDATE)
+                )
+            # La huella se guarda aunque solo haya cambiado la encuesta.
+            changed.extend(_apply_changes(plot, {"content_hash": item.content_hash}))
+            if changed and plot.pk is not None:
+                to_update.setdefault(plot.pk, (plot, set()))[1].update(changed)
+        else:
+            plot = Plot(content_hash=item.content_hash, **plot_values)
+            new_geometry.append(plot)
+            touched.append(plot)
+            to_create.append(plot)
+            plots_by_global_id[item.global_id] = plot
+            summary.plots_created += 1
+            log_entries.append(
+                ActivityLog(category="Parcela", title=f"Parcela importada: {plot.name}", meta=producer.code, event_type=ActivityLog.EVENT_CREATE)
+            )
+        resolved.append(plot)
+
+    # bulk_create/bulk_update no pasan por save(): los campos derivados de la
+    # geometría se calculan aquí, todos juntos.
+    Plot.refresh_derived_geometry_bulk(new_geometry)
+    Plot.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    _ensure_primary_keys(Plot, to_create, "global_id")
+    _bulk_update_changed(Plot, to_update)
+    plots_bulk_changed.send(
+        sender=Plot,
+        plot_ids=[plot.pk for plot in touched],
+        previous_boxes=previous_boxes,
+        previous_producer_ids=previous_producer_ids,
+    )
+    return resolved
+
+
+def _bulk_resolve_enumerators(items: List[NormalizedFeature]) -> List[Optional[Enumerator]]:
+    identifiers = [item.enumerator_id for item in items]
+    wanted = {identifier for identifier in identifiers if identifier}
+    enumerators: Dict[str, Enumerator] = Enumerator.objects.in_bulk(wanted, field_name="document_number")
+
+    missing = [Enumerator(document_number=identifier) for identifier in sorted(wanted - set(enumerators))]
+    if missing:
+        Enumerator.objects.bulk_create(missing, batch_size=BULK_BATCH_SIZE)
+        _ensure_primary_keys(Enumerator, missing, "document_number")
+        enumerators.update({enumerator.document_number: enumerator for enumerator in missing})
+
+    return [enumerators.get(identifier) if identifier else None for identifier in identifiers]
+
+
+def _bulk_write_surveys(
+    items: List[NormalizedFeature],
+    producers: List[Producer],
+    plots: List[Plot],
+    enumerators: List[Optional[Enumerator]],
+    summary: ImportSummary,
+    log_entries: List[ActivityLog],
+) -> None:
+    surveys_by_global_id: Dict[str, Survey] = Survey.objects.in_bulk(
+        [item.global_id for item in items], field_name="global_id"
+    )
+
+    to_create: Dict[str, Survey] = {}
+    to_update: Dict[int, Tuple[Survey, Set[str]]] = {}
+    for item, producer, plot, enumerator in zip(items, producers, plots, enumerators):
+        survey_defaults = _survey_defaults(item, producer, plot, enumerator)
+        survey = surveys_by_global_id.get(item.global_id)
+
+        if survey is None:
+            survey = Survey(global_id=item.global_id, **survey_defaults)
+            to_create[item.global_id] = survey
+            surveys_by_global_id[item.global_id] = survey
+            created = True
+        else:
+            changed = _apply_changes(survey, survey_defaults)
+            if changed and survey.pk is not None:
+                to_update.setdefault(survey.pk, (survey, set()))[1].update(changed)
+            created = False
+
+        if created:
+            summary.surveys_created += 1
+            log_entries.append(
+                ActivityLog(category="Encuesta", title=f"Encuesta importada: {plot.name}", meta=producer.code, event_type=ActivityLog.EVENT_CREATE)
+            )
+        else:
+            summary.surveys_updated += 1
+            log_entries.append(
+                ActivityLog(category="Encuesta", title=f"Encuesta actualizada: {plot.name}", meta=producer.code, event_type=ActivityLog.EVENT_UPDATE)
+            )
+
+    Survey.objects.bulk_create(list(to_create.values()), batch_size=BULK_BATCH_SIZE)
+    if to_update:
+        now = timezone.now()
+        for survey, _changed in to_update.values():
+            survey.updated_at = now
+        _bulk_update_changed(Survey, to_update, ("updated_at",))
+
+
+# --- Simulación (dry run) ---------------------------------------------------
+
+
+@dataclass
+class _ImportPlan:
+    """Lo que los bloques anteriores de una simulación habrían escrito."""
+
+    producers_by_document: Dict[str, Producer] = field(default_factory=dict)
+    producers_by_code: Dict[str, Producer] = field(default_factory=dict)
+    plots: Dict[str, Plot] = field(default_factory=dict)
+    surveys: Set[str] = field(default_factory=set)
+
+
+def _plan_chunk(items: List[NormalizedFeature], summary: ImportSummary, plan: _ImportPlan) -> None:
+    # Replica las reglas de _write_chunk sobre copias en memoria: las filas
+    # leídas se modifican sin guardarse y las nuevas no reciben id ni código.
+    unchanged = _unchanged_global_ids([item for item in items if item.global_id not in plan.surveys])
+    summary.unchanged += sum(1 for item in items if item.global_id in unchanged)
+    items = [item for item in items if item.global_id not in unchanged]
+
+    document_numbers = {item.document_number for item in items if item.document_number} - set(plan.producers_by_document)
+    codes = {item.producer_code for item in items} - set(plan.producers_by_code)
+    if document_numbers or codes:
+        for producer in Producer.objects.filter(Q(document_number__in=document_numbers) | Q(code__in=codes)).order_by("pk"):
+            plan.producers_by_document.setdefault(producer.document_number, producer)
+            plan.producers_by_code.setdefault(producer.code, producer)
+
+    stored_plots = Plot.objects.in_bulk(
+        {item.global_id for item in items} - set(plan.plots), field_name="global_id"
+    )
+    stored_surveys = set(
+        Survey.objects.filter(global_id__in=[item.global_id for item in items]).values_list("global_id", flat=True)
+    )
+
+    for item in items:
+        producer = plan.producers_by_document.get(item.document_number) if item.document_number else None
+        if producer is None:
+            producer = plan.producers_by_code.get(item.producer_code)
+        if producer:
+            if _apply_changes(producer, item.producer_defaults, skip_empty=True):
+                summary.producers_updated += 1
+        else:
+            producer = Producer(**item.producer_defaults)
+            summary.producers_created += 1
+        plan.producers_by_document.setdefault(producer.document_number, producer)
+        plan.producers_by_code.setdefault(producer.code, producer)
+
+        plot = plan.plots.get(item.global_id) or stored_plots.get(item.global_id)
+        if plot:
+            if _apply_changes(plot, _plot_values(item, producer, plot.plot_code)):
+                summary.plots_updated += 1
+                plan.plots[item.global_id] = plot
+        else:
+            plan.plots[item.global_id] = Plot(**_plot_values(item, producer, ""))
+            summary.plots_created += 1
+
+        if item.global_id in plan.surveys or item.global_id in stored_surveys:
+            summary.surveys_updated += 1
+        else:
+            summary.surveys_created += 1
+        plan.surveys.add(item.global_id)
@@ -8,4 +8,6 @@ urlpatterns = [
     path("surveys/", views.survey_list, name="survey_list"),
     path("surveys/<int:pk>/", views.survey_detail, name="survey_detail"),
     path("surveys/import/", views.import_geojson, name="import_geojson"),
+    path("surveys/import/<int:pk>/", views.import_job_detail, name="import_job_detail"),
+    path("surveys/import/<int:pk>/progress/", views.import_job_progress, name="import_job_progress"),
 ]
@@ -1,41 +1,101 @@
-import json
-
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
-from django.shortcuts import render, get_object_or_404
+from django.http import JsonResponse
+from django.shortcuts import redirect, render, get_object_or_404
 from django.views.decorators.http import require_http_methods
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from core import search
+from core.pagination import KeysetPage, keyset_page
+from producers.models import Plot
+from producers.search import PLOT, PRODUCER
+
 from .forms import FeatureCollectionUploadForm
+from .geojson_stream import FeatureCollectionReader, read_feature_collection
+from .models import ImportJob, Survey
 from .services import import_feature_collection
-from .models import Survey
+
+
+# Productores y parcelas que se piden al índice en una búsqueda; si se
+# alcanza el tope, la lista avisa que hay más coincidencias (más débiles).
+SEARCH_HITS = 1000
+SEARCH_PER_PAGE = 25
+# SQL Server admite como mucho 2100 parámetros por consulta.
+CHUNK_SIZE = 2000
+
+
+def _offset_query(request, offset):
+    query = request.GET.copy()
+    query["offset"] = offset
+    return query.urlencode()
+
+
+def _ranked_survey_ids(query):
+    """Ids de las encuestas cuyo productor o parcela coincide con ``query``, por puntaje y fecha.
+
+    También indica si el índice llegó al tope de ``SEARCH_HITS``.
+    """
+    hits = search.search(query, kinds=(PRODUCER, PLOT), limit=SEARCH_HITS)
+    scores = {PRODUCER: {}, PLOT: {}}
+    for hit in hits:
+        scores[hit.kind][hit.object_id] = hit.score
+    rows = {}
+    for field, kind in (("producer_id", PRODUCER), ("plot_id", PLOT)):
+        wanted = list(scores[kind])
+        for start in range(0, len(wanted), CHUNK_SIZE):
+            matches = Survey.objects.filter(**{f"{field}__in": wanted[start : start + CHUNK_SIZE]})
+            rows.update((row[0], row) for row in matches.values_list("pk", "producer_id", "plot_id", "census_date"))
+    ranked = sorted(
+        rows.values(),
+        key=lambda row: (
+            -max(scores[PRODUCER].get(row[1], 0), scores[PLOT].get(row[2], 0)),
+            -row[3].timestamp(),
+            -row[0],
+        ),
+    )
+    return [row[0] for row in ranked], len(hits) >= SEARCH_HITS
+
+
+def _search_page(request, surveys, query):
+    """Página ``?offset=`` de las encuestas que coinciden con ``query``, de la más parecida a la menos."""
+    ranked, truncated = _ranked_survey_ids(query)
+    try:
+        offset = min(max(int(request.GET.get("offset", 0)), 0), max(len(ranked) - 1, 0))
+    except ValueError:
+        offset = 0
+    selected = ranked[offset : offset + SEARCH_PER_PAGE]
+    found = surveys.in_bulk(selected)
+    page = KeysetPage(
+        object_list=[found[pk] for pk in selected if pk in found],
+        has_next=offset + SEARCH_PER_PAGE < len(ranked),
+        has_previous=offset > 0,
+        next_query=_offset_query(request, offset + SEARCH_PER_PAGE),
+        previous_query=_offset_query(request, max(offset - SEARCH_PER_PAGE, 0)),
+        total=len(ranked),
+        total_is_estimate=truncated,
+    )
+    return page, truncated
 
 
 def survey_list(request):
     query = request.GET.get("q", "").strip()
-    surveys = Survey.objects.select_related("producer", "plot", "enumerator").all()
+    surveys = Survey.objects.select_related("producer", "plot", "enumerator").defer(
+        *(f"plot__{name}" for name in Plot.GEOMETRY_PAYLOAD_FIELDS)
+    )
 
+    truncated = False
     if query:
-        surveys = surveys.filter(
-            Q(producer__full_name__icontains=query)
-            | Q(producer__code__icontains=query)
-            | Q(plot__name__icontains=query)
-            | Q(global_id__icontains=query)
-        )
-
-    paginator = Paginator(surveys, 25)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+        page, truncated = _search_page(request, surveys, query)
+    else:
+        page = keyset_page(request, surveys, ("-census_date", "-pk"), with_total=True)
 
     return render(
         request,
         "surveys/survey_list.html",
         {
-            "page_obj": page_obj,
-            "surveys": page_obj.object_list,
+            "page": page,
+            "surveys": page.object_list,
             "query": query,
-            "total_count": paginator.count,
+            "search_truncated": truncated,
         },
     )
 
@@ -145,28 +205,71 @@ def survey_detail(request, pk):
 
 @require_http_methods(["GET", "POST"])
 def import_geojson(request):
-    summary = None
     form = FeatureCollectionUploadForm(request.POST or None, request.FILES or None)
+    preview = None
 
-    if request.method == "POST" and form.is_valid():
+    if request.method == "POST" and form.is_valid() and "preview" in request.POST:
         uploaded = form.cleaned_data["geojson_file"]
         try:
-            payload = json.load(uploaded)
-        except json.JSONDecodeError:
-            form.add_error("geojson_file", "El archivo no contiene JSON válido.")
+            # La simulación no escribe nada, por lo que se ejecuta en la petición.
+            preview = import_feature_collection(read_feature_collection(uploaded), dry_run=True)
+        except ValueError as exc:
+            form.add_error("geojson_file", str(exc))
+    elif request.method == "POST" and form.is_valid():
+        uploaded = form.cleaned_data["geojson_file"]
+        try:
+            # Solo se lee la cabecera: el contenido lo procesa process_import_jobs.
+            if FeatureCollectionReader(uploaded).type != "FeatureCollection":
+                raise ValueError("Solo se admiten archivos GeoJSON con type=FeatureCollection.")
+        except ValueError as exc:
+            form.add_error("geojson_file", str(exc))
         else:
-            summary = import_feature_collection(payload)
-            if summary["errors"]:
-                messages.warning(request, f"Importación completada con {len(summary['errors'])} errores.")
-            else:
-                messages.success(request, "Importación completada correctamente.")
-            form = FeatureCollectionUploadForm()
+            uploaded.seek(0)
+            job = ImportJob.objects.create(
+                source_file=uploaded,
+                original_name=uploaded.name,
+                total_bytes=uploaded.size,
+                created_by=request.user if request.user.is_authenticated else None,
+            )
+            messages.info(request, "Archivo recibido. La importación se procesará en segundo plano.")
+            return redirect("surveys:import_job_detail", pk=job.pk)
 
     return render(
         request,
         "surveys/import_geojson.html",
         {
             "form": form,
-            "summary": summary,
+            "summary": preview,
+            "jobs": ImportJob.objects.all()[:10],
         },
     )
+
+
+def import_job_detail(request, pk):
+    job = get_object_or_404(ImportJob, pk=pk)
+    return render(
+        request,
+        "surveys/import_job.html",
+        {
+            "job": job,
+            "summary": job.summary if job.is_finished else None,
+        },
+    )
+
+
+def import_job_progress(request, pk):
+    job = get_object_or_404(ImportJob, pk=pk)
+    summary = {key: value for key, value in job.summary.items() if key not in ("errors", "warnings")}
+    summary["error_count"] = len(job.summary.get("errors") or [])
+    summary["warning_count"] = len(job.summary.get("warnings") or [])
+    return JsonResponse(
+        {
+            "status": job.status,
+            "status_label": job.get_status_display(),
+            "is_finished": job.is_finished,
+            "processed_features": job.processed_features,
+            "progress_percent": job.progress_percent,
+            "summary": summary,
+            "error_message": job.error_message,
+        }
+    )